@@ -0,0 +1,420 @@
+import asyncio
+import dataclasses
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional, Tuple, Type, TypeVar, Union
+
+from kif_lib import Entity, Item, Property, Search
+
+LOG = logging.getLogger(__name__)
+
+T = TypeVar("T", bound=Entity)
+
+#: Cache key: (label, entity class, search backend, context fingerprint).
+LinkingKey = Tuple[str, str, str, str]
+
+#: Linking result: (label, description, entity) tuples.
+LinkingResult = list[Tuple[str, str, Entity]]
+
+_ENTITY_CLASSES: dict[str, Type[Entity]] = {
+    'item': Item,
+    'property': Property,
+}
+
+
+@dataclasses.dataclass
+class LinkingCacheStats:
+    """Counters of a linking cache.
+
+    Attributes:
+        hits (int): Number of lookups answered by the cache.
+        misses (int): Number of lookups not answered by the cache.
+        evictions (int): Number of entries evicted from the in-memory tier.
+    """
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class LinkingCache:
+    """Cache of label-to-entity linking results.
+
+    Entries are keyed by the label, the entity class (Item or Property),
+    the search backend used to fetch candidates, and a fingerprint of the
+    disambiguation context (see
+    :meth:`kbel.disambiguators.Disambiguator.context_fingerprint`).
+    Disambiguators that do not look at the context share entries across
+    sentences, so hot labels skip both the search and the disambiguation.
+
+    The cache has an in-memory LRU tier and, if `path` is given, a
+    persistent SQLite tier that survives restarts and can be shared by
+    several processes.
+
+    Example:
+        >>> cache = LinkingCache(max_size=4096, path='linking.db')
+        >>> cache.link('Paris', Item, searcher, disambiguator,
+        ...            sentence='Paris is the capital of France')
+        [('Paris', 'capital of France', Item(...))]
+
+    Args:
+        max_size (int): Maximum number of entries of the in-memory tier.
+        path (Optional[Union[str, Path]]): Path to the SQLite database file of
+            the persistent tier.
+        ttl (Optional[float]): Time-to-live of entries (in seconds); None
+            means entries never expire.
+    """
+
+    _max_size: int
+    _path: Optional[Path]
+    _ttl: Optional[float]
+    _entries: 'OrderedDict[LinkingKey, Tuple[float, LinkingResult]]'
+    _conn: Optional[sqlite3.Connection]
+    _stats: LinkingCacheStats
+    _lock: threading.RLock
+
+    def __init__(
+        self,
+        max_size: int = 4096,
+        path: Optional[Union[str, Path]] = None,
+        ttl: Optional[float] = None,
+    ):
+        assert max_size > 0
+        self._max_size = max_size
+        self._path = Path(path) if path is not None else None
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._stats = LinkingCacheStats()
+        self._lock = threading.RLock()
+        self._conn = None
+        if self._path is not None:
+            self._conn = sqlite3.connect(self._path, check_same_thread=False)
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS links ('
+                'label TEXT NOT NULL, '
+                'cls TEXT NOT NULL, '
+                'backend TEXT NOT NULL, '
+                'context TEXT NOT NULL, '
+                'value TEXT NOT NULL, '
+                'created REAL NOT NULL, '
+                'PRIMARY KEY (label, cls, backend, context))')
+            self._conn.commit()
+
+    @property
+    def path(self) -> Optional[Path]:
+        return self._path
+
+    @property
+    def ttl(self) -> Optional[float]:
+        return self._ttl
+
+    @property
+    def stats(self) -> LinkingCacheStats:
+        return self._stats
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(
+        label: str,
+        cls: Type[Entity],
+        searcher: Search,
+        context: str = '',
+        search_limit: Optional[int] = None,
+    ) -> LinkingKey:
+        """Computes the cache key of a linking request.
+
+        Args:
+            label (str): Label to link.
+            cls (Type[Entity]): Entity class (Item or Property).
+            searcher (Search): Search used to fetch candidates.
+            context (str, optional): Context fingerprint.
+            search_limit (Optional[int], optional): Per-call search limit;
+                defaults to the searcher's limit.
+
+        Returns:
+            LinkingKey: Cache key.
+        """
+        backend = getattr(searcher, 'search_name', type(searcher).__name__)
+        limit = search_limit
+        if limit is None:
+            limit = getattr(searcher, 'limit', None)
+        if limit is not None:
+            backend = f'{backend}:{limit}'
+        return (label, cls.__name__.lower(), backend, context)
+
+    def lookup(self, key: LinkingKey) -> Optional[LinkingResult]:
+        """Looks up the linking result of `key`.
+
+        Args:
+            key (LinkingKey): Cache key.
+
+        Returns:
+            Optional[LinkingResult]: The cached result or None.
+        """
+        with self._lock:
+            value = self._lookup_memory(key)
+            if value is None:
+                value = self._lookup_disk(key)
+                if value is not None:
+                    self._update_memory(key, value)
+            if value is None:
+                self._stats.misses += 1
+            else:
+                self._stats.hits += 1
+            return value
+
+    def update(self, key: LinkingKey, value: LinkingResult) -> None:
+        """Stores the linking result of `key` in every tier.
+
+        Args:
+            key (LinkingKey): Cache key.
+            value (LinkingResult): Linking result.
+        """
+        with self._lock:
+            self._update_memory(key, value)
+            if self._conn is not None:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO links '
+                    '(label, cls, backend, context, value, created) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (*key, self._dumps(value), time.time()))
+                self._conn.commit()
+
+    async def alookup(self, key: LinkingKey) -> Optional[LinkingResult]:
+        """Asynchronously looks up the linking result of `key`.
+
+        Memory hits are served inline; disk lookups run in a worker thread,
+        so that they do not block the event loop.
+
+        See :meth:`lookup`.
+        """
+        with self._lock:
+            value = self._lookup_memory(key)
+            if value is not None or self._conn is None:
+                if value is None:
+                    self._stats.misses += 1
+                else:
+                    self._stats.hits += 1
+                return value
+        return await asyncio.to_thread(self.lookup, key)
+
+    async def aupdate(self, key: LinkingKey, value: LinkingResult) -> None:
+        """Asynchronously stores the linking result of `key` in every tier.
+
+        See :meth:`update`.
+        """
+        if self._conn is None:
+            self.update(key, value)
+        else:
+            await asyncio.to_thread(self.update, key, value)
+
+    def link(
+        self,
+        label: str,
+        cls: Type[T],
+        searcher: Search,
+        disambiguator: Any,
+        *args: Any,
+        **kwargs: Any,
+    ) -> list[Tuple[str, str, T]]:
+        """Links `label` through `disambiguator`, using the cache.
+
+        Args:
+            label (str): Label to link.
+            cls (Type[T]): Entity class (Item or Property).
+            searcher (Search): Search used to fetch candidates.
+            disambiguator (Disambiguator): Disambiguator called on a miss.
+            *args: Additional positional arguments for the disambiguator.
+            **kwargs: Additional keyword arguments for the disambiguator.
+
+        Returns:
+            list[Tuple[str, str, T]]: Linking result.
+        """
+        key = self.make_key(
+            label, cls, searcher,
+            disambiguator.context_fingerprint(**kwargs),
+            kwargs.get('search_limit'))
+        value = self.lookup(key)
+        if value is None:
+            if cls is Item:
+                value = disambiguator.disambiguate_item(
+                    label, searcher, *args, **kwargs)
+            elif cls is Property:
+                value = disambiguator.disambiguate_property(
+                    label, searcher, *args, **kwargs)
+            else:
+                value = disambiguator.disambiguate(
+                    label, searcher, cls, *args, **kwargs)
+            self.update(key, value)
+        return value  # type: ignore
+
+    async def alink(
+        self,
+        label: str,
+        cls: Type[T],
+        searcher: Search,
+        disambiguator: Any,
+        *args: Any,
+        **kwargs: Any,
+    ) -> list[Tuple[str, str, T]]:
+        """Asynchronously links `label` through `disambiguator`, using the cache.
+
+        See :meth:`link`.
+        """
+        key = self.make_key(
+            label, cls, searcher,
+            disambiguator.context_fingerprint(**kwargs),
+            kwargs.get('search_limit'))
+        value = await self.alookup(key)
+        if value is None:
+            if cls is Item:
+                value = await disambiguator.adisambiguate_item(
+                    label, searcher, *args, **kwargs)
+            elif cls is Property:
+                value = await disambiguator.adisambiguate_property(
+                    label, searcher, *args, **kwargs)
+            else:
+                value = await disambiguator.adisambiguate_label(
+                    label, searcher, cls, *args, **kwargs)
+            await self.aupdate(key, value)
+        return value  # type: ignore
+
+    def invalidate(
+        self,
+        label: Optional[str] = None,
+        cls: Optional[Type[Entity]] = None,
+        searcher: Optional[Search] = None,
+    ) -> int:
+        """Removes the entries matching the given key components.
+
+        Components left as None match anything; with no arguments every
+        entry is removed.  A `searcher` matches the entries of its backend
+        whatever their search limit.
+
+        Args:
+            label (Optional[str]): Label.
+            cls (Optional[Type[Entity]]): Entity class (Item or Property).
+            searcher (Optional[Search]): Search used to fetch candidates.
+
+        Returns:
+            int: Number of distinct entries removed from either tier.
+        """
+        backend: Optional[str] = None
+        if searcher is not None:
+            backend = getattr(
+                searcher, 'search_name', type(searcher).__name__)
+
+        def matches(key: Tuple[str, ...]) -> bool:
+            return ((label is None or key[0] == label)
+                    and (cls is None or key[1] == cls.__name__.lower())
+                    and (backend is None or key[2] == backend
+                         or key[2].startswith(backend + ':')))
+
+        with self._lock:
+            keys = {key for key in self._entries if matches(key)}
+            for key in keys:
+                del self._entries[key]
+            if self._conn is not None:
+                where: list[str] = []
+                params: list[Any] = []
+                if label is not None:
+                    where.append('label = ?')
+                    params.append(label)
+                if cls is not None:
+                    where.append('cls = ?')
+                    params.append(cls.__name__.lower())
+                if backend is not None:
+                    where.append('(backend = ? OR substr(backend, 1, ?) = ?)')
+                    params += [backend, len(backend) + 1, backend + ':']
+                clause = ' WHERE ' + ' AND '.join(where) if where else ''
+                keys.update(map(tuple, self._conn.execute(
+                    'SELECT label, cls, backend, context FROM links' + clause,
+                    params)))
+                self._conn.execute('DELETE FROM links' + clause, params)
+                self._conn.commit()
+            return len(keys)
+
+    def clear(self) -> None:
+        """Removes all entries (counters are kept)."""
+        self.invalidate()
+
+    def close(self) -> None:
+        """Closes the persistent tier."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _is_expired(self, created: float) -> bool:
+        return self._ttl is not None and time.time() - created > self._ttl
+
+    def _lookup_memory(self, key: LinkingKey) -> Optional[LinkingResult]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created, value = entry
+        if self._is_expired(created):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _update_memory(self, key: LinkingKey, value: LinkingResult) -> None:
+        self._entries[key] = (time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    def _lookup_disk(self, key: LinkingKey) -> Optional[LinkingResult]:
+        if self._conn is None:
+            return None
+        row = self._conn.execute(
+            'SELECT value, created FROM links WHERE label = ? AND cls = ? '
+            'AND backend = ? AND context = ?', key).fetchone()
+        if row is None:
+            return None
+        value, created = row
+        if self._is_expired(created):
+            self._conn.execute(
+                'DELETE FROM links WHERE label = ? AND cls = ? '
+                'AND backend = ? AND context = ?', key)
+            self._conn.commit()
+            return None
+        try:
+            return self._loads(value)
+        except Exception as e:
+            LOG.info(f'Ignoring corrupted linking cache entry {key}: {e}')
+            return None
+
+    @staticmethod
+    def _dumps(value: LinkingResult) -> str:
+        return json.dumps([
+            (label, description, type(entity).__name__.lower(),
+             entity.iri.content)
+            for label, description, entity in value])
+
+    @staticmethod
+    def _loads(data: str) -> LinkingResult:
+        return [
+            (label, description, _ENTITY_CLASSES[cls](iri))
+            for label, description, cls, iri in json.loads(data)]
+
+
+__all__ = (
+    'LinkingCache',
+    'LinkingCacheStats',
+    'LinkingKey',
+    'LinkingResult',
+)
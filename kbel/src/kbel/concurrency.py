@@ -0,0 +1,565 @@
+import asyncio
+import concurrent.futures
+import dataclasses
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import (Any, AsyncIterator, Awaitable, Callable, Hashable,
+                    Iterator, Optional, Tuple, TypeVar)
+
+LOG = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+#: Governor key: (provider, model).
+GovernorKey = Tuple[str, str]
+
+
+@dataclasses.dataclass(frozen=True)
+class GovernorLimits:
+    """Admission limits of a governor.
+
+    Attributes:
+        max_concurrency (Optional[int]): Maximum number of calls in flight.
+        requests_per_interval (Optional[int]): Maximum number of calls
+            admitted per `interval`.
+        tokens_per_interval (Optional[int]): Maximum number of tokens
+            (prompt plus completion) consumed per `interval`.
+        interval (float): Length of the budget window (in seconds).
+
+    Limits left as None are not enforced.
+    """
+    max_concurrency: Optional[int] = None
+    requests_per_interval: Optional[int] = None
+    tokens_per_interval: Optional[int] = None
+    interval: float = 60.0
+
+
+@dataclasses.dataclass
+class GovernorStats:
+    """Counters of a governor.
+
+    Attributes:
+        admitted (int): Number of calls admitted.
+        in_flight (int): Number of calls currently in flight.
+        queue_depth (int): Number of calls currently waiting.
+        max_queue_depth (int): Largest number of calls seen waiting.
+        total_wait (float): Accumulated waiting time (in seconds).
+        max_wait (float): Longest waiting time (in seconds).
+    """
+    admitted: int = 0
+    in_flight: int = 0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    @property
+    def avg_wait(self) -> float:
+        return self.total_wait / self.admitted if self.admitted else 0.0
+
+
+class _Waiter:
+    __slots__ = (
+        'tokens', 'enqueued', 'admitted', 'ticket', 'event', 'loop', 'future')
+
+    def __init__(
+        self,
+        tokens: int,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        future: Optional[asyncio.Future] = None,
+    ):
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.admitted = False
+        self.ticket: Optional[list] = None
+        self.event = threading.Event() if loop is None else None
+        self.loop = loop
+        self.future = future
+
+    def notify(self) -> None:
+        if self.event is not None:
+            self.event.set()
+        else:
+            assert self.loop is not None and self.future is not None
+            future = self.future
+
+            def wake() -> None:
+                if not future.done():
+                    future.set_result(None)
+            try:
+                self.loop.call_soon_threadsafe(wake)
+            except RuntimeError:  # loop closed
+                pass
+
+
+class Governor:
+    """Admission controller for the calls to one provider and model.
+
+    Calls wait in a single FIFO queue shared by threads and asyncio tasks
+    until they fit in the concurrency limit and in the request and token
+    budgets of the current window.
+
+    Example:
+        >>> governor = Governor(GovernorLimits(max_concurrency=4))
+        >>> with governor.slot(tokens=500) as ticket:
+        ...     response = model.invoke(prompt)
+        ...     governor.record_tokens(ticket, 620)
+
+    Args:
+        limits (GovernorLimits): Admission limits.
+        name (str, optional): Name used in log messages.
+    """
+
+    _limits: GovernorLimits
+    _name: str
+    _lock: threading.Lock
+    _queue: deque[_Waiter]
+    _window: deque[list]
+    _window_tokens: int
+    _stats: GovernorStats
+
+    def __init__(self, limits: GovernorLimits, name: str = 'governor'):
+        self._limits = limits
+        self._name = name
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._window = deque()
+        self._window_tokens = 0
+        self._stats = GovernorStats()
+
+    @property
+    def limits(self) -> GovernorLimits:
+        return self._limits
+
+    @limits.setter
+    def limits(self, value: GovernorLimits) -> None:
+        with self._lock:
+            self._limits = value
+            self._dispatch()
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def stats(self) -> GovernorStats:
+        return self._stats
+
+    def acquire(self, tokens: int = 0) -> list:
+        """Waits (blocking the calling thread) until a call is admitted.
+
+        Args:
+            tokens (int, optional): Estimated number of tokens of the call.
+
+        Returns:
+            list: Ticket to pass to :meth:`release`.
+        """
+        waiter = _Waiter(tokens)
+        self._enqueue(waiter)
+        assert waiter.event is not None
+        while True:
+            if waiter.event.wait(self._retry_after()):
+                break
+            with self._lock:
+                self._dispatch()
+                if waiter.admitted:
+                    break
+        assert waiter.ticket is not None
+        return waiter.ticket
+
+    async def aacquire(self, tokens: int = 0) -> list:
+        """Waits (without blocking the event loop) until a call is admitted.
+
+        Args:
+            tokens (int, optional): Estimated number of tokens of the call.
+
+        Returns:
+            list: Ticket to pass to :meth:`release`.
+        """
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(tokens, loop, loop.create_future())
+        self._enqueue(waiter)
+        assert waiter.future is not None
+        try:
+            while not waiter.admitted:
+                try:
+                    await asyncio.wait_for(
+                        asyncio.shield(waiter.future), self._retry_after())
+                except asyncio.TimeoutError:
+                    with self._lock:
+                        self._dispatch()
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.admitted:
+                    self._release(waiter.ticket)
+                else:
+                    self._queue.remove(waiter)
+                    self._stats.queue_depth = len(self._queue)
+                self._dispatch()
+            raise
+        assert waiter.ticket is not None
+        return waiter.ticket
+
+    def release(self, ticket: list) -> None:
+        """Releases the slot of an admitted call.
+
+        Args:
+            ticket (list): Ticket returned by :meth:`acquire`.
+        """
+        with self._lock:
+            self._release(ticket)
+            self._dispatch()
+
+    def record_tokens(self, ticket: list, tokens: int) -> None:
+        """Replaces the token estimate of an admitted call by its usage.
+
+        Args:
+            ticket (list): Ticket returned by :meth:`acquire`.
+            tokens (int): Number of tokens actually consumed.
+        """
+        with self._lock:
+            if any(entry is ticket for entry in self._window):
+                self._window_tokens += tokens - ticket[1]
+            ticket[1] = tokens
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, tokens: int = 0) -> Iterator[list]:
+        """Context manager that holds an admitted slot.
+
+        Args:
+            tokens (int, optional): Estimated number of tokens of the call.
+        """
+        ticket = self.acquire(tokens)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    @asynccontextmanager
+    async def aslot(self, tokens: int = 0) -> AsyncIterator[list]:
+        """Async context manager that holds an admitted slot.
+
+        Args:
+            tokens (int, optional): Estimated number of tokens of the call.
+        """
+        ticket = await self.aacquire(tokens)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        with self._lock:
+            self._queue.append(waiter)
+            self._stats.queue_depth = len(self._queue)
+            self._stats.max_queue_depth = max(
+                self._stats.max_queue_depth, len(self._queue))
+            self._dispatch()
+
+    def _release(self, ticket: Optional[list]) -> None:
+        assert ticket is not None
+        if ticket[2]:
+            ticket[2] = False
+            self._stats.in_flight -= 1
+
+    def _expire(self, now: float) -> None:
+        horizon = now - self._limits.interval
+        while self._window and self._window[0][0] <= horizon:
+            _, tokens, _ = self._window.popleft()
+            self._window_tokens -= tokens
+
+    def _can_admit(self, tokens: int) -> bool:
+        limits = self._limits
+        if (limits.max_concurrency is not None
+                and self._stats.in_flight >= limits.max_concurrency):
+            return False
+        if (limits.requests_per_interval is not None
+                and len(self._window) >= limits.requests_per_interval):
+            return False
+        if (limits.tokens_per_interval is not None and self._window
+                and self._window_tokens + tokens
+                > limits.tokens_per_interval):
+            # A call larger than the whole budget is admitted alone.
+            return False
+        return True
+
+    def _dispatch(self) -> None:
+        # Must be called with the lock held.  Calls are admitted strictly
+        # in arrival order: a call that does not fit blocks the ones behind
+        # it, so large requests are not starved by small ones.
+        now = time.monotonic()
+        self._expire(now)
+        while self._queue and self._can_admit(self._queue[0].tokens):
+            waiter = self._queue.popleft()
+            ticket = [now, waiter.tokens, True]
+            self._window.append(ticket)
+            self._window_tokens += waiter.tokens
+            waiter.ticket = ticket
+            waiter.admitted = True
+            wait = now - waiter.enqueued
+            self._stats.admitted += 1
+            self._stats.in_flight += 1
+            self._stats.total_wait += wait
+            self._stats.max_wait = max(self._stats.max_wait, wait)
+            if wait > 1.0:
+                LOG.debug(f'{self._name}: call admitted after {wait:.2f}s')
+            waiter.notify()
+        self._stats.queue_depth = len(self._queue)
+
+    def _retry_after(self) -> Optional[float]:
+        # Budget windows are refilled by time, not by releases, so waiters
+        # blocked on a budget re-check when the oldest call leaves the
+        # window.
+        limits = self._limits
+        if (limits.requests_per_interval is None
+                and limits.tokens_per_interval is None):
+            return None
+        with self._lock:
+            if not self._window:
+                return 0.01
+            return max(
+                self._window[0][0] + limits.interval - time.monotonic(),
+                0.01)
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+#: Limits of the governors not configured explicitly.
+DEFAULT_GOVERNOR_LIMITS = GovernorLimits(
+    max_concurrency=_env_int('KBEL_LLM_MAX_CONCURRENCY') or 16,
+    requests_per_interval=_env_int('KBEL_LLM_REQUESTS_PER_MINUTE'),
+    tokens_per_interval=_env_int('KBEL_LLM_TOKENS_PER_MINUTE'),
+    interval=60.0,
+)
+
+_governors: dict[GovernorKey, Governor] = {}
+_governors_lock = threading.Lock()
+_default_limits: GovernorLimits = DEFAULT_GOVERNOR_LIMITS
+
+
+def get_governor(provider: str, model: str) -> Governor:
+    """Gets the process-wide governor of `provider` and `model`.
+
+    Args:
+        provider (str): Provider identifier.
+        model (str): Model identifier.
+
+    Returns:
+        Governor: Governor.
+    """
+    key = (provider, model)
+    with _governors_lock:
+        governor = _governors.get(key)
+        if governor is None:
+            governor = Governor(_default_limits, name=f'{provider}/{model}')
+            _governors[key] = governor
+        return governor
+
+
+def configure_governor(
+    provider: str,
+    model: str,
+    limits: Optional[GovernorLimits] = None,
+    **kwargs: Any,
+) -> Governor:
+    """Sets the limits of the governor of `provider` and `model`.
+
+    Args:
+        provider (str): Provider identifier.
+        model (str): Model identifier.
+        limits (Optional[GovernorLimits]): Limits; if None, they are built
+            from `kwargs`.
+        **kwargs: Fields of GovernorLimits.
+
+    Returns:
+        Governor: Governor.
+    """
+    governor = get_governor(provider, model)
+    governor.limits = limits or GovernorLimits(**kwargs)
+    return governor
+
+
+def set_default_governor_limits(limits: GovernorLimits) -> None:
+    """Sets the limits of the governors created from now on.
+
+    Args:
+        limits (GovernorLimits): Limits.
+    """
+    global _default_limits
+    _default_limits = limits
+
+
+def governor_stats() -> dict[GovernorKey, GovernorStats]:
+    """Gets the counters of all governors.
+
+    Returns:
+        dict[GovernorKey, GovernorStats]: Counters by provider and model.
+    """
+    with _governors_lock:
+        return {key: g.stats for key, g in _governors.items()}
+
+
+class _LeaderCancelled(Exception):
+    """The call that followers were waiting on was cancelled."""
+
+
+class SingleFlight:
+    """Coalesces identical in-flight calls onto a single underlying call.
+
+    The first caller of a key (the leader) runs the call; callers of the
+    same key arriving while it is in flight (the followers) wait for and
+    share its result or exception.  Nothing is kept once the call
+    completes, so this is not a cache.  Sync and async callers share the
+    same keys: the result is published through a
+    :class:`concurrent.futures.Future`, which threads can block on and
+    tasks can await.
+
+    If an async leader is cancelled, its followers retry and one of them
+    becomes the new leader.
+
+    Example:
+        >>> flight = SingleFlight()
+        >>> flight.do(('search', 'wikidata', 'Paris'), search, 'Paris')
+
+    Args:
+        name (str, optional): Name used in log messages.
+    """
+
+    _name: str
+    _lock: threading.Lock
+    _calls: dict[Hashable, concurrent.futures.Future]
+    _coalesced: int
+
+    def __init__(self, name: str = 'singleflight'):
+        self._name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._coalesced = 0
+
+    @property
+    def coalesced(self) -> int:
+        """Number of calls answered by another in-flight call."""
+        return self._coalesced
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def _join(
+        self, key: Hashable
+    ) -> Tuple[bool, concurrent.futures.Future]:
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._coalesced += 1
+                return False, future
+            future = concurrent.futures.Future()
+            self._calls[key] = future
+            return True, future
+
+    def _leave(self, key: Hashable) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def do(
+        self,
+        key: Hashable,
+        fn: Callable[..., T],
+        *args: Any,
+        **kwargs: Any,
+    ) -> T:
+        """Calls `fn` unless an identical call is already in flight.
+
+        Args:
+            key (Hashable): Call key.
+            fn (Callable[..., T]): Function.
+            *args: Positional arguments for `fn`.
+            **kwargs: Keyword arguments for `fn`.
+
+        Returns:
+            T: The result of `fn` (possibly computed by another caller).
+        """
+        while True:
+            leader, future = self._join(key)
+            if not leader:
+                try:
+                    return future.result()
+                except _LeaderCancelled:
+                    continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as err:
+                self._leave(key)
+                future.set_exception(err)
+                raise
+            self._leave(key)
+            future.set_result(result)
+            return result
+
+    async def ado(
+        self,
+        key: Hashable,
+        fn: Callable[..., Awaitable[T]],
+        *args: Any,
+        **kwargs: Any,
+    ) -> T:
+        """Awaits `fn` unless an identical call is already in flight.
+
+        Args:
+            key (Hashable): Call key.
+            fn (Callable[..., Awaitable[T]]): Coroutine function.
+            *args: Positional arguments for `fn`.
+            **kwargs: Keyword arguments for `fn`.
+
+        Returns:
+            T: The result of `fn` (possibly computed by another caller).
+        """
+        while True:
+            leader, future = self._join(key)
+            if not leader:
+                try:
+                    # Shielded: a cancelled follower must not cancel the
+                    # shared future.
+                    return await asyncio.shield(asyncio.wrap_future(future))
+                except _LeaderCancelled:
+                    continue
+            try:
+                result = await fn(*args, **kwargs)
+            except asyncio.CancelledError:
+                self._leave(key)
+                future.set_exception(_LeaderCancelled())
+                raise
+            except BaseException as err:
+                self._leave(key)
+                future.set_exception(err)
+                raise
+            self._leave(key)
+            future.set_result(result)
+            return result
+
+
+#: Process-wide singleflight shared by kbel and its clients; keys should be
+#: tuples starting with a namespace, e.g. ``('search', ...)``.
+default_singleflight = SingleFlight()
+
+
+__all__ = (
+    'DEFAULT_GOVERNOR_LIMITS',
+    'Governor',
+    'GovernorKey',
+    'GovernorLimits',
+    'GovernorStats',
+    'SingleFlight',
+    'configure_governor',
+    'default_singleflight',
+    'get_governor',
+    'governor_stats',
+    'set_default_governor_limits',
+)
@@ -1,3 +1,5 @@
+import asyncio
+import json
 import logging
 from abc import abstractmethod
 from typing import (Any, AsyncIterator, ClassVar, Final, Iterator, Optional,
@@ -5,6 +7,8 @@ from typing import (Any, AsyncIterator, ClassVar, Final, Iterator, Optional,
 
 from kif_lib import Entity, Item, KIF_Object, Property, Search
 
+from ..concurrency import default_singleflight
+
 LOG = logging.getLogger(__name__)
 
 T = TypeVar("T", bound=Entity)
@@ -41,6 +45,10 @@ class Disambiguator:
     #: Registry of all available disambiguator plugins.
     registry: Final[dict[str, type['Disambiguator']]] = {}
 
+    #: Keyword arguments that influence the disambiguation result, e.g.,
+    #: the sentence in which the label occurs.
+    context_keys: ClassVar[tuple[str, ...]] = ()
+
     @classmethod
     def _register(
         cls,
@@ -73,6 +81,25 @@ class Disambiguator:
         return super().__new__(
             cls.registry[disambiguator_name])  # pyright: ignore
 
+    def context_fingerprint(self, **kwargs: Any) -> str:
+        """Fingerprints the disambiguation context of a call.
+
+        Only the keyword arguments listed in `context_keys` are taken into
+        account, so disambiguators that ignore the context yield the same
+        fingerprint for every sentence.
+
+        Args:
+            **kwargs: Keyword arguments of the disambiguation call.
+
+        Returns:
+            str: Context fingerprint.
+        """
+        context = {
+            key: kwargs[key] for key in self.context_keys
+            if kwargs.get(key) is not None}
+        return f'{self.disambiguator_name}:' + json.dumps(
+            context, sort_keys=True, default=str)
+
     def disambiguate_item(
         self,
         label: str,
@@ -115,6 +142,63 @@ class Disambiguator:
         """
         return self.disambiguate(label, searcher, Property, limit, language, *args, **kwargs)
 
+    async def adisambiguate_item(
+        self,
+        label: str,
+        searcher: Search,
+        limit = 100,
+        language = 'en',
+        *args: Any,
+        **kwargs: Any) -> list[Tuple[str, str, Item]]:
+        """Asynchronously disambiguates a label among Item candidates.
+
+        See :meth:`disambiguate_item`.
+        """
+        return await self.adisambiguate_label(
+            label, searcher, Item, limit, language, *args, **kwargs)
+
+    async def adisambiguate_property(
+        self,
+        label: str,
+        searcher: Search,
+        limit = 100,
+        language = 'en',
+        *args: Any,
+        **kwargs: Any) -> list[Tuple[str, str, Property]]:
+        """Asynchronously disambiguates a label among Property candidates.
+
+        See :meth:`disambiguate_property`.
+        """
+        return await self.adisambiguate_label(
+            label, searcher, Property, limit, language, *args, **kwargs)
+
+    @staticmethod
+    def _search_key(
+            searcher: Search, cls: Type[Entity], label: str,
+            limit: Optional[int] = None) -> tuple:
+        if limit is None:
+            limit = getattr(searcher, 'limit', None)
+        return ('search', getattr(searcher, 'search_name', id(searcher)),
+                limit, getattr(searcher, 'language', None), cls.__name__,
+                label)
+
+    @staticmethod
+    def _to_candidates(
+        found: list[Tuple[Entity, dict[str, Any]]],
+        language: str,
+    ) -> list[Candidate]:
+        def extract_text(data: dict[str, Any], key: str) -> str:
+            """Extract the text for a given key and language."""
+            value = data.get(key, {}).get(language)
+            return value.content if value else ''
+
+        return [{
+            'id': entity.iri.content,
+            'label': extract_text(desc, 'labels'),
+            'description': extract_text(desc, 'descriptions'),
+            'iri': entity.iri.content,
+        } for entity, desc in found]  # type: ignore
+
     def disambiguate(
         self,
         label: str,
@@ -123,6 +207,7 @@ class Disambiguator:
         limit = 10,
         language = 'en',
         *args: Any,
+        search_limit: Optional[int] = None,
         **kwargs: Any
     ) -> list[Tuple[str, str, T]]:
         """Core method to disambiguate a label among candidates from the knowledge base.
@@ -133,11 +218,15 @@ class Disambiguator:
             cls (Type[T]): Entity type (Item or Property).
             limit (int, optional): Maximum number of candidates to consider. Defaults to 10.
             language (str, optional): Language code for labels/descriptions. Defaults to 'en'.
+            search_limit (Optional[int], optional): Maximum number of candidates fetched
+                by this search; defaults to the searcher's limit.
 
         Returns:
             list[Tuple[str, str, T]]: List of tuples with label, description, and entity.
         """
 
+        options = {} if search_limit is None else {'limit': search_limit}
+
         def safe_next(it: Iterator) -> Iterator:
             """Safely iterate over an iterator, skipping errors."""
             while True:
@@ -149,36 +238,78 @@ class Disambiguator:
                     logging.info(f'Error fetching item: {e}')
                     continue
 
-        def extract_text(data: dict[str, Any], key: str) -> str:
-            """Extract the text for a given key and language."""
-            value = data.get(key, {}).get(language)
-            return value.content if value else ''
-
-        try:
+        def search() -> list[Tuple[Entity, dict[str, Any]]]:
             if cls is Item:
-                found_candidates = searcher.item_descriptor(search=label)
-            elif cls is Property:
-                found_candidates = searcher.property_descriptor(search=label)
+                found = searcher.item_descriptor(search=label, **options)
             else:
-                return []
-        except Exception as e:
-            raise e
+                found = searcher.property_descriptor(search=label, **options)
+            # Materialized, so the result can be shared by coalesced calls.
+            return list(safe_next(iter(found))) if found else []
 
-        if not found_candidates:
+        if cls is not Item and cls is not Property:
             return []
 
-        candidates = []
-        for entity, desc in safe_next(iter(found_candidates)):
-            candidate = {
-                'id': entity.iri.content,
-                'label': extract_text(desc, 'labels'),
-                'description': extract_text(desc, 'descriptions'),
-                'iri': entity.iri.content,
-            }
-            candidates.append(candidate)
+        # Identical lookups in flight (e.g., the same label in concurrent
+        # questions) share a single search call.
+        key = self._search_key(searcher, cls, label, search_limit)
+        found_candidates = default_singleflight.do(key, search)
 
+        if not found_candidates:
+            return []
+
+        candidates = self._to_candidates(found_candidates, language)
         return self.disambiguate_candidates(label, candidates, cls, limit, *args, **kwargs)
 
+    async def adisambiguate_label(
+        self,
+        label: str,
+        searcher: Search,
+        cls: Type[T],
+        limit = 10,
+        language = 'en',
+        *args: Any,
+        search_limit: Optional[int] = None,
+        **kwargs: Any
+    ) -> list[Tuple[str, str, T]]:
+        """Asynchronously disambiguates a label among candidates from the knowledge base.
+
+        Candidates are fetched through the searcher's async API, so no
+        thread is held while the search or the disambiguation is in flight.
+        See :meth:`disambiguate`.
+        """
+
+        options = {} if search_limit is None else {'limit': search_limit}
+
+        async def search() -> list[Tuple[Entity, dict[str, Any]]]:
+            if cls is Item:
+                found = searcher.aitem_descriptor(search=label, **options)
+            else:
+                found = searcher.aproperty_descriptor(search=label, **options)
+            results = []
+            it = aiter(found)
+            while True:
+                try:
+                    results.append(await anext(it))
+                except StopAsyncIteration:
+                    break
+                except Exception as e:
+                    logging.info(f'Error fetching item: {e}')
+                    break
+            return results
+
+        if cls is not Item and cls is not Property:
+            return []
+
+        key = self._search_key(searcher, cls, label, search_limit)
+        found_candidates = await default_singleflight.ado(key, search)
+
+        if not found_candidates:
+            return []
+
+        candidates = self._to_candidates(found_candidates, language)
+        return await self.adisambiguate_candidates(
+            label, candidates, cls, limit, *args, **kwargs)
+
     def disambiguate_candidates(
         self,
         label: str,
@@ -208,6 +339,25 @@ class Disambiguator:
                 disamb_entities.append((_label, description, cls(iri=entity))) # type: ignore
         return disamb_entities
 
+    async def adisambiguate_candidates(
+        self,
+        label: str,
+        candidates: list[Candidate],
+        cls: Type[T],
+        limit: int = 10,
+        *args: Any,
+        **kwargs: Any,
+    ) -> list[Tuple[str, str, T]]:
+        """Asynchronously disambiguates a list of candidates.
+
+        See :meth:`disambiguate_candidates`.
+        """
+        assert len(candidates) > 0, 'No candidates to disambiguate'
+        results = await self._adisambiguate(
+            label, candidates, limit, *args, **kwargs)
+        return [(_label, description, cls(iri=entity))  # type: ignore
+                for _label, description, entity in results or ()]
+
     async def adisambiguate(
         self,
         label: str,
@@ -228,10 +378,22 @@ class Disambiguator:
         Yields:
             AsyncIterator[Tuple[str, str, T]]: Tuples with label, description, and entity instance.
         """
-        results = self._disambiguate(label, candidates, limit, *args, **kwargs)
+        results = await self._adisambiguate(
+            label, candidates, limit, *args, **kwargs)
         for label, description, entity in results:
             yield (label, description, cls(iri=entity)) # type: ignore
 
+    async def _adisambiguate(self, label, candidates: list[Candidate], limit: int, *args,
+                             **kwargs) -> list[Tuple[str, str, str]]:
+        """Asynchronous counterpart of :meth:`_disambiguate`.
+
+        Subclasses that do I/O (e.g., call a model) should override it with
+        a native implementation; by default, :meth:`_disambiguate` runs in a
+        worker thread.
+        """
+        return await asyncio.to_thread(
+            self._disambiguate, label, candidates, limit, *args, **kwargs)
+
     @abstractmethod
     def _disambiguate(self, label, candidates: list[Candidate], limit: int, *args,
                       **kwargs) -> list[Tuple[str, str, str]]:
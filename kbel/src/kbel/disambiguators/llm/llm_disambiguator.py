@@ -3,7 +3,10 @@ from textwrap import dedent
 from typing import Any, Literal, Optional, Tuple
 
 from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
 
+from ...concurrency import default_singleflight
+from ...language_models import governed
 from ..abc import Candidate, Disambiguator
 from .constants import EL_DEFAULT_EXAMPLES, EL_DEFAULT_PROMPT
 from .parsers import CommaSeparatedListOutputParserSet
@@ -35,6 +38,8 @@ class LLM_Disambiguator(Disambiguator, disambiguator_name='llm'):
         [('Python', 'Programming language', 'https://www.wikidata.org/wiki/Q28865')]
     """
 
+    context_keys = ('sentence', 'textual_context')
+
     _model: BaseChatModel
 
     def __init__(
@@ -113,25 +118,56 @@ class LLM_Disambiguator(Disambiguator, disambiguator_name='llm'):
         assert sentence
         textual_context = kwargs.get('textual_context')
 
-        return self.__llm_entity_disambiguation(
-            label,
-            candidates,
-            sentence,
-            textual_context,
-            limit=limit)
+        chain, inputs, key = self.__llm_entity_disambiguation_chain(
+            label, candidates, sentence, textual_context)
+        try:
+            entity_ids = default_singleflight.do(key, chain.invoke, inputs)
+            return self.__select_candidates(
+                label, candidates, entity_ids, limit)
+        except Exception as e:
+            logging.warning(f'Exceptions occured while disambiguating label `{label}`: {e}')
+            raise e
+
+    async def _adisambiguate(
+        self,
+        label: str,
+        candidates: list[Candidate],
+        limit=100,
+        *args,
+        **kwargs,
+    ) -> list[Tuple[str, str, str]]:
+        """Asynchronously disambiguates a label using the LLM.
+
+        See :meth:`_disambiguate`.
+        """
+        assert label, 'Label can not be undefined.'
+
+        sentence = kwargs.get('sentence')
+        assert sentence
+        textual_context = kwargs.get('textual_context')
+
+        chain, inputs, key = self.__llm_entity_disambiguation_chain(
+            label, candidates, sentence, textual_context)
+        try:
+            entity_ids = await default_singleflight.ado(
+                key, chain.ainvoke, inputs)
+            return self.__select_candidates(
+                label, candidates, entity_ids, limit)
+        except Exception as e:
+            logging.warning(f'Exceptions occured while disambiguating label `{label}`: {e}')
+            raise e
 
-    def __llm_entity_disambiguation(
+    def __llm_entity_disambiguation_chain(
             self,
             label: str,
             candidates: list[Candidate],
             sentence: str,
             textual_context: Optional[str] = None,
-            limit: Optional[int] = None
-    ) -> list[Tuple[str, str, str]]:
-        """Internal method that executes the LLM-based disambiguation.
+    ) -> Tuple[Runnable, dict[str, Any], tuple]:
+        """Internal method that builds the LLM-based disambiguation call.
 
-        Constructs a prompt with candidates and optional context, invokes the LLM,
-        parses the output, and returns the selected candidate(s).
+        Constructs a prompt with candidates and optional context, to be
+        sent to the LLM and parsed into candidate IDs.
 
         Args:
             label (str): Label to disambiguate.
@@ -140,30 +176,26 @@ class LLM_Disambiguator(Disambiguator, disambiguator_name='llm'):
             textual_context (Optional[str]): Optional textual context.
 
         Returns:
-            list[Tuple[str, str, str]]: List of tuples containing the label,
-                description, and IRI of the top candidates.
-
-        Raises:
-            ValueError: If the LLM cannot disambiguate the label among the candidates.
+            Tuple[Runnable, dict[str, Any], tuple]: The chain, its inputs,
+                and the singleflight key of the call.
         """
         assert candidates and len(candidates) > 0, f'No candidates to disambiguate the label `{label}`'
-        try:
-            c_prompt = ''
-            for candidate in candidates:
-                c_prompt += f'        ID: {candidate["id"]}'
-
-                c_label = candidate.get("label")
-                if label:
-                    c_label = c_label.strip()
-                    c_prompt += f'\n        Label: {c_label}'
-                description = candidate.get("description")
-                if description:
-                    description = description.strip()
-                    c_prompt += f'\n        Description: {description}'  # noqa E501
-                c_prompt += '\n\n'
-            s_template = EL_DEFAULT_PROMPT + '\n\nExamples:\n' + EL_DEFAULT_EXAMPLES
-            context_template = 'Context: {context}' if textual_context else ''
-            u_template = dedent(f"""Now follow the format strictly.\n
+        c_prompt = ''
+        for candidate in candidates:
+            c_prompt += f'        ID: {candidate["id"]}'
+
+            c_label = candidate.get("label")
+            if label:
+                c_label = c_label.strip()
+                c_prompt += f'\n        Label: {c_label}'
+            description = candidate.get("description")
+            if description:
+                description = description.strip()
+                c_prompt += f'\n        Description: {description}'  # noqa E501
+            c_prompt += '\n\n'
+        s_template = EL_DEFAULT_PROMPT + '\n\nExamples:\n' + EL_DEFAULT_EXAMPLES
+        context_template = 'Context: {context}' if textual_context else ''
+        u_template = dedent(f"""Now follow the format strictly.\n
 Input:
     Sentence: "{{sentence}}"
     Term: "{{term}}"
@@ -172,44 +204,66 @@ Input:
     Candidates:
 {{candidates}}
 Output:""")
-            from langchain_core.prompts import ChatPromptTemplate
-            promp_template = ChatPromptTemplate.from_messages([
-                ('system', s_template), ('human', u_template)
-            ])
-
-            from langchain_core.runnables import RunnableLambda
-
-            debug = RunnableLambda(lambda entry:
-                                    (LOG.debug(entry), entry)[1])
-
-            parser = CommaSeparatedListOutputParserSet()
-            chain = (promp_template
-                        | debug
-                        | self.model
-                        | debug
-                        | parser
-                        | debug)
-
-            sentence = sentence
-            entity_ids = chain.invoke({
-                'context': textual_context,
-                'sentence': sentence,
-                'term': label,
-                'candidates': c_prompt,
-            })
-            if entity_ids:
-                disamb_entities = []
-                for entity_id in entity_ids:
-                    for c in candidates:
-                        c_id = c.get('id')
-                        if c_id:
-                            if entity_id == c_id:
-                                description = c.get('description')
-                                disamb_entities.append(
-                                    (c['label'], description, c['iri']))
-                return disamb_entities[:limit] if limit else disamb_entities
-            raise ValueError(f'Could not disambiguate label `{label}` among the candidates.')
+        from langchain_core.prompts import ChatPromptTemplate
+        promp_template = ChatPromptTemplate.from_messages([
+            ('system', s_template), ('human', u_template)
+        ])
+
+        from langchain_core.runnables import RunnableLambda
+
+        debug = RunnableLambda(lambda entry:
+                               (LOG.debug(entry), entry)[1])
+
+        parser = CommaSeparatedListOutputParserSet()
+        chain = (promp_template
+                 | debug
+                 | governed(self.model)
+                 | debug
+                 | parser
+                 | debug)
+
+        inputs = {
+            'context': textual_context,
+            'sentence': sentence,
+            'term': label,
+            'candidates': c_prompt,
+        }
+        # Identical linking prompts in flight share a single model call.
+        key = ('llm-el', self.model._get_llm_string(),
+               *sorted(inputs.items()))
+        return chain, inputs, key
+
+    @staticmethod
+    def __select_candidates(
+            label: str,
+            candidates: list[Candidate],
+            entity_ids: Optional[list[str]],
+            limit: Optional[int] = None,
+    ) -> list[Tuple[str, str, str]]:
+        """Internal method that maps the IDs chosen by the LLM to candidates.
 
-        except Exception as e:
-            logging.warning(f'Exceptions occured while disambiguating label `{label}`: {e}')
-            raise e
+        Args:
+            label (str): Label to disambiguate.
+            candidates (list[Candidate]): Candidate entities.
+            entity_ids (Optional[list[str]]): IDs answered by the LLM.
+            limit (Optional[int]): Maximum number of candidates to return.
+
+        Returns:
+            list[Tuple[str, str, str]]: List of tuples containing the label,
+                description, and IRI of the top candidates.
+
+        Raises:
+            ValueError: If the LLM cannot disambiguate the label among the candidates.
+        """
+        if entity_ids:
+            disamb_entities = []
+            for entity_id in entity_ids:
+                for c in candidates:
+                    c_id = c.get('id')
+                    if c_id:
+                        if entity_id == c_id:
+                            description = c.get('description')
+                            disamb_entities.append(
+                                (c['label'], description, c['iri']))
+            return disamb_entities[:limit] if limit else disamb_entities
+        raise ValueError(f'Could not disambiguate label `{label}` among the candidates.')
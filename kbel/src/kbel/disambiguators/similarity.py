@@ -62,6 +62,8 @@ class SimilarityDisambiguator(Disambiguator, disambiguator_name='sim'):
         >>> disamb._disambiguate("Python", candidates, limit=1, sentence="Python is used in coding")
         [('Python', 'Programming language', 'https://www.wikidata.org/wiki/Q28865')]
     """
+    context_keys = ('sentence',)
+
     _model: SentenceTransformer
     _similarity_fn: Callable[[np.ndarray, np.ndarray], float]
 
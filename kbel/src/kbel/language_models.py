@@ -0,0 +1,455 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import dataclasses
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from langchain_core.callbacks import (AsyncCallbackManagerForLLMRun,
+                                      CallbackManagerForLLMRun)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (AIMessageChunk, BaseMessage,
+                                     BaseMessageChunk)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict, PrivateAttr
+
+from .concurrency import (DEFAULT_GOVERNOR_LIMITS, Governor, GovernorKey,
+                          get_governor)
+
+LOG = logging.getLogger(__name__)
+
+#: Marks the end of a buffered provider stream.
+_END_OF_STREAM = object()
+
+
+def model_key(model: BaseChatModel) -> GovernorKey:
+    """Gets the (provider, model) key of a chat model.
+
+    Args:
+        model (BaseChatModel): Chat model.
+
+    Returns:
+        GovernorKey: Provider and model identifiers.
+    """
+    provider = model._llm_type
+    for attr in ('model_name', 'model', 'model_id'):
+        value = getattr(model, attr, None)
+        if isinstance(value, str) and value:
+            return (provider, value)
+    return (provider, type(model).__name__)
+
+
+def estimate_tokens(messages: Sequence[BaseMessage]) -> int:
+    """Roughly estimates the number of tokens of `messages`.
+
+    Uses the usual four characters per token rule, which avoids loading a
+    tokenizer for every provider.
+
+    Args:
+        messages (Sequence[BaseMessage]): Messages.
+
+    Returns:
+        int: Estimated number of tokens.
+    """
+    return sum(len(str(m.content)) for m in messages) // 4 + 1
+
+
+def _as_chunk(message: BaseMessage) -> BaseMessageChunk:
+    # Models without native streaming stream their whole answer as a
+    # single (non-chunk) message.
+    if isinstance(message, BaseMessageChunk):
+        return message
+    return AIMessageChunk(
+        content=message.content,
+        id=message.id,
+        response_metadata=message.response_metadata,
+        usage_metadata=getattr(message, 'usage_metadata', None))
+
+
+def _usage_tokens(message: BaseMessage) -> Optional[int]:
+    usage = getattr(message, 'usage_metadata', None)
+    if usage:
+        return usage.get('total_tokens')
+    return None
+
+
+class GovernedChatModel(BaseChatModel):
+    """Chat model whose calls are admitted by a :class:`Governor`.
+
+    Every call holds a slot of the governor, and the token estimate of the
+    prompt is replaced by the reported usage when the provider returns it.
+    Streamed calls hold their slot only while the provider is streaming:
+    chunks are read into a buffer under the slot and handed to the caller
+    from there, so a caller that makes further calls to the same governor
+    while consuming the stream cannot starve it.
+
+    Example:
+        >>> model = governed(ChatOpenAI(model='gpt-4o'))
+        >>> model.invoke('Hello!')
+
+    Attributes:
+        model (BaseChatModel): Underlying chat model.
+        governor (Governor): Governor that admits the calls.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model: BaseChatModel
+    governor: Governor
+
+    @property
+    def _llm_type(self) -> str:
+        return f'governed-{self.model._llm_type}'
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {'model': self.model._get_llm_string()}
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        with self.governor.slot(estimate_tokens(messages)) as ticket:
+            message = self.model.invoke(messages, stop=stop, **kwargs)
+            self._record_usage(ticket, message)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        async with self.governor.aslot(estimate_tokens(messages)) as ticket:
+            message = await self.model.ainvoke(messages, stop=stop, **kwargs)
+            self._record_usage(ticket, message)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        chunks: queue.Queue = queue.Queue()
+        closed = threading.Event()
+
+        def pump() -> None:
+            try:
+                with self.governor.slot(estimate_tokens(messages)) as ticket:
+                    for chunk in self.model.stream(
+                            messages, stop=stop, **kwargs):
+                        self._record_usage(ticket, chunk)
+                        if closed.is_set():
+                            break
+                        chunks.put(chunk)
+            except BaseException as err:
+                chunks.put(err)
+            else:
+                chunks.put(_END_OF_STREAM)
+
+        thread = threading.Thread(
+            target=contextvars.copy_context().run, args=(pump,),
+            name='kbel-governed-stream', daemon=True)
+        thread.start()
+        try:
+            while (item := chunks.get()) is not _END_OF_STREAM:
+                if isinstance(item, BaseException):
+                    raise item
+                yield ChatGenerationChunk(message=_as_chunk(item))
+        finally:
+            # Closing the generator early stops the provider stream at its
+            # next chunk, which releases the slot.
+            closed.set()
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        chunks: asyncio.Queue = asyncio.Queue()
+
+        async def pump() -> None:
+            try:
+                async with self.governor.aslot(
+                        estimate_tokens(messages)) as ticket:
+                    async for chunk in self.model.astream(
+                            messages, stop=stop, **kwargs):
+                        self._record_usage(ticket, chunk)
+                        chunks.put_nowait(chunk)
+            except BaseException as err:
+                # Cancellations and exits also end the stream of the
+                # consumer, and are propagated to the pump's task.
+                chunks.put_nowait(err)
+                raise
+            else:
+                chunks.put_nowait(_END_OF_STREAM)
+
+        task = asyncio.ensure_future(pump())
+        # The error is handed to the consumer through the buffer.
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        try:
+            while (item := await chunks.get()) is not _END_OF_STREAM:
+                if isinstance(item, BaseException):
+                    raise item
+                yield ChatGenerationChunk(message=_as_chunk(item))
+        finally:
+            # Closing the generator early cancels the provider stream, which
+            # releases the slot.
+            task.cancel()
+
+    def _record_usage(self, ticket: list, message: BaseMessage) -> None:
+        tokens = _usage_tokens(message)
+        if tokens:
+            self.governor.record_tokens(ticket, tokens)
+
+
+def governed(
+    model: BaseChatModel,
+    governor: Optional[Governor] = None,
+) -> BaseChatModel:
+    """Routes the calls to `model` through a governor.
+
+    Args:
+        model (BaseChatModel): Chat model.
+        governor (Optional[Governor]): Governor; defaults to the process-wide
+            governor of the model's provider and identifier.
+
+    Returns:
+        BaseChatModel: Governed chat model.
+    """
+    if isinstance(model, (GovernedChatModel, HedgedChatModel)):
+        # Each side of a hedged model is governed on its own.
+        return model
+    if governor is None:
+        governor = get_governor(*model_key(model))
+    return GovernedChatModel(model=model, governor=governor)
+
+
+@dataclasses.dataclass
+class HedgeStats:
+    """Counters of a hedged chat model.
+
+    Attributes:
+        requests (int): Number of calls.
+        hedged (int): Number of calls sent to the secondary model.
+        primary_wins (int): Number of calls answered by the primary model.
+        secondary_wins (int): Number of calls answered by the secondary
+            model.
+        errors (int): Number of calls that failed on both models.
+    """
+    requests: int = 0
+    hedged: int = 0
+    primary_wins: int = 0
+    secondary_wins: int = 0
+    errors: int = 0
+
+    @property
+    def hedge_rate(self) -> float:
+        return self.hedged / self.requests if self.requests else 0.0
+
+
+# A hedged call may hold two workers (primary and secondary), so the pool
+# fits twice the default admission budget of the governors.
+_hedge_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=2 * (DEFAULT_GOVERNOR_LIMITS.max_concurrency or 16),
+    thread_name_prefix='kbel-hedge')
+
+
+class HedgedChatModel(BaseChatModel):
+    """Chat model that hedges slow calls with a secondary model.
+
+    A call goes to the primary model first; if it has not answered within
+    the hedging delay (or has failed), the same call is sent to the
+    secondary model and the first successful answer wins (in async calls
+    the loser is cancelled).  If one side fails, the other one's answer is
+    awaited.
+
+    The delay is `delay`, if given, or else the `percentile` of the
+    latencies of the primary model over its last `window` calls (or
+    `initial_delay` until `min_samples` calls are observed).  Each side is
+    admitted by its own governor.  Streamed calls are hedged as a whole,
+    i.e., the answer is returned as a single chunk.
+
+    Example:
+        >>> model = HedgedChatModel(
+        ...     primary=ChatOpenAI(model='gpt-4o'),
+        ...     secondary=ChatOllama(model='llama3.1'),
+        ...     percentile=0.95)
+        >>> model.invoke('Hello!')
+        >>> model.stats
+        HedgeStats(requests=1, hedged=0, primary_wins=1, ...)
+
+    Attributes:
+        primary (BaseChatModel): Primary chat model.
+        secondary (BaseChatModel): Secondary chat model.
+        percentile (float): Percentile of the primary latencies used as
+            hedging delay.
+        delay (Optional[float]): Fixed hedging delay (in seconds).
+        initial_delay (float): Hedging delay (in seconds) until enough
+            latencies are observed.
+        min_samples (int): Number of latencies needed to use `percentile`.
+        window (int): Number of latest latencies kept.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    primary: BaseChatModel
+    secondary: BaseChatModel
+    percentile: float = 0.95
+    delay: Optional[float] = None
+    initial_delay: float = 2.0
+    min_samples: int = 20
+    window: int = 200
+
+    _latencies: deque = PrivateAttr(default_factory=deque)
+    _stats: HedgeStats = PrivateAttr(default_factory=HedgeStats)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return f'hedged-{self.primary._llm_type}'
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {
+            'primary': self.primary._get_llm_string(),
+            'secondary': self.secondary._get_llm_string(),
+        }
+
+    @property
+    def stats(self) -> HedgeStats:
+        return self._stats
+
+    @property
+    def hedging_delay(self) -> float:
+        """The current hedging delay (in seconds)."""
+        if self.delay is not None:
+            return self.delay
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < self.min_samples:
+            return self.initial_delay
+        return latencies[min(
+            int(self.percentile * len(latencies)), len(latencies) - 1)]
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        delay = self.hedging_delay
+        self._count('requests')
+        started = threading.Event()
+
+        def call_primary() -> BaseMessage:
+            # The latency and the hedging delay are measured from when the
+            # primary actually starts, not from when it is queued in the
+            # pool.  The latency is observed even if the primary loses, as
+            # it keeps running after the secondary answers.
+            start = time.monotonic()
+            started.set()
+            try:
+                return governed(self.primary).invoke(
+                    messages, stop=stop, **kwargs)
+            finally:
+                self._observe(time.monotonic() - start)
+
+        primary = _hedge_executor.submit(call_primary)
+        futures = {primary: 'primary'}
+        started.wait()
+        done, _ = concurrent.futures.wait(futures, timeout=delay)
+        if not done or primary.exception() is not None:
+            self._count('hedged')
+            futures[_hedge_executor.submit(
+                governed(self.secondary).invoke,
+                messages, stop=stop, **kwargs)] = 'secondary'
+        error: Optional[BaseException] = None
+        for future in concurrent.futures.as_completed(futures):
+            if future.exception() is not None:
+                error = future.exception()
+                continue
+            # The loser keeps running in its thread; its answer is dropped.
+            self._count(f'{futures[future]}_wins')
+            return ChatResult(
+                generations=[ChatGeneration(message=future.result())])
+        self._count('errors')
+        assert error is not None
+        raise error
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        delay = self.hedging_delay
+        self._count('requests')
+        start = time.monotonic()
+        primary = asyncio.ensure_future(
+            governed(self.primary).ainvoke(messages, stop=stop, **kwargs))
+        tasks = {primary: 'primary'}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done or primary.exception() is not None:
+                self._count('hedged')
+                tasks[asyncio.ensure_future(
+                    governed(self.secondary).ainvoke(
+                        messages, stop=stop, **kwargs))] = 'secondary'
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task is primary:
+                        self._observe(time.monotonic() - start)
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    self._count(f'{tasks[task]}_wins')
+                    return ChatResult(
+                        generations=[ChatGeneration(message=task.result())])
+            self._count('errors')
+            assert error is not None
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            if primary.cancelled() or not primary.done():
+                # A cancelled primary took at least this long.
+                self._observe(time.monotonic() - start)
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self._stats, counter, getattr(self._stats, counter) + 1)
+
+    def _observe(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+            while len(self._latencies) > self.window:
+                self._latencies.popleft()
+
+
+__all__ = (
+    'GovernedChatModel',
+    'HedgeStats',
+    'HedgedChatModel',
+    'estimate_tokens',
+    'governed',
+    'model_key',
+)
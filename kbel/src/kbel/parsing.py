@@ -0,0 +1,237 @@
+import dataclasses
+import json
+import logging
+import re
+import threading
+from typing import Any, Optional, TypeVar
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.outputs import Generation
+from langchain_core.utils.json import \
+    parse_partial_json as _lc_parse_partial_json
+from pydantic import BaseModel
+
+LOG = logging.getLogger(__name__)
+
+TBaseModel = TypeVar("TBaseModel", bound=BaseModel)
+
+
+@dataclasses.dataclass
+class ParseStats:
+    """Counters of an output parser.
+
+    Attributes:
+        parsed (int): Number of responses that were valid as generated.
+        repaired (int): Number of responses that were parsed after repair.
+        failed (int): Number of responses that could not be parsed.
+    """
+    parsed: int = 0
+    repaired: int = 0
+    failed: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.parsed + self.repaired + self.failed
+
+    @property
+    def repair_rate(self) -> float:
+        return self.repaired / self.total if self.total else 0.0
+
+    @property
+    def failure_rate(self) -> float:
+        return self.failed / self.total if self.total else 0.0
+
+
+_parse_stats: dict[str, ParseStats] = {}
+_parse_stats_lock = threading.Lock()
+
+
+def get_parse_stats(name: str) -> ParseStats:
+    """Gets the counters of the parsers named `name`.
+
+    Args:
+        name (str): Parser name.
+
+    Returns:
+        ParseStats: Counters shared by every parser of that name.
+    """
+    with _parse_stats_lock:
+        stats = _parse_stats.get(name)
+        if stats is None:
+            stats = _parse_stats[name] = ParseStats()
+        return stats
+
+
+def parse_stats() -> dict[str, ParseStats]:
+    """Gets the counters of all parsers, by parser name.
+
+    Returns:
+        dict[str, ParseStats]: Counters.
+    """
+    with _parse_stats_lock:
+        return dict(_parse_stats)
+
+
+def record_parse(name: str, status: str) -> None:
+    """Counts a response of the parsers named `name`.
+
+    Args:
+        name (str): Parser name.
+        status (str): One of ``parsed``, ``repaired`` or ``failed``.
+    """
+    stats = get_parse_stats(name)
+    with _parse_stats_lock:
+        setattr(stats, status, getattr(stats, status) + 1)
+
+
+_THINK_RE = re.compile(r'<think>.*?</think>', re.DOTALL)
+_FENCE_RE = re.compile(r'```(?:json)?\s*(.*?)(?:```|$)', re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r',\s*([\]}])')
+_DANGLING_KEY_RE = re.compile(r'"(?:[^"\\]|\\.)*"\s*:\s*$')
+
+
+def extract_json(text: str) -> str:
+    """Extracts the JSON part of a model response.
+
+    Removes reasoning (``<think>``) blocks, Markdown code fences and any
+    text before the first JSON array or object.
+
+    Args:
+        text (str): Model response.
+
+    Returns:
+        str: JSON text (possibly invalid or truncated).
+    """
+    text = _THINK_RE.sub('', text)
+    match = _FENCE_RE.search(text)
+    if match:
+        text = match.group(1)
+    starts = [i for i in (text.find('['), text.find('{')) if i >= 0]
+    if starts:
+        text = text[min(starts):]
+    return text.strip()
+
+
+def _drop_unterminated_string(text: str) -> str:
+    """Drops a trailing unterminated string from truncated JSON.
+
+    The string was cut short, so its value cannot be trusted; if it is the
+    value of an object member, the member's key is dropped too.
+    """
+    start = None
+    escaped = False
+    for i, c in enumerate(text):
+        if start is not None:
+            if escaped:
+                escaped = False
+            elif c == '\\':
+                escaped = True
+            elif c == '"':
+                start = None
+        elif c == '"':
+            start = i
+    if start is None:
+        return text
+    text = text[:start].rstrip()
+    return _DANGLING_KEY_RE.sub('', text).rstrip(', \n')
+
+
+def parse_partial_json(text: str) -> Any:
+    """Parses partially valid JSON.
+
+    Besides the surroundings removed by :func:`extract_json`, trailing
+    commas are dropped and truncated output (arrays and objects) is closed.
+    A trailing unterminated string is dropped rather than closed, as it was
+    cut short, and so is a trailing empty object left by the truncation of
+    an array.
+
+    Args:
+        text (str): Model response.
+
+    Returns:
+        Any: Parsed value.
+
+    Raises:
+        ValueError: `text` could not be repaired.
+    """
+    text = _TRAILING_COMMA_RE.sub(r'\1', extract_json(text)).rstrip(', \n')
+    text = _drop_unterminated_string(text)
+    value = _lc_parse_partial_json(text)
+    if value is None:
+        raise ValueError(f'Could not repair JSON: {text[:80]!r}')
+    if isinstance(value, list) and value and value[-1] == {}:
+        value.pop()
+    return value
+
+
+def loads_tolerant(text: str, name: str) -> Any:
+    """Parses JSON, repairing it if needed, and counts the outcome.
+
+    Args:
+        text (str): Model response.
+        name (str): Parser name under which the outcome is counted.
+
+    Returns:
+        Any: Parsed value.
+
+    Raises:
+        ValueError: `text` could not be parsed nor repaired.
+    """
+    try:
+        value = json.loads(extract_json(text))
+    except ValueError:
+        pass
+    else:
+        record_parse(name, 'parsed')
+        return value
+    try:
+        value = parse_partial_json(text)
+    except ValueError:
+        record_parse(name, 'failed')
+        raise
+    LOG.debug(f'{name}: repaired malformed JSON response')
+    record_parse(name, 'repaired')
+    return value
+
+
+class RepairingPydanticOutputParser(PydanticOutputParser[TBaseModel]):
+    """Pydantic output parser that repairs partially valid JSON.
+
+    Malformed responses (truncated output, trailing commas, surrounding
+    text) are repaired instead of raising, so they do not cost a retry of
+    the model call.  Outcomes are counted under the parser `name` (see
+    :func:`parse_stats`).
+    """
+
+    name: Optional[str] = 'pydantic'
+
+    def parse_result(
+        self, result: list[Generation], *, partial: bool = False
+    ) -> Optional[TBaseModel]:
+        if partial:
+            return super().parse_result(result, partial=True)
+        return self.parse(result[0].text)
+
+    def parse(self, text: str) -> TBaseModel:
+        try:
+            value = loads_tolerant(text, self.name or 'pydantic')
+            return self._parse_obj(value)
+        except OutputParserException:
+            raise
+        except Exception as e:
+            raise OutputParserException(
+                f'Failed to parse {self.pydantic_object.__name__} from '
+                f'completion {text!r}: {e}', llm_output=text) from e
+
+
+__all__ = (
+    'ParseStats',
+    'RepairingPydanticOutputParser',
+    'extract_json',
+    'get_parse_stats',
+    'loads_tolerant',
+    'parse_partial_json',
+    'parse_stats',
+    'record_parse',
+)
@@ -1,3 +1,5 @@
+import threading
+
 from kif_lib import IRI, Context, Search, Store
 from kif_lib.model import FullFingerprint
 from kifqa import KIFQA
@@ -21,7 +23,25 @@ def list_stores():
     return stores
 
 
-def query(model, query: str, annotated: bool, store: str):
+# KIFQA instances per (model, store), shared by all requests: a KIFQA
+# keeps no per-question state, so one warmed-up instance (models,
+# embeddings, caches) can answer concurrent questions.
+_kifqa_instances = {}
+_kifqa_instances_lock = threading.Lock()
+
+
+def get_kifqa(model, store: str) -> KIFQA:
+    key = (id(model), store)
+    with _kifqa_instances_lock:
+        entry = _kifqa_instances.get(key)
+        # The model is kept in the entry so that its id is not reused.
+        if entry is None or entry[0] is not model:
+            entry = (model, _build_kifqa(model, store))
+            _kifqa_instances[key] = entry
+        return entry[1]
+
+
+def _build_kifqa(model, store: str) -> KIFQA:
     kb = Store(store)
 
     ctx = Context.top()
@@ -39,9 +59,19 @@ def query(model, query: str, annotated: bool, store: str):
     if store == 'pubchem':
         search = Search('pubchem')
 
-    kifqa = KIFQA(store=kb, search=search, model=model)
+    return KIFQA(store=kb, search=search, model=model)
 
-    stmts = kifqa.query_annotated(query) if annotated else kifqa.query(query)
+
+def query(model, query: str, annotated: bool, store: str):
+    kifqa = get_kifqa(model, store)
+
+    result = kifqa.query(query)
+    stmts = result
+    if annotated:
+        stmts = (
+            stmt
+            for filter in result.kif_filters
+            for stmt in kifqa.filter_annotated(filter))
     statements = []
     for stmt in stmts:
         value = stmt.snak.value
@@ -72,7 +102,7 @@ def query(model, query: str, annotated: bool, store: str):
 
         statements.append(statement)
 
-    pattern = kifqa.triple_pattern
+    pattern = result.triple_pattern
     logical_form = [
         {
             "subject": p.subject,
@@ -83,7 +113,7 @@ def query(model, query: str, annotated: bool, store: str):
     ]
 
 
-    items = kifqa.items
+    items = result.items
     candidate_items = [
         {
             "iri": i[2].iri.content,
@@ -93,7 +123,7 @@ def query(model, query: str, annotated: bool, store: str):
         for i in items
     ]
 
-    properties = kifqa.properties
+    properties = result.properties
 
     candidate_properties = [
         {
@@ -104,7 +134,7 @@ def query(model, query: str, annotated: bool, store: str):
         for p in properties
     ]
 
-    filters = kifqa.kif_filters
+    filters = result.kif_filters
     candidate_filters = []
     for f in filters:
         subject = None
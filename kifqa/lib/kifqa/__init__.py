@@ -1,3 +1,3 @@
-from .kifqa import KIFQA
+from .kifqa import KIFQA, QueryResult
 
-__all__ = ('KIFQA',)
+__all__ = ('KIFQA', 'QueryResult')
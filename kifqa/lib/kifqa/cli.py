@@ -12,7 +12,7 @@ from kif_lib import (Filter, Item, KIF_Object, Property, Search, Statement,
                      Store, Value)
 from kif_lib.model import FullFingerprint
 
-from kifqa import KIFQA
+from kifqa import KIFQA, QueryResult
 
 try:
     from rich.console import Console
@@ -87,10 +87,10 @@ def generate_filter(args):
     store = _mk_store(args.store)
     kifqa = KIFQA(store=store, search=search, config_path=args.config)
     if args.question:
-        kifqa.generate_filters(args.question)
-        if kifqa.triples:
-            for t in kifqa.triples:
-                console.print(t)
+        result = kifqa.generate_filters(
+            kifqa.get_logical_form(args.question), args.question)
+        for t in result.triples:
+            console.print(t)
 
 
 def _list_available_stores():
@@ -133,7 +133,6 @@ def eval_ask(args):
             raise FileNotFoundError(f"File '{args.input_dataset}' not found.")
 
         for entry in read_dataset(args.input_dataset):
-            kifqa.reset()
             id = entry['id']
             if id in cache_entries:
                 continue
@@ -150,8 +149,11 @@ def eval_ask(args):
             gold_prop = KIF_Object.from_ast(entry['predicate'])
             gold_obj = KIF_Object.from_ast(entry['object'])
 
+            result = QueryResult(question)
             try:
-                our_filter = kifqa.generate_filters(question)
+                our_filter = kifqa.generate_filters(
+                    kifqa.get_logical_form(question, result=result),
+                    question, result=result).kif_filters
 
                 if our_filter:
                     ask = False
@@ -173,8 +175,8 @@ def eval_ask(args):
                     jsonl['ask'] = ask
 
                     filters = []
-                    if kifqa.triples:
-                        for triple in kifqa.triples:
+                    if result.triples:
+                        for triple in result.triples:
                             filters.append([
                                 triple[0].iri.content if triple[0] else None,
                                 triple[1].iri.content if triple[1] else None,
@@ -183,8 +185,8 @@ def eval_ask(args):
                     jsonl['filter'] = filters
 
                     labels = []
-                    if kifqa.disambiguated_labels:
-                        for t_labels in kifqa.disambiguated_labels:
+                    if result.disambiguated_labels:
+                        for t_labels in result.disambiguated_labels:
                             labels.append([
                                 t_labels[0] if t_labels[0] else '?x',
                                 t_labels[1] if t_labels[1] else '?x',
@@ -192,9 +194,9 @@ def eval_ask(args):
                             ])
                     jsonl['triples'] = labels
                 else:
-                    # tr = kifqa.triples if kifqa.triples else ''
-                    la = kifqa.disambiguated_labels if kifqa.disambiguated_labels else ''
-                    q2t = kifqa.q2t_labels if kifqa.q2t_labels else ''
+                    # tr = result.triples if result.triples else ''
+                    la = result.disambiguated_labels if result.disambiguated_labels else ''
+                    q2t = result.q2t_labels if result.q2t_labels else ''
 
                     jsonl['error'] = True
                     jsonl[
@@ -202,14 +204,14 @@ def eval_ask(args):
             except Exception as e:
                 jsonl['error'] = True
                 jsonl['ask'] = False
-                # tr = kifqa.triples if kifqa.triples else ''
-                la = kifqa.disambiguated_labels if kifqa.disambiguated_labels else ''
-                q2t = kifqa.q2t_labels if kifqa.q2t_labels else ''
+                # tr = result.triples if result.triples else ''
+                la = result.disambiguated_labels if result.disambiguated_labels else ''
+                q2t = result.q2t_labels if result.q2t_labels else ''
 
                 jsonl[
                     'error_message'] = f'Error: labels={{{la}}} q2t_labels={{{q2t}}}: {e}'
 
-            jsonl['q2t_labels'] = kifqa.q2t_labels if kifqa.q2t_labels else []
+            jsonl['q2t_labels'] = result.q2t_labels if result.q2t_labels else []
             print_stmts_jsonl(json.dumps(jsonl, ensure_ascii=False))
 
 
@@ -248,7 +250,6 @@ def generate_simple_question_answer(args):
                             logging.warning(f"Warning: Skipping non-integer line: {line}")
 
         for entry in read_dataset(args.input_dataset):
-            kifqa.reset()
             id = int(entry['id'])
             if id in block_set:
                 continue
@@ -267,8 +268,10 @@ def generate_simple_question_answer(args):
                 'count': 0,
             }
 
+            result = QueryResult(question)
             try:
-                stmts = list(kifqa.query(question, timeout=TIMETOUT))
+                stmts = list(kifqa.query(
+                    question, timeout=TIMETOUT, result=result))
 
                 count = 0
                 for stmt in stmts:
@@ -279,7 +282,7 @@ def generate_simple_question_answer(args):
                 filters = []
 
                 candidates = []
-                for filter in kifqa.kif_filters:
+                for filter in result.kif_filters:
                     if isinstance(filter.subject, FullFingerprint):
                         jsonl['select'] = 's'
                         candidates.append(filter.value.value.to_ast())
@@ -297,12 +300,12 @@ def generate_simple_question_answer(args):
                 jsonl['candidates'] = candidates
             except Exception as e:
                 jsonl['error'] = True
-                la = kifqa.disambiguated_labels if kifqa.disambiguated_labels else ''
-                q2t = kifqa.q2t_labels if kifqa.q2t_labels else ''
+                la = result.disambiguated_labels if result.disambiguated_labels else ''
+                q2t = result.q2t_labels if result.q2t_labels else ''
 
                 jsonl['error_message'] = f'Error: labels={{{la}}} q2t_labels={{{q2t}}}: {e}'
 
-            jsonl['q2t_labels'] = kifqa.q2t_labels if kifqa.q2t_labels else []
+            jsonl['q2t_labels'] = result.q2t_labels if result.q2t_labels else []
             print_stmts_jsonl(json.dumps(jsonl, ensure_ascii=False))
             cache_entries.add(id)
 
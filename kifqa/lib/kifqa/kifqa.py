@@ -1,10 +1,17 @@
 from __future__ import annotations
 
+import asyncio
+import contextvars
 import dataclasses
 import logging
 import os
+import queue
+import threading
+import warnings
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Any, Iterator, Literal, Optional, Tuple, TYPE_CHECKING
+from typing import (Any, AsyncIterator, Iterable, Iterator, Literal, Optional,
+                    Tuple, TYPE_CHECKING)
 
 import numpy as np
 import yaml
@@ -14,6 +21,7 @@ from kif_lib.vocabulary import wd
 from langchain_core.language_models.chat_models import BaseChatModel
 from tenacity import RetryError, retry, stop_after_attempt, wait_fixed
 
+from kbel.cache import LinkingCache
 from kbel.disambiguators import Disambiguator
 from kifqa.fewshot_embedding.embedding_serializer import EmbeddingSerializer
 from kifqa.model.example import Example
@@ -34,6 +42,97 @@ class LLM_ModelBuilder:
     model_params: Optional[dict[str, Any]] = None
 
 
+@dataclasses.dataclass
+class QueryResult:
+    """Artifacts produced while answering a single question.
+
+    A new result is created for each call to :meth:`KIFQA.query` (or
+    :meth:`KIFQA.generate_filters`), so a single KIFQA instance can answer
+    concurrent questions.  Iterating over a result yields the statements
+    that answer the question, which are fetched lazily from the store;
+    results of :meth:`KIFQA.aquery` are iterated with ``async for``.
+    """
+    question: str
+    triple_pattern: list[Triples] = dataclasses.field(default_factory=list)
+    q2t_labels: list[Tuple] = dataclasses.field(default_factory=list)
+    q2t_examples: Optional[list[Example]] = None
+    items: list[Tuple[str, str, Item]] = dataclasses.field(
+        default_factory=list)
+    properties: list[Tuple[str, str, Property]] = dataclasses.field(
+        default_factory=list)
+    triples: list[Tuple] = dataclasses.field(default_factory=list)
+    disambiguated_labels: list[Tuple] = dataclasses.field(
+        default_factory=list)
+    kif_filters: list[Filter] = dataclasses.field(default_factory=list)
+    statements: Optional[Iterable[Statement]] = dataclasses.field(
+        default=None, repr=False)
+    astatements: Optional[AsyncIterator[Statement]] = dataclasses.field(
+        default=None, repr=False)
+
+    #: Position of the question in a :meth:`KIFQA.query_many` batch.
+    index: Optional[int] = None
+    #: Error raised while answering the question in a batch, if any.
+    error: Optional[BaseException] = None
+
+    def __iter__(self) -> Iterator[Statement]:
+        if self.statements is None:
+            if self.error is not None:
+                return iter(())
+            if self.astatements is not None:
+                raise TypeError(
+                    'The statements of an async result are iterated with '
+                    '`async for`.')
+            raise TypeError(
+                'The result has no statements (e.g., it comes from '
+                'generate_filters); iterate its `kif_filters` instead.')
+        return iter(self.statements)
+
+    async def __aiter__(self) -> AsyncIterator[Statement]:
+        if self.astatements is not None:
+            async for stmt in self.astatements:
+                yield stmt
+        else:
+            for stmt in self:
+                yield stmt
+
+
+@dataclasses.dataclass
+class _BatchCaches:
+    """Caches shared by the questions of a :meth:`KIFQA.query_many` batch.
+
+    The candidate properties are kept in LRU order, up to
+    `max_property_candidates` entries; fetches that fail are not kept, so
+    the next question about the same entities retries them.
+    """
+    linking_cache: LinkingCache
+    property_candidates: OrderedDict[Tuple, asyncio.Future] = \
+        dataclasses.field(default_factory=OrderedDict)
+    max_property_candidates: int = 1024
+
+    def get_property_candidates(self, key: Tuple) -> Optional[asyncio.Future]:
+        future = self.property_candidates.get(key)
+        if future is not None:
+            self.property_candidates.move_to_end(key)
+        return future
+
+    def set_property_candidates(
+            self, key: Tuple, future: asyncio.Future) -> None:
+        def forget_failure(future: asyncio.Future) -> None:
+            if ((future.cancelled() or future.exception() is not None)
+                    and self.property_candidates.get(key) is future):
+                del self.property_candidates[key]
+
+        future.add_done_callback(forget_failure)
+        self.property_candidates[key] = future
+        while len(self.property_candidates) > self.max_property_candidates:
+            self.property_candidates.popitem(last=False)
+
+
+#: Caches of the batch the current task belongs to, if any.
+_batch_caches: contextvars.ContextVar[Optional[_BatchCaches]] = \
+    contextvars.ContextVar('kifqa_batch_caches', default=None)
+
+
 class Q2T_Options:
     model: LLM_ModelBuilder | BaseChatModel
     few_shot_embedding_space: str
@@ -48,22 +147,17 @@ class KIFQA:
     _q2t_model: Optional[BaseChatModel] = None
     _q2t_prompt: str
     _q2t_examples: Optional[list[Example]] = None
-    _q2t_labels: list = []
     _el_model: Optional[BaseChatModel] = None
     _el_prompt: str
     _el_examples: Optional[list[Example] | str] = None
     _store: Store
     _disambiguator: Disambiguator
-    _disambiguated_labels: list[Tuple] = []
-    _triples: list[Tuple] = []
-    _triple_pattern: list[Triples] = []
-    _kif_filters: list[Filter] = []
-    _items: list[Tuple[str, str, Item]] = []
-    _properties: list[Tuple[str, str, Property]] = []
+    _linking_cache: Optional[LinkingCache] = None
     _fewshot_embeddings_data: Optional[Any] = None
     _fewshot_embeddings: Optional[Any] = None
     _embedding_model: Optional[SentenceTransformer] = None
     _search: Search
+    _last_result: Optional[QueryResult] = None
 
 
     @property
@@ -82,37 +176,66 @@ class KIFQA:
     def search(self, value: Search):
         self._search = value
 
+    @property
+    def q2t_examples(self):
+        return self._q2t_examples
+
+    def _deprecated_artifact(self, name: str) -> Any:
+        warnings.warn(
+            f'KIFQA.{name} is deprecated and will be removed in the next '
+            f'release; use the `{name}` of the QueryResult returned by '
+            'query() or generate_filters().', DeprecationWarning,
+            stacklevel=3)
+        if self._last_result is None:
+            return []
+        return getattr(self._last_result, name)
+
     @property
     def disambiguated_labels(self):
-        return self._disambiguated_labels
+        return self._deprecated_artifact('disambiguated_labels')
 
     @property
     def triples(self):
-        return self._triples
+        return self._deprecated_artifact('triples')
 
     @property
     def items(self):
-        return self._items
+        return self._deprecated_artifact('items')
 
     @property
     def properties(self):
-        return self._properties
+        return self._deprecated_artifact('properties')
 
     @property
     def q2t_labels(self):
-        return self._q2t_labels
+        return self._deprecated_artifact('q2t_labels')
 
     @property
     def triple_pattern(self):
-        return self._triple_pattern
+        return self._deprecated_artifact('triple_pattern')
 
     @property
-    def q2t_examples(self):
-        return self._q2t_examples
+    def kif_filters(self):
+        return self._deprecated_artifact('kif_filters')
+
+    def reset(self):
+        """Forgets the artifacts of the last question.
+
+        Deprecated: each question now gets its own QueryResult.
+        """
+        warnings.warn(
+            'KIFQA.reset() is deprecated and will be removed in the next '
+            'release; each question now gets its own QueryResult.',
+            DeprecationWarning, stacklevel=2)
+        self._last_result = None
 
     @property
-    def kif_filters(self):
-        return self._kif_filters
+    def linking_cache(self):
+        return self._linking_cache
+
+    @linking_cache.setter
+    def linking_cache(self, value: Optional[LinkingCache]):
+        self._linking_cache = value
 
     def __init__(
             self,
@@ -127,6 +250,7 @@ class KIFQA:
             q2t_model: Optional[BaseChatModel] = None,
             disambiguator: Optional[Disambiguator] = None,
             el_model: Optional[BaseChatModel] = None,
+            linking_cache: Optional[LinkingCache] = None,
             *args, **kwargs):
 
         if not model_params:
@@ -166,36 +290,84 @@ class KIFQA:
             from kbel.disambiguators.llm import LLM_Disambiguator
             self._disambiguator = Disambiguator('llm', model=self._el_model)
 
+        self._linking_cache = linking_cache
+
 
     @retry(stop=stop_after_attempt(RETRY_ATTEMPTS), wait=wait_fixed(1))
     def _filter_properties_by_item(self, filter):
         it = self._store.filter_p(filter=filter)
         return list(it)
 
+    @retry(stop=stop_after_attempt(RETRY_ATTEMPTS), wait=wait_fixed(1))
+    async def _afilter_properties_by_item(self, filter):
+        return [p async for p in self._store.afilter_p(filter=filter)]
+
+    def _properties_by_item_filter(self, subject, object) -> Optional[Filter]:
+        if subject:
+            return Filter(
+                subject=subject,
+                snak_mask=Filter.VALUE_SNAK,
+                property_mask=Filter.REAL,
+                value_mask=Filter.VALUE & ~Filter.EXTERNAL_ID)
+        elif object:
+            return Filter(value=object, property_mask=Filter.REAL)
+        return None
+
     def _search_properties_by_item(self, subject, property, object):
         candidate_properties = None
         try:
-            if subject:
+            filter = self._properties_by_item_filter(subject, object)
+            if filter is not None:
                 candidate_properties = self._filter_properties_by_item(
-                    filter=Filter(
-                        subject=subject,
-                        snak_mask=Filter.VALUE_SNAK,
-                        property_mask=Filter.REAL,
-                        value_mask=Filter.VALUE & ~Filter.EXTERNAL_ID))
-            elif object:
-                candidate_properties = self._filter_properties_by_item(
-                    filter=Filter(value=object, property_mask=Filter.REAL))
+                    filter=filter)
         except RetryError as e:
             le = e.last_attempt.exception()
             raise le if le else e
         except Exception as e:
             raise e
+        candidates = self._to_property_candidates(candidate_properties)
+        if not candidates:
+            raise ValueError(
+                f'Could not fetch candidates for label `{property}`.')
+        return candidates
 
-        candidates = []
-        if not candidate_properties:
+    async def _asearch_properties_by_item(self, subject, property, object):
+        batch = _batch_caches.get()
+        if batch is None:
+            candidates = await self._afetch_property_candidates(
+                subject, object)
+        else:
+            # Questions of a batch about the same entity share its
+            # candidate properties.
+            key = (subject, object)
+            future = batch.get_property_candidates(key)
+            if future is None:
+                future = asyncio.ensure_future(
+                    self._afetch_property_candidates(subject, object))
+                batch.set_property_candidates(key, future)
+            candidates = await asyncio.shield(future)
+        if not candidates:
             raise ValueError(
                 f'Could not fetch candidates for label `{property}`.')
-        for property_candidate in candidate_properties:
+        return list(candidates)
+
+    async def _afetch_property_candidates(self, subject, object):
+        candidate_properties = None
+        try:
+            filter = self._properties_by_item_filter(subject, object)
+            if filter is not None:
+                candidate_properties = await self._afilter_properties_by_item(
+                    filter=filter)
+        except RetryError as e:
+            le = e.last_attempt.exception()
+            raise le if le else e
+        except Exception as e:
+            raise e
+        return self._to_property_candidates(candidate_properties)
+
+    def _to_property_candidates(self, candidate_properties):
+        candidates = []
+        for property_candidate in candidate_properties or ():
             if property_candidate and property_candidate.label:
                 p_candidate_label = property_candidate.label.content
                 candidate = {
@@ -244,17 +416,85 @@ class KIFQA:
             )
             raise e
 
+    async def _afull_disambiguate_property(
+        self,
+        property_label: str,
+        question: str,
+        subject: Optional[Item] = None,
+        object: Optional[Item] = None,
+        description: Optional[str] = None,
+    ) -> Optional[list[Tuple[str, str, Property]]]:
+        try:
+            candidates = []
+            candidates += await self._asearch_properties_by_item(
+                subject, property_label, object)
+            if not candidates:
+                return None
+            candidates = list({d['id']: d
+                               for d in reversed(candidates)}.values())[::-1]
+            try:
+
+                return await self._disambiguator.adisambiguate_candidates(
+                    label=property_label,
+                    candidates=candidates,
+                    cls=Property,
+                    textual_context=description,
+                    sentence=question)
+            except RetryError as e:
+                le = e.last_attempt.exception()
+                raise le if le else e
+
+        except Exception as e:
+            logging.info(
+                f'Could not fetch properties for label `{property_label}`: {e}'
+            )
+            raise e
+
     def item_linking(
             self,
             label: str,
             question: str,
             candidates_limit=10) -> list[Tuple[str, str, Item]]:
         try:
-            self.search.limit = candidates_limit
-            items = self._disambiguator.disambiguate_item(
-                label=label,
-                searcher=self.search,
-                sentence=question)
+            if self._linking_cache is not None:
+                items = self._linking_cache.link(
+                    label, Item, self.search, self._disambiguator,
+                    sentence=question, search_limit=candidates_limit)
+            else:
+                items = self._disambiguator.disambiguate_item(
+                    label=label,
+                    searcher=self.search,
+                    sentence=question,
+                    search_limit=candidates_limit)
+            if items:
+                return items
+            raise ValueError(f'Could not disambiguate item ({label})')
+        except RetryError as e:
+            le = e.last_attempt.exception()
+            raise le if le else e
+        except Exception as e:
+            logging.exception(e)
+            raise e
+
+    async def aitem_linking(
+            self,
+            label: str,
+            question: str,
+            candidates_limit=10) -> list[Tuple[str, str, Item]]:
+        try:
+            linking_cache = self._linking_cache
+            if linking_cache is None and (batch := _batch_caches.get()):
+                linking_cache = batch.linking_cache
+            if linking_cache is not None:
+                items = await linking_cache.alink(
+                    label, Item, self.search, self._disambiguator,
+                    sentence=question, search_limit=candidates_limit)
+            else:
+                items = await self._disambiguator.adisambiguate_item(
+                    label=label,
+                    searcher=self.search,
+                    sentence=question,
+                    search_limit=candidates_limit)
             if items:
                 return items
             raise ValueError(f'Could not disambiguate item ({label})')
@@ -291,54 +531,134 @@ class KIFQA:
                 constraint_labels.append((None, pc_label, oc_label))
         return constraint_labels, constraints
 
+    async def _ahandle_constraints(self, triple: Triples, question):
+        constraints = []
+        constraint_labels = []
+        oc_label = None
+        pc_label = None
+        if triple.constraints:
+            for constraint in triple.constraints:
+                pc = None
+                oc_label, oc_description, oc = await self.aitem_linking(
+                    triple.object, question)
+                if oc:
+                    if constraint.property == 'a':
+                        pc = wd.a
+                    else:
+                        pc_disambiguated = \
+                            await self._afull_disambiguate_property(
+                                property_label=constraint.property,
+                                question=question,
+                                subject=None,
+                                object=oc)
+                        if pc_disambiguated:
+                            pc_label, pc_description, pc = pc_disambiguated
+
+                constraints.append((None, pc, oc))
+                constraint_labels.append((None, pc_label, oc_label))
+        return constraint_labels, constraints
+
     def _resolve_property_label(self, triple: Triples):
         """Search for the best property match by label using kif search."""
         if triple.property:
             properties = self.search.property_descriptor(triple.property, candidates_limit=10)
-            for prop, desc in properties:
-                label = desc.get('labels', {}).get('en')
-                if label and label.content == triple.property:
-                    description = desc.get('descriptions', {}).get('en', '').content if 'descriptions' in desc else ''
-                    return (label.content, description, prop)
+            return self._match_property_label(triple, properties)
         return None
 
-    def _generate_filters_by_property_search(self, triple: Triples, disam_items, constraint_labels, constraints):
+    async def _aresolve_property_label(self, triple: Triples):
+        """Search for the best property match by label using kif search."""
+        if triple.property:
+            properties = [
+                p async for p in self.search.aproperty_descriptor(
+                    triple.property, candidates_limit=10)]
+            return self._match_property_label(triple, properties)
+        return None
+
+    def _match_property_label(self, triple: Triples, properties):
+        for prop, desc in properties:
+            label = desc.get('labels', {}).get('en')
+            if label and label.content == triple.property:
+                description = desc.get('descriptions', {}).get('en', '').content if 'descriptions' in desc else ''
+                return (label.content, description, prop)
+        return None
+
+    def _generate_filters_by_property_search(self, triple: Triples, disam_items, constraint_labels, constraints, result: QueryResult):
         """Attempt to resolve the property directly and generate filters without full disambiguation."""
         try:
             disambiguated_property = self._resolve_property_label(triple)
             if not disambiguated_property:
                 return None
+            return self._add_filters_by_property(
+                triple, disam_items, disambiguated_property,
+                constraint_labels, constraints, result)
+        except Exception as e:
+            logging.warning(
+                f'Attempt to resolve the property directly and generate filters without full disambiguation failed: {e}')
+            return None
 
-            filters = []
-            for item in disam_items:
-                if triple.object != '?x':  # subject is the disambiguated entity
-                    disamb_triple = (None, disambiguated_property[2], item[2], constraints)
-                    labels = (None, disambiguated_property[0], item[0], constraint_labels)
-                else:  # object is the disambiguated entity
-                    disamb_triple = (item[2], disambiguated_property[2], None, constraints)
-                    labels = (item[0], disambiguated_property[0], None, constraint_labels)
-
-                self._triples.append(disamb_triple)
-                self._disambiguated_labels.append(labels)
-
-                if f := self.to_filter(disamb_triple):
-                    filters.append(f)
-
-            self._kif_filters = filters
-            return filters
+    async def _agenerate_filters_by_property_search(self, triple: Triples, disam_items, constraint_labels, constraints, result: QueryResult):
+        """Attempt to resolve the property directly and generate filters without full disambiguation."""
+        try:
+            disambiguated_property = await self._aresolve_property_label(
+                triple)
+            if not disambiguated_property:
+                return None
+            return self._add_filters_by_property(
+                triple, disam_items, disambiguated_property,
+                constraint_labels, constraints, result)
         except Exception as e:
             logging.warning(
                 f'Attempt to resolve the property directly and generate filters without full disambiguation failed: {e}')
             return None
 
+    def _add_filters_by_property(self, triple: Triples, disam_items, disambiguated_property, constraint_labels, constraints, result: QueryResult):
+        filters = []
+        for item in disam_items:
+            if triple.object != '?x':  # subject is the disambiguated entity
+                disamb_triple = (None, disambiguated_property[2], item[2], constraints)
+                labels = (None, disambiguated_property[0], item[0], constraint_labels)
+            else:  # object is the disambiguated entity
+                disamb_triple = (item[2], disambiguated_property[2], None, constraints)
+                labels = (item[0], disambiguated_property[0], None, constraint_labels)
+
+            result.triples.append(disamb_triple)
+            result.disambiguated_labels.append(labels)
+
+            if f := self.to_filter(disamb_triple):
+                filters.append(f)
+
+        result.kif_filters = filters
+        return filters
+
     def _get_item_role(self, triple: Triples):
         """Determine which entity (subject or object) needs to be disambiguated."""
         if triple.object != '?x':
             return 'subject', triple.object
         return 'object', triple.subject
 
+    def _disambiguation_args(self, triple: Triples, disam_items, to_be_found):
+        for item_label, item_desc, item_id in disam_items:
+            if to_be_found == 'object':
+                yield (item_id, item_label, item_desc, triple.property, None, None)
+            else:
+                yield (None, None, item_desc, triple.property, item_id, item_label)
+
+    def _add_disambiguated_properties(
+            self, result: QueryResult, disamb_props, s, sl, o, ol,
+            constraint_labels, constraints):
+        for label, desc, prop in disamb_props:
+            if (label, desc, prop) not in result.properties:
+                result.properties.append((label, desc, prop))
+            disamb_triple = (s, prop, o, constraints)
+            labels = (sl, label, ol, constraint_labels)
+            result.triples.append(disamb_triple)
+            result.disambiguated_labels.append(labels)
+            if f := self.to_filter(disamb_triple):
+                result.kif_filters.append(f)
+
     def _generate_filters_with_disambiguation(self,
-            triple: Triples, disam_items, question: str, constraint_labels, constraints, to_be_found
+            triple: Triples, disam_items, question: str, constraint_labels, constraints, to_be_found,
+            result: QueryResult
         ):
         """Fallback to full property disambiguation for each disambiguated item."""
         def disambiguate_one_property(s, sl, sd, p, o, ol):
@@ -351,26 +671,15 @@ class KIFQA:
             )
             if not disamb_props:
                 raise ValueError(f'Could not disambiguate property {p}')
-
-            for label, desc, prop in disamb_props:
-                if (label, desc, prop) not in self._properties:
-                    self._properties.append((label, desc, prop))
-                disamb_triple = (s, prop, o, constraints)
-                labels = (sl, label, ol, constraint_labels)
-                self._triples.append(disamb_triple)
-                self._disambiguated_labels.append(labels)
-                if f := self.to_filter(disamb_triple):
-                    self._kif_filters.append(f)
+            self._add_disambiguated_properties(
+                result, disamb_props, s, sl, o, ol,
+                constraint_labels, constraints)
 
         with ThreadPoolExecutor() as executor:
-            tasks = []
-            for item_label, item_desc, item_id in disam_items:
-                if to_be_found == 'object':
-                    args = (item_id, item_label, item_desc, triple.property, None, None)
-                else:
-                    args = (None, None, item_desc, triple.property, item_id, item_label)
-
-                tasks.append(executor.submit(disambiguate_one_property, *args))
+            tasks = [
+                executor.submit(disambiguate_one_property, *args)
+                for args in self._disambiguation_args(
+                    triple, disam_items, to_be_found)]
 
             for future in as_completed(tasks):
                 try:
@@ -378,15 +687,39 @@ class KIFQA:
                 except Exception as e:
                     logging.warning(f'Error in threaded disambiguation: {e}')
 
-
-    @retry(stop=stop_after_attempt(RETRY_ATTEMPTS), wait=wait_fixed(1))
-    def get_logical_form(self,
-                         question,
-                         model: Optional[BaseChatModel] = None,
-                         model_name: Optional[str] = None,
-                         model_provider: Optional[Literal['ibm', 'openai', 'ollama']] = None,
-                         model_params: dict[str, Any] = {},
-                         few_shot_number=5) -> list[Triples]:
+    async def _agenerate_filters_with_disambiguation(self,
+            triple: Triples, disam_items, question: str, constraint_labels, constraints, to_be_found,
+            result: QueryResult
+        ):
+        """Fallback to full property disambiguation for each disambiguated item."""
+        async def disambiguate_one_property(s, sl, sd, p, o, ol):
+            disamb_props = await self._afull_disambiguate_property(
+                property_label=p,
+                subject=s,
+                object=o,
+                question=question,
+                description=sd
+            )
+            if not disamb_props:
+                raise ValueError(f'Could not disambiguate property {p}')
+            self._add_disambiguated_properties(
+                result, disamb_props, s, sl, o, ol,
+                constraint_labels, constraints)
+
+        results = await asyncio.gather(*(
+            disambiguate_one_property(*args)
+            for args in self._disambiguation_args(
+                triple, disam_items, to_be_found)),
+            return_exceptions=True)
+        for e in results:
+            if isinstance(e, Exception):
+                logging.warning(f'Error in concurrent disambiguation: {e}')
+
+    def _select_q2t(self,
+                    model: Optional[BaseChatModel] = None,
+                    model_name: Optional[str] = None,
+                    model_provider: Optional[Literal['ibm', 'openai', 'ollama']] = None,
+                    model_params: dict[str, Any] = {}) -> QuestionToTriples:
         _model = self._q2t_model
         if model:
             _model = model
@@ -396,8 +729,10 @@ class KIFQA:
                 provider=model_provider,
                 **model_params)
 
-        q2t = QuestionToTriples(model=_model)
+        return QuestionToTriples(model=_model)
 
+    def _select_examples(self, question,
+                         few_shot_number=5) -> Optional[list[Example]]:
         top_results = self._q2t_examples
         if self._fewshot_embeddings_data:
             from sklearn.metrics.pairwise import cosine_similarity
@@ -410,66 +745,165 @@ class KIFQA:
             top_results = [
                 self._fewshot_embeddings_data[i] for i in top_indices
             ]
+        return top_results
 
-            self._q2t_examples = top_results
-
+    @retry(stop=stop_after_attempt(RETRY_ATTEMPTS), wait=wait_fixed(1))
+    def get_logical_form(self,
+                         question,
+                         model: Optional[BaseChatModel] = None,
+                         model_name: Optional[str] = None,
+                         model_provider: Optional[Literal['ibm', 'openai', 'ollama']] = None,
+                         model_params: dict[str, Any] = {},
+                         few_shot_number=5,
+                         result: Optional[QueryResult] = None) -> list[Triples]:
+        q2t = self._select_q2t(model, model_name, model_provider, model_params)
+        top_results = self._select_examples(question, few_shot_number)
         triples = q2t.run(question, top_results)
+        if result is not None:
+            result.q2t_examples = top_results
+            result.triple_pattern = triples.root
         return triples.root
 
-    def generate_filters(
-            self,
-            triples: list[Triples],
-            question: str,
-            edges_only=True):
-        self.reset()
-        self._q2t_labels = [
+    @retry(stop=stop_after_attempt(RETRY_ATTEMPTS), wait=wait_fixed(1))
+    async def aget_logical_form(self,
+                                question,
+                                model: Optional[BaseChatModel] = None,
+                                model_name: Optional[str] = None,
+                                model_provider: Optional[Literal['ibm', 'openai', 'ollama']] = None,
+                                model_params: dict[str, Any] = {},
+                                few_shot_number=5,
+                                result: Optional[QueryResult] = None) -> list[Triples]:
+        q2t = self._select_q2t(model, model_name, model_provider, model_params)
+        top_results = self._select_examples(question, few_shot_number)
+        triples = await q2t.arun(question, top_results)
+        if result is not None:
+            result.q2t_examples = top_results
+            result.triple_pattern = triples.root
+        return triples.root
+
+    def _init_result(self, triples: list[Triples], question: str,
+                     result: Optional[QueryResult]) -> QueryResult:
+        if result is None:
+            result = QueryResult(question)
+        # Backs the deprecated per-instance artifacts (e.g., `kif_filters`).
+        self._last_result = result
+        if not result.triple_pattern:
+            result.triple_pattern = triples
+        result.q2t_labels = [
             (t.subject, t.property, t.object, t.constraints)
             for t in triples
         ]
 
-        if len(self._q2t_labels) > 1:
+        if len(result.q2t_labels) > 1:
             raise ValueError('Error: Multiple draft triples generated.')
+        return result
+
+    def _get_main_entity(self, triple: Triples, result: QueryResult) -> str:
+        property_label = triple.property
+        assert property_label
+
+        main_entity = None
+        if triple.subject == '?x':
+            main_entity = triple.object
+        elif triple.object == '?x':
+            main_entity = triple.subject
+        else:
+            raise ValueError(f'Error: malformed draft triple `{result.q2t_labels}`.')
+
+        if not main_entity:
+            raise ValueError(f'Error: malformed draft triple `{result.q2t_labels}`.')
+        return main_entity
+
+    def generate_filters(
+            self,
+            triples: list[Triples],
+            question: str,
+            edges_only=True,
+            result: Optional[QueryResult] = None) -> QueryResult:
+        """Links the draft triples of `question` to KIF filters.
+
+        Args:
+            triples: Draft triples (logical form) of `question`.
+            question: Question.
+            edges_only: Whether to skip the direct property search.
+            result: Result to fill in; a new one is created if not given.
+              Passing it allows callers to inspect partial artifacts when
+              linking fails.
+
+        Returns:
+            The result, whose `kif_filters` are the generated filters.
+        """
+        result = self._init_result(triples, question, result)
 
         for triple in triples:
             constraint_labels, constraints = self._handle_constraints(
                 triple, question)
 
-            property_label = triple.property
-            assert property_label
-
-            to_be_found = None
-            main_entity = None
-            if triple.subject == '?x':
-                to_be_found = 'subject'
-                main_entity = triple.object
-            elif triple.object == '?x':
-                to_be_found = 'object'
-                main_entity = triple.subject
-            else:
-                raise ValueError(f'Error: malformed draft triple `{self._q2t_labels}`.')
-
-            if not main_entity:
-                raise ValueError(f'Error: malformed draft triple `{self._q2t_labels}`.')
+            main_entity = self._get_main_entity(triple, result)
 
             items = self.item_linking(label=main_entity, question=question)
-            self._items = items
+            result.items = items
             if not items:
-                return []
+                return result
 
             if not edges_only:
                 filters = self._generate_filters_by_property_search(
-                    triple, items, constraint_labels, constraints
+                    triple, items, constraint_labels, constraints, result
                 )
                 if filters:
-                    return filters
+                    return result
 
             to_be_found, main_entity = self._get_item_role(triple)
 
             self._generate_filters_with_disambiguation(
-                triple, items, question, constraint_labels, constraints, to_be_found
+                triple, items, question, constraint_labels, constraints, to_be_found,
+                result
+            )
+
+        return result
+
+    async def agenerate_filters(
+            self,
+            triples: list[Triples],
+            question: str,
+            edges_only=True,
+            result: Optional[QueryResult] = None) -> QueryResult:
+        """Asynchronously links the draft triples of `question` to KIF filters.
+
+        Searches, linking and property disambiguation are awaited natively
+        (the properties of the linked items are disambiguated
+        concurrently), so no thread is held while they are in flight.  See
+        :meth:`generate_filters`.
+        """
+        result = self._init_result(triples, question, result)
+
+        for triple in triples:
+            constraint_labels, constraints = await self._ahandle_constraints(
+                triple, question)
+
+            main_entity = self._get_main_entity(triple, result)
+
+            items = await self.aitem_linking(
+                label=main_entity, question=question)
+            result.items = items
+            if not items:
+                return result
+
+            if not edges_only:
+                filters = await self._agenerate_filters_by_property_search(
+                    triple, items, constraint_labels, constraints, result
+                )
+                if filters:
+                    return result
+
+            to_be_found, main_entity = self._get_item_role(triple)
+
+            await self._agenerate_filters_with_disambiguation(
+                triple, items, question, constraint_labels, constraints, to_be_found,
+                result
             )
 
-        return self._kif_filters
+        return result
 
     def to_filter(self, triples: Tuple) -> Optional[Filter]:
         if triples:
@@ -506,40 +940,251 @@ class KIFQA:
                                   property_mask=Filter.REAL)
         return None
 
-    def reset(self):
-        self._disambiguated_labels = []
-        self._kif_filters = []
-        self._q2t_labels = []
-        self._triples = []
-        self._items = []
-        self._properties = []
+    def _generate_result(
+            self,
+            question: str,
+            result: Optional[QueryResult] = None) -> QueryResult:
+        if result is None:
+            result = QueryResult(question)
+        triples = self.get_logical_form(question, result=result)
+        if not triples:
+            raise ValueError(f'Could not extract triples from question: `{question}`')
+        return self.generate_filters(
+            triples=triples, question=question, result=result)
 
     def query(
             self,
             question: str,
-            *args, **kwargs) -> Iterator[Statement]:
-        triples = self.get_logical_form(question)
-        self._triple_pattern = triples
+            *args,
+            result: Optional[QueryResult] = None,
+            **kwargs) -> QueryResult:
+        """Answers a question.
+
+        The logical form and the filters are generated eagerly; the
+        statements are fetched from the store as the result is iterated.
+
+        Args:
+            question: Question.
+            result: Result to fill in; a new one is created if not given.
+            *args, **kwargs: Arguments to the store's ``filter``.
+
+        Returns:
+            The result of the question.
+        """
+        result = self._generate_result(question, result)
+
+        def statements(filters: list[Filter]) -> Iterator[Statement]:
+            for filter in filters:
+                yield from self.filter(filter, *args, **kwargs)
+
+        result.statements = statements(result.kif_filters)
+        return result
+
+    async def _agenerate_result(
+            self,
+            question: str,
+            result: Optional[QueryResult] = None) -> QueryResult:
+        if result is None:
+            result = QueryResult(question)
+        triples = await self.aget_logical_form(question, result=result)
         if not triples:
             raise ValueError(f'Could not extract triples from question: `{question}`')
-        kif_filters = self.generate_filters(triples=triples, question=question)
-        for filter in kif_filters:
-            yield from self.filter(filter, *args, **kwargs)
+        return await self.agenerate_filters(
+            triples=triples, question=question, result=result)
+
+    async def aquery(
+            self,
+            question: str,
+            *args,
+            result: Optional[QueryResult] = None,
+            **kwargs) -> QueryResult:
+        """Asynchronously answers a question.
+
+        The logical form and the filters are generated when awaited; the
+        statements are fetched from the store (through its async API) as
+        the result is iterated with ``async for``.  See :meth:`query`.
+        """
+        result = await self._agenerate_result(question, result)
+
+        async def statements(
+                filters: list[Filter]) -> AsyncIterator[Statement]:
+            for filter in filters:
+                async for stmt in self.afilter(filter, *args, **kwargs):
+                    yield stmt
+
+        result.astatements = statements(result.kif_filters)
+        return result
+
+    async def _aquery_one(
+            self,
+            question: str,
+            index: int,
+            *args, **kwargs) -> QueryResult:
+        result = QueryResult(question, index=index)
+        try:
+            await self._agenerate_result(question, result)
+            result.statements = [
+                stmt
+                for filter in result.kif_filters
+                async for stmt in self.afilter(filter, *args, **kwargs)]
+        except Exception as e:
+            logging.warning(f'Could not answer question `{question}`: {e}')
+            result.error = e
+        return result
+
+    async def aquery_many(
+            self,
+            questions: Iterable[str],
+            *args,
+            max_concurrency: Optional[int] = 8,
+            ordered: bool = True,
+            **kwargs) -> AsyncIterator[QueryResult]:
+        """Asynchronously answers many questions.
+
+        Up to `max_concurrency` questions are in flight at a time, so the
+        stages of different questions overlap (e.g., the logical form of a
+        question is generated while the entities of another are being
+        linked).  Questions of the batch share a linking cache (unless the
+        KIFQA has its own) and the candidate properties of each entity.
+
+        Errors do not abort the batch: a question that fails yields a
+        result whose `error` is set.  The statements of each result are
+        fetched before it is yielded.
+
+        Args:
+            questions: Questions.
+            max_concurrency: Maximum number of questions in flight (no
+              limit if ``None``).
+            ordered: Whether results are yielded in the order of
+              `questions` instead of as soon as they are ready.
+            *args, **kwargs: Arguments to the store's ``filter``.
+
+        Returns:
+            The results of the questions (see `QueryResult.index`).
+        """
+        assert max_concurrency is None or max_concurrency > 0
+        context = contextvars.copy_context()
+        context.run(_batch_caches.set, _BatchCaches(LinkingCache()))
+        loop = asyncio.get_running_loop()
+        it = enumerate(questions)
+        pending: set[asyncio.Task] = set()
+        buffer: dict[int, QueryResult] = {}
+        next_index = 0
+
+        def submit() -> bool:
+            try:
+                index, question = next(it)
+            except StopIteration:
+                return False
+            pending.add(loop.create_task(
+                self._aquery_one(question, index, *args, **kwargs),
+                context=context))
+            return True
+
+        try:
+            while (max_concurrency is None
+                   or len(pending) < max_concurrency) and submit():
+                pass
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.discard(task)
+                    submit()
+                    result = task.result()
+                    if not ordered:
+                        yield result
+                        continue
+                    buffer[result.index] = result  # type: ignore
+                    while next_index in buffer:
+                        yield buffer.pop(next_index)
+                        next_index += 1
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def query_many(
+            self,
+            questions: Iterable[str],
+            *args,
+            max_concurrency: Optional[int] = 8,
+            ordered: bool = True,
+            **kwargs) -> Iterator[QueryResult]:
+        """Answers many questions.
+
+        The batch runs on an event loop in a worker thread and results are
+        handed to the caller as they are ready.  See :meth:`aquery_many`.
+        """
+        # The queue holds at most `max_concurrency` results, so a slow
+        # caller also throttles the batch.
+        results: queue.Queue = queue.Queue(maxsize=max_concurrency or 0)
+        done = object()
+
+        async def run():
+            try:
+                try:
+                    async for result in self.aquery_many(
+                            questions, *args, max_concurrency=max_concurrency,
+                            ordered=ordered, **kwargs):
+                        await asyncio.to_thread(results.put, result)
+                except asyncio.CancelledError:
+                    raise
+                except BaseException as e:
+                    item = e
+                else:
+                    item = done
+                await asyncio.to_thread(results.put, item)
+            except asyncio.CancelledError:
+                pass
+
+        loop = asyncio.new_event_loop()
+        task = loop.create_task(run())
+
+        def serve():
+            asyncio.set_event_loop(loop)
+            try:
+                loop.run_until_complete(task)
+            finally:
+                # As in asyncio.run, the cancelled questions are left to
+                # unwind before the loop is closed.
+                rest = asyncio.all_tasks(loop)
+                for t in rest:
+                    t.cancel()
+                loop.run_until_complete(
+                    asyncio.gather(*rest, return_exceptions=True))
+                loop.run_until_complete(loop.shutdown_asyncgens())
+                loop.run_until_complete(loop.shutdown_default_executor())
+                asyncio.set_event_loop(None)
+                loop.close()
+
+        threading.Thread(
+            target=serve, name='kifqa-query-many', daemon=True).start()
+        try:
+            while (item := results.get()) is not done:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # Stopping early cancels the in-flight questions instead of
+            # waiting for them; a pending put is unblocked by draining.
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass  # the batch is over and its loop closed
+            while True:
+                try:
+                    results.get_nowait()
+                except queue.Empty:
+                    break
 
     def query_s(self, question: str, *args, **kwargs) -> Iterator[Entity]:
-        triples = self.get_logical_form(question)
-        if not triples:
-            raise ValueError(f'Could not extract triples from question: `{question}`')
-        kif_filters = self.generate_filters(triples=triples, question=question)
-        for filter in kif_filters:
+        result = self._generate_result(question)
+        for filter in result.kif_filters:
             yield from self.filter_s(filter, *args, **kwargs)
 
     def query_v(self, question: str, *args, **kwargs) -> Iterator[Value]:
-        triples = self.get_logical_form(question)
-        if not triples:
-            raise ValueError(f'Could not extract triples from question: `{question}`')
-        kif_filters = self.generate_filters(triples=triples, question=question)
-        for filter in kif_filters:
+        result = self._generate_result(question)
+        for filter in result.kif_filters:
             yield from self.filter_v(filter, *args, **kwargs)
 
     @retry(stop=stop_after_attempt(RETRY_ATTEMPTS), wait=wait_fixed(1))
@@ -550,6 +1195,13 @@ class KIFQA:
         for it in self._store.filter(filter=filter, *args, **kwargs):
             yield it
 
+    async def afilter(
+        self,
+        filter,
+        *args, **kwargs) -> AsyncIterator[Statement]:
+        async for it in self._store.afilter(filter=filter, *args, **kwargs):
+            yield it
+
     @retry(stop=stop_after_attempt(RETRY_ATTEMPTS), wait=wait_fixed(1))
     def filter_annotated(
         self,
@@ -578,11 +1230,8 @@ class KIFQA:
     def query_annotated(self,
                         question: str,
                         *args, **kwargs) -> Iterator[Statement]:
-        triples = self.get_logical_form(question)
-        if not triples:
-            raise ValueError(f'Could not extract triples from question: `{question}`')
-        kif_filters = self.generate_filters(triples=triples, question=question)
-        for filter in kif_filters:
+        result = self._generate_result(question)
+        for filter in result.kif_filters:
             for it in self._store.filter_annotated(filter=filter, *args, **kwargs):
                 yield it
 
@@ -592,11 +1241,8 @@ class KIFQA:
         question: str,
         filter: Filter,
         *args, **kwargs) -> int:
-        triples = self.get_logical_form(question)
-        if not triples:
-            raise ValueError(f'Could not extract triples from question: `{question}`')
-        kif_filters = self.generate_filters(triples=triples, question=question)
+        result = self._generate_result(question)
         count = 0
-        for filter in kif_filters:
+        for filter in result.kif_filters:
             count += self._store.count(filter=filter, *args, **kwargs)
         return count
@@ -1,21 +1,19 @@
-import asyncio
 import logging
 import os
 from dataclasses import asdict
 from typing import Any, Literal, Optional, Sequence
 
-import nest_asyncio
-from langchain.output_parsers import PydanticOutputParser
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.output_parsers.base import BaseOutputParser
-from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables import Runnable, RunnableLambda
 from pydantic import BaseModel, Field, RootModel
 
+from kbel.concurrency import default_singleflight
+from kbel.language_models import governed
+from kbel.parsing import RepairingPydanticOutputParser
 from kifqa.constants import Q2T_DEFAULT_PROMPT
 from kifqa.model.example import Example
 
-nest_asyncio.apply()
-
 
 class Triple(BaseModel):
     subject: Optional[str] = Field(None)
@@ -51,8 +49,10 @@ class QuestionToTriples:
         assert self._is_valid_system_prompt(
         ), 'Please, provide a valid system prompt.'
 
-        self.parser = parser if parser else PydanticOutputParser(
-            pydantic_object=LLM_Response)
+        # Malformed JSON is repaired instead of failing (and retrying) the
+        # whole call; outcomes are counted in kbel.parsing.parse_stats().
+        self.parser = parser if parser else RepairingPydanticOutputParser(
+            pydantic_object=LLM_Response, name='q2t')
 
         if model:
             self._model = model
@@ -99,10 +99,38 @@ class QuestionToTriples:
 
     def run(self, question,
             few_shots: Optional[list[Example]]) -> LLM_Response:
-        return asyncio.run(self.arun(question, few_shots))
+        chain = self._build_chain(few_shots)
+        try:
+            return default_singleflight.do(
+                self._call_key(question, few_shots),
+                chain.invoke, {'question': question})
+        except Exception as e:
+            logging.error(
+                f'Question2Triples: Failed while processing, question={question}: {e}'
+            )
+            raise e
 
     async def arun(self, question,
                    few_shots: Optional[list[Example]]) -> LLM_Response:
+        chain = self._build_chain(few_shots)
+        try:
+            return await default_singleflight.ado(
+                self._call_key(question, few_shots),
+                chain.ainvoke, {'question': question})
+        except Exception as e:
+            logging.error(
+                f'Question2Triples: Failed while processing, question={question}: {e}'
+            )
+            raise e
+
+    def _call_key(self, question,
+                  few_shots: Optional[list[Example]]) -> tuple:
+        # Identical questions in flight (same model, prompt and examples)
+        # share a single model call, whether sync or async.
+        return ('q2t', self.model._get_llm_string(), self.system_prompt,
+                question, repr([asdict(e) for e in few_shots or []]))
+
+    def _build_chain(self, few_shots: Optional[list[Example]]) -> Runnable:
 
         from langchain.prompts import (AIMessagePromptTemplate,
                                        ChatPromptTemplate,
@@ -147,12 +175,4 @@ class QuestionToTriples:
             return cleaned.strip()
 
         remove_think = RunnableLambda(remove_think_and_keep_rest)
-        chain = prompt | debug_chain | self.model | debug_chain | remove_think | debug_chain | self.parser
-
-        try:
-            return await chain.ainvoke({'question': question})
-        except Exception as e:
-            logging.error(
-                f'Question2Triples: Failed while processing, question={question}: {e}'
-            )
-            raise e
+        return prompt | debug_chain | governed(self.model) | debug_chain | remove_think | debug_chain | self.parser
@@ -1,3 +1,19 @@
-from .llm import LLM_Store, PromptExample
+from .constants import HybridPolicy, OutputMode, ValidationMode
+from .llm import LLM_Store, Page, PageCursor, PromptExample
+from .planner import LLM_QueryPlan, LLM_QueryPlanner
+from .snapshot import LLM_SnapshotStore, StatementSnapshot, materialize
 
-__all__ = ('LLM_Store', 'PromptExample')
+__all__ = (
+    'HybridPolicy',
+    'LLM_QueryPlan',
+    'LLM_QueryPlanner',
+    'LLM_SnapshotStore',
+    'LLM_Store',
+    'OutputMode',
+    'Page',
+    'PageCursor',
+    'PromptExample',
+    'StatementSnapshot',
+    'ValidationMode',
+    'materialize',
+)
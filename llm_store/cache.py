@@ -0,0 +1,382 @@
+import abc
+import asyncio
+import dataclasses
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from kif_lib.typing import Any, Optional, Sequence, Union
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+
+
+@dataclasses.dataclass
+class CacheStats:
+    """Counters of a response cache."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ResponseCache(abc.ABC):
+    """Abstract base class for LLM response caches.
+
+    A response cache maps a key derived from the model (identifier and
+    parameters) and the rendered prompt messages to the text of the model
+    response.
+
+    Parameters:
+        ttl: Time-to-live of entries (in seconds); ``None`` means entries
+          never expire.
+    """
+
+    _ttl: Optional[float]
+    _stats: CacheStats
+    _lock: threading.Lock
+
+    def __init__(self, ttl: Optional[float] = None) -> None:
+        self._ttl = ttl
+        self._stats = CacheStats()
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self) -> Optional[float]:
+        return self._ttl
+
+    @property
+    def stats(self) -> CacheStats:
+        return self._stats
+
+    @staticmethod
+    def make_key(
+        model: BaseChatModel, messages: Sequence[BaseMessage]
+    ) -> str:
+        """Computes the cache key of a model call.
+
+        Parameters:
+           model: Chat model.
+           messages: Rendered prompt messages.
+
+        Returns:
+           Cache key.
+        """
+        payload = json.dumps(
+            {
+                # Model identifier and parameters, as used by LangChain's
+                # own caches.
+                'model': model._get_llm_string(),
+                'messages': [(m.type, m.content) for m in messages],
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Looks up a response.
+
+        Parameters:
+           key: Cache key.
+
+        Returns:
+           The cached response text or ``None``.
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self._stats.misses += 1
+            else:
+                self._stats.hits += 1
+            return value
+
+    def update(self, key: str, value: str) -> None:
+        """Stores a response.
+
+        Parameters:
+           key: Cache key.
+           value: Response text.
+        """
+        with self._lock:
+            self._update(key, value)
+
+    async def alookup(self, key: str) -> Optional[str]:
+        """Asynchronously looks up a response.
+
+        The lookup runs in a worker thread, so that caches backed by disk
+        do not block the event loop.
+
+        Parameters:
+           key: Cache key.
+
+        Returns:
+           The cached response text or ``None``.
+        """
+        return await asyncio.to_thread(self.lookup, key)
+
+    async def aupdate(self, key: str, value: str) -> None:
+        """Asynchronously stores a response.
+
+        Parameters:
+           key: Cache key.
+           value: Response text.
+        """
+        await asyncio.to_thread(self.update, key, value)
+
+    def clear(self) -> None:
+        """Removes all entries (counters are kept)."""
+        with self._lock:
+            self._clear()
+
+    def _is_expired(self, created: float) -> bool:
+        return self._ttl is not None and time.time() - created > self._ttl
+
+    @abc.abstractmethod
+    def _lookup(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _update(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _clear(self) -> None:
+        raise NotImplementedError
+
+
+class InMemoryResponseCache(ResponseCache):
+    """In-memory LRU response cache.
+
+    Parameters:
+        max_size: Maximum number of entries.
+        ttl: Time-to-live of entries (in seconds).
+    """
+
+    _max_size: int
+    _entries: 'OrderedDict[str, tuple[float, str]]'
+
+    def __init__(
+        self, max_size: int = 1024, ttl: Optional[float] = None
+    ) -> None:
+        super().__init__(ttl)
+        assert max_size > 0
+        self._max_size = max_size
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def alookup(self, key: str) -> Optional[str]:
+        # In-memory caches never block, so they are read inline.
+        return self.lookup(key)
+
+    async def aupdate(self, key: str, value: str) -> None:
+        self.update(key, value)
+
+    def _lookup(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created, value = entry
+        if self._is_expired(created):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _update(self, key: str, value: str) -> None:
+        self._entries[key] = (time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    def _clear(self) -> None:
+        self._entries.clear()
+
+
+class SQLiteResponseCache(ResponseCache):
+    """On-disk response cache backed by SQLite.
+
+    Entries beyond `max_size` are evicted in least-recently-used order.
+    Access times are only written when the stored one is older than
+    `access_granularity`, so hits do not cost a write each, at the price of
+    an eviction order precise only up to that granularity.
+
+    Parameters:
+        path: Path to the database file.
+        max_size: Maximum number of entries; ``None`` means no limit.
+        ttl: Time-to-live of entries (in seconds).
+        access_granularity: Resolution of the access times (in seconds).
+    """
+
+    _path: Path
+    _max_size: Optional[int]
+    _access_granularity: float
+    _conn: sqlite3.Connection
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        max_size: Optional[int] = None,
+        ttl: Optional[float] = None,
+        access_granularity: float = 60.0,
+    ) -> None:
+        super().__init__(ttl)
+        self._path = Path(path)
+        self._max_size = max_size
+        self._access_granularity = access_granularity
+        self._conn = sqlite3.connect(self._path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, '
+            'value TEXT NOT NULL, '
+            'created REAL NOT NULL, '
+            'accessed REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS responses_accessed '
+            'ON responses (accessed)'
+        )
+        self._conn.commit()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _lookup(self, key: str) -> Optional[str]:
+        row = self._conn.execute(
+            'SELECT value, created, accessed FROM responses WHERE key = ?',
+            (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, created, accessed = row
+        if self._is_expired(created):
+            self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self._conn.commit()
+            return None
+        now = time.time()
+        if now - accessed >= self._access_granularity:
+            self._conn.execute(
+                'UPDATE responses SET accessed = ? WHERE key = ?',
+                (now, key),
+            )
+            self._conn.commit()
+        return value
+
+    def _update(self, key: str, value: str) -> None:
+        now = time.time()
+        self._conn.execute(
+            'INSERT OR REPLACE INTO responses (key, value, created, accessed) '
+            'VALUES (?, ?, ?, ?)',
+            (key, value, now, now),
+        )
+        if self._max_size is not None:
+            cursor = self._conn.execute(
+                'DELETE FROM responses WHERE key IN ('
+                'SELECT key FROM responses ORDER BY accessed DESC '
+                'LIMIT -1 OFFSET ?)',
+                (self._max_size,),
+            )
+            self._stats.evictions += max(cursor.rowcount, 0)
+        self._conn.commit()
+
+    def _clear(self) -> None:
+        self._conn.execute('DELETE FROM responses')
+        self._conn.commit()
+
+
+class TieredResponseCache(ResponseCache):
+    """Response cache that chains faster tiers in front of slower ones.
+
+    Lookups go through the tiers in order and hits are promoted to the
+    tiers in front of the one that answered; updates are written to every
+    tier.
+
+    Parameters:
+        tiers: Caches, fastest first.
+    """
+
+    _tiers: tuple[ResponseCache, ...]
+
+    def __init__(self, *tiers: ResponseCache) -> None:
+        super().__init__()
+        assert tiers, 'At least one cache tier is required.'
+        self._tiers = tiers
+
+    @property
+    def tiers(self) -> tuple[ResponseCache, ...]:
+        return self._tiers
+
+    def _lookup(self, key: str) -> Optional[str]:
+        for i, tier in enumerate(self._tiers):
+            value = tier.lookup(key)
+            if value is not None:
+                for faster in self._tiers[:i]:
+                    faster.update(key, value)
+                return value
+        return None
+
+    def _update(self, key: str, value: str) -> None:
+        for tier in self._tiers:
+            tier.update(key, value)
+
+    def _clear(self) -> None:
+        for tier in self._tiers:
+            tier.clear()
+
+
+def default_response_cache(
+    path: Optional[Union[str, Path]] = None,
+    max_size: int = 1024,
+    ttl: Optional[float] = None,
+    **kwargs: Any,
+) -> ResponseCache:
+    """Builds the default response cache.
+
+    An in-memory LRU tier, optionally backed by an SQLite tier at `path`.
+
+    Parameters:
+       path: Path to the SQLite database file.
+       max_size: Maximum number of entries of the in-memory tier.
+       ttl: Time-to-live of entries (in seconds).
+       kwargs: Other keyword arguments passed to the SQLite tier.
+
+    Returns:
+       Response cache.
+    """
+    memory = InMemoryResponseCache(max_size=max_size, ttl=ttl)
+    if path is None:
+        return memory
+    return TieredResponseCache(
+        memory, SQLiteResponseCache(path, ttl=ttl, **kwargs))
+
+
+__all__ = (
+    'CacheStats',
+    'InMemoryResponseCache',
+    'ResponseCache',
+    'SQLiteResponseCache',
+    'TieredResponseCache',
+    'default_response_cache',
+)
@@ -1,5 +1,17 @@
 from __future__ import annotations
 
-from .filter_compiler import LLM_FilterCompiler, Variable, LogicalComponent
+from .filter_compiler import (
+    LLM_CompiledFilter,
+    LLM_CompiledFilterCache,
+    LLM_FilterCompiler,
+    LogicalComponent,
+    Variable,
+)
 
-__all__ = ('LLM_FilterCompiler', 'LogicalComponent', 'Variable')
+__all__ = (
+    'LLM_CompiledFilter',
+    'LLM_CompiledFilterCache',
+    'LLM_FilterCompiler',
+    'LogicalComponent',
+    'Variable',
+)
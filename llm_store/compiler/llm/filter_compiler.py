@@ -1,6 +1,13 @@
 from __future__ import annotations
 
-from kif_lib import Fingerprint, Store
+import itertools
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from types import MappingProxyType
+
+from kif_lib import Context, Fingerprint, Store
 from kif_lib.model import Filter, Entity
 from kif_lib.model.fingerprint import (
     AndFingerprint,
@@ -19,7 +26,7 @@ from kif_lib.typing import (
     Union,
 )
 
-from typing import Dict, List
+from typing import Dict, List, Mapping, NamedTuple
 
 from llm_store.constants import (
     ONE_VARIABLE_PROMPT_TASK,
@@ -28,6 +35,8 @@ from llm_store.constants import (
 
 from ..llm.compiler import LLM_Compiler
 
+LOG = logging.getLogger(__name__)
+
 
 class LogicalComponent:
     def __init__(self, components: List):
@@ -83,6 +92,47 @@ class Variable:
         self._value = v
 
 
+class LLM_CompiledFilter(NamedTuple):
+    """Immutable result of compiling a filter.
+
+    It carries everything the LLM pipeline needs from the compiler and can
+    be shared between concurrent filter evaluations.
+    """
+
+    #: The normalized source filter.
+    filter: Filter
+
+    #: The filter type.
+    filter_type: KIF_FilterTypes
+
+    #: The query (prompt task) template.
+    query_template: str
+
+    #: The task sentence template.
+    task_sentence_template: str
+
+    #: Whether the query has a `where` clause.
+    has_where: bool
+
+    #: Bind skeleton: subject, property and value entities or variables.
+    #:
+    #: The mapping is read-only and its values are immutable KIF terms, so
+    #: it is shared (not copied) by every user of a cached compiled filter.
+    binds: Mapping[str, Any]
+
+    def get_filter_type(self) -> KIF_FilterTypes:
+        return self.filter_type
+
+    def get_query_template(self) -> str:
+        return self.query_template
+
+    def get_task_sentence_template(self) -> str:
+        return self.task_sentence_template
+
+    def get_binds(self) -> Mapping[str, Any]:
+        return self.binds
+
+
 class LLM_FilterCompiler(LLM_Compiler):
     """LLM filter compiler."""
 
@@ -92,6 +142,7 @@ class LLM_FilterCompiler(LLM_Compiler):
         '_instruction',
         '_query_template',
         '_task_sentence_template',
+        '_labels',
     )
 
     # The source filter.
@@ -111,6 +162,8 @@ class LLM_FilterCompiler(LLM_Compiler):
 
     _target_store: Store
 
+    _labels: Dict[Entity, str]
+
     def __init__(
         self, filter: Filter, target_store: Store, flags: Optional[LLM_FilterCompiler.Flags] = None
     ) -> None:
@@ -119,6 +172,7 @@ class LLM_FilterCompiler(LLM_Compiler):
         self._target_store = target_store
         self._has_where = False
         self._binds = {}
+        self._labels = {}
         self._instruction = ONE_VARIABLE_PROMPT_TASK
 
     @property
@@ -200,9 +254,66 @@ class LLM_FilterCompiler(LLM_Compiler):
     ) -> Self:
         filter = self._filter.normalize()
         self._check_filter_type(filter)
+        self._labels = self._prefetch_labels(filter)
         self._push_filter(filter, task_prompt_template)
         return self
 
+    def _prefetch_labels(self, filter: Filter) -> Dict[Entity, str]:
+        """Gets the labels of every entity in `filter`.
+
+        Labels missing from the context's entity registry are resolved in
+        a single batched call, instead of one call per entity.
+
+        Parameters:
+           filter: Normalized filter.
+
+        Returns:
+           Labels by entity (entities without label are left out).
+        """
+        context = Context.top()
+        language = context.options.language
+        entities = list(dict.fromkeys(filter.traverse(Entity.test)))
+        missing = [
+            entity for entity in entities
+            if context.get_label(entity, language, resolve=False) is None]
+        if missing:
+            try:
+                for _ in context.resolve(
+                        missing, label=True, language=language):
+                    pass
+            except Exception as e:
+                LOG.info(f'Could not resolve {len(missing)} labels: {e}')
+        labels: Dict[Entity, str] = {}
+        for entity in entities:
+            label = context.get_label(entity, language, resolve=False)
+            if label is not None:
+                labels[entity] = label.content
+        return labels
+
+    def _get_label(self, entity: Entity) -> str:
+        label = self._labels.get(entity)
+        assert (
+            label is not None
+        ), f'It was not possible to get the label for the entity `{entity}`'
+        return label
+
+    def to_compiled_filter(self) -> LLM_CompiledFilter:
+        """Gets the immutable compiled filter.
+
+        Must be called after :meth:`compile`.
+
+        Returns:
+           Compiled filter.
+        """
+        return LLM_CompiledFilter(
+            filter=self._filter.normalize(),
+            filter_type=self._filter_type,
+            query_template=self._query_template,
+            task_sentence_template=self._task_sentence_template,
+            has_where=self._has_where,
+            binds=MappingProxyType(dict(self._binds)),
+        )
+
     def _check_filter_type(self, filter: Filter):
         assert not filter.is_empty()
 
@@ -272,9 +383,9 @@ class LLM_FilterCompiler(LLM_Compiler):
                 var = Variable(f'var{var_count}')
                 property = filter[0][0]
                 item = filter[0][1]
-                property_label = property.label.content
+                property_label = self._get_label(property)
 
-                item_label = item.label.content
+                item_label = self._get_label(item)
                 where += f'{var.get_name()} {property_label} {item_label}'  # noqa E501
                 return var, where, var_count
             if isinstance(filter, CompoundFingerprint):
@@ -285,7 +396,7 @@ class LLM_FilterCompiler(LLM_Compiler):
                     var_components = []
                     for exp in filter:
                         var, _where, local_var_count = compile(
-                            self._target_store, exp, local_var_count
+                            exp, local_var_count
                         )
                         if _where:
                             local_var_count -= 1
@@ -294,7 +405,10 @@ class LLM_FilterCompiler(LLM_Compiler):
                             var_components.append(var)
                     if var_components:
                         var = OrComponent(var_components)
-                    var_count = local_var_count + 1
+                    if local_where:
+                        var_count = local_var_count + 1
+                    else:
+                        var_count = local_var_count
                     return var, ' or '.join(local_where), var_count
                 if isinstance(filter, AndFingerprint):
                     local_var_count = var_count
@@ -312,7 +426,10 @@ class LLM_FilterCompiler(LLM_Compiler):
                             var_components.append(var)
                     if var_components:
                         var = AndComponent(var_components)
-                    var_count = local_var_count + 1
+                    if local_where:
+                        var_count = local_var_count + 1
+                    else:
+                        var_count = local_var_count
                     return var, ' and '.join(local_where), var_count
             raise ValueError('Can\'t compile this filter')
 
@@ -336,30 +453,13 @@ class LLM_FilterCompiler(LLM_Compiler):
             if isinstance(entity, Variable):
                 return query_template.replace(replacement, entity.name)
             if isinstance(entity, Entity):
-                assert (
-                    entity.label
-                ), f'It was not possible to get the label for the entity `{entity}`'
-
-                value_template = entity.label.content
+                value_template = self._get_label(entity)
             elif isinstance(value_template, OrComponent):
-                labels = []
-                for component in value_template.components:
-                    assert (
-                        component.label
-                    ), f'It was not possible to get the label for the entity `{component}`'
-
-                    entity_label = component.label.content
-                    labels.append(entity_label)
-                value_template = ' or '.join(labels)
+                value_template = ' or '.join(
+                    map(self._get_label, value_template.components))
             elif isinstance(value_template, AndComponent):
-                labels = []
-                for component in value_template.components:
-                    assert (
-                        component.label
-                    ), f'It was not possible to get the label for the entity `{component}`'
-                    entity_label = component.label.content
-                    labels.append(entity_label)
-                value_template = ' and '.join(labels)
+                value_template = ' and '.join(
+                    map(self._get_label, value_template.components))
             return query_template.replace(replacement, value_template)
 
         default_task_template = '{subject} {property} {value}'
@@ -402,3 +502,114 @@ class LLM_FilterCompiler(LLM_Compiler):
             query_template = query_template.rsplit(' and', 1)
             query_template = ''.join(query_template)
         self._query_template = query_template
+
+
+class LLM_CompiledFilterCache:
+    """Bounded LRU cache of compiled filters.
+
+    Entries are keyed by the normalized filter, the task prompt template,
+    the compilation flags, the label language and the target store, so
+    repeated filters skip compilation and entity label resolution.  Target
+    stores are told apart by a token that is never reused; the entries of
+    a store are dropped once the store is garbage-collected.
+
+    Parameters:
+        max_size: Maximum number of compiled filters.
+    """
+
+    __slots__ = (
+        '_max_size',
+        '_entries',
+        '_lock',
+        '_stores',
+        '_dead_stores',
+        '_tokens',
+        'hits',
+        'misses',
+    )
+
+    _max_size: int
+    _entries: OrderedDict[tuple, LLM_CompiledFilter]
+
+    def __init__(self, max_size: int = 1024) -> None:
+        assert max_size > 0
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stores: Dict[int, tuple[weakref.ref, int]] = {}
+        self._dead_stores: List[int] = []
+        self._tokens = itertools.count()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    def compile(
+        self,
+        filter: Filter,
+        target_store: Store,
+        flags: Optional[LLM_FilterCompiler.Flags] = None,
+        task_prompt_template: Optional[str] = None,
+    ) -> LLM_CompiledFilter:
+        """Gets the compiled `filter`, compiling it on a cache miss.
+
+        Parameters:
+           filter: Filter.
+           target_store: Target store.
+           flags: Compilation flags.
+           task_prompt_template: Task prompt template.
+
+        Returns:
+           Compiled filter.
+        """
+        filter = filter.normalize()
+        language = Context.top().options.language
+        with self._lock:
+            key = (filter, task_prompt_template, flags, language,
+                   self._store_token(target_store))
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+        compiler = LLM_FilterCompiler(filter, target_store, flags)
+        compiled = compiler.compile(task_prompt_template).to_compiled_filter()
+        with self._lock:
+            self._entries[key] = compiled
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+        return compiled
+
+    def clear(self) -> None:
+        """Removes all compiled filters."""
+        with self._lock:
+            self._entries.clear()
+
+    def _store_token(self, store: Store) -> int:
+        # Must be called with the lock held.
+        if self._dead_stores:
+            dead = set(self._dead_stores)
+            self._dead_stores.clear()
+            for key in [k for k in self._entries if k[-1] in dead]:
+                del self._entries[key]
+        entry = self._stores.get(id(store))
+        if entry is not None and entry[0]() is store:
+            return entry[1]
+        token = next(self._tokens)
+
+        def forget(ref: weakref.ref, key: int = id(store)) -> None:
+            # Called by the garbage collector, possibly with the lock held;
+            # the entries are dropped by the next compilation.
+            if self._stores.get(key, (None,))[0] is ref:
+                del self._stores[key]
+            self._dead_stores.append(token)
+
+        self._stores[id(store)] = (weakref.ref(store, forget), token)
+        return token
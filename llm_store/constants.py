@@ -44,6 +44,9 @@ Please, respond only the noun phrase, truthfully, and avoid any additional \
 explanation.
 '''
 
+LIMIT_INSTRUCTION = '''\
+Give at most {limit} answers.'''
+
 DEFAULT_SYSTEM_PROMPT_INSTRUCTION = '''\
 You are a helpful and honest assistant that resolves a human given TASK.'''
 
@@ -61,6 +64,34 @@ ONE_VARIABLE_PROMPT_TASK = '''\
 Fill in the gap to complete the relation:
 '''
 
+BATCH_PROMPT_TASK = '''\
+Fill in the gap to complete each of the following numbered relations:
+'''
+
+BATCH_OUTPUT_FORMAT_INSTRUCTION = '''\
+Answer each relation on its own line, starting with its number, eg: \
+`1: foo; bar; baz`. Answers to a relation should be semicolon separated \
+noun phrases; leave the line empty after the number if there is no \
+answer.'''
+
+CONTINUATION_INSTRUCTION = '''
+Give answers other than the following ones: {answers}.'''
+
+ASK_PROMPT_TASK = '''\
+Is the following relation true?
+'''
+
+ASK_OUTPUT_FORMAT_INSTRUCTION = '''\
+Your response should be a single word: `yes` or `no`.'''
+
+FAST_PATH_CLOSING_INSTRUCTION = '''\
+Please, respond truthfully and avoid any additional explanation.
+'''
+
+COUNT_OUTPUT_FORMAT_INSTRUCTION = '''\
+Your response should be a single integer: the number of distinct answers \
+that fill in the gap, or 0 if there is no answer.'''
+
 
 class EntityLinkingMethod(StrEnum):
     KEYWORD = auto()
@@ -76,6 +107,51 @@ class LLM_Providers(StrEnum):
     OLLAMA = auto()
 
 
+class OutputMode(StrEnum):
+    # Semicolon-separated answers.
+    TEXT = auto()
+    # JSON answers, using the provider's JSON mode if available.
+    JSON = auto()
+
+
+class HybridPolicy(StrEnum):
+    # Call the LLM only if the target store has no answer.
+    FALLBACK = auto()
+    # Call the LLM if the target store has no answer, times out or returns
+    # less answers than the limit.
+    COMPLEMENT = auto()
+    # Always call the LLM and merge its answers with the target store's.
+    MERGE = auto()
+
+
+class Provenance(StrEnum):
+    KB = auto()
+    LLM = auto()
+
+
+class ValidationMode(StrEnum):
+    # Tag (annotated) statements as verified or unverified.
+    ANNOTATE = auto()
+    # Drop statements not found in the target store.
+    DROP = auto()
+
+
+class ValidationStatus(StrEnum):
+    VERIFIED = auto()
+    UNVERIFIED = auto()
+
+
+#: Prefix of the IRIs that tag the validation status of answers.
+VALIDATION_IRI_PREFIX = os.getenv(
+    'LLM_STORE_VALIDATION_IRI_PREFIX', 'urn:llm-store:validation:'
+)
+
+#: Prefix of the IRIs that tag the provenance of hybrid answers.
+PROVENANCE_IRI_PREFIX = os.getenv(
+    'LLM_STORE_PROVENANCE_IRI_PREFIX', 'urn:llm-store:provenance:'
+)
+
+
 class KIF_FilterTypes(StrEnum):
     EMPTY = auto()
     ONE_VARIABLE = auto()
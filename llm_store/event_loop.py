@@ -0,0 +1,177 @@
+import asyncio
+import queue
+import threading
+
+from kif_lib.typing import (
+    Any,
+    AsyncIterable,
+    Awaitable,
+    Iterator,
+    Optional,
+    TypeVar,
+)
+
+T = TypeVar('T')
+
+
+class BackgroundEventLoop:
+    """Event loop running on a dedicated daemon thread.
+
+    Used to expose LLM Store's native async pipeline through KIF's
+    synchronous store interface without calling :func:`asyncio.run` (and
+    thus without patching the caller's event loop).
+
+    Parameters:
+        name: Name of the background thread.
+    """
+
+    __slots__ = (
+        '_name',
+        '_loop',
+        '_thread',
+        '_lock',
+    )
+
+    _name: str
+    _loop: Optional[asyncio.AbstractEventLoop]
+    _thread: Optional[threading.Thread]
+    _lock: threading.Lock
+
+    def __init__(self, name: str = 'llm-store-event-loop') -> None:
+        self._name = name
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The background event loop (started on first use)."""
+        return self.get_loop()
+
+    def get_loop(self) -> asyncio.AbstractEventLoop:
+        """Gets the background event loop, starting it if needed.
+
+        Returns:
+           Event loop.
+        """
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run() -> None:
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(
+                    target=run, name=self._name, daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def _check_not_in_loop_thread(self) -> None:
+        if self._thread is not None and (
+                threading.current_thread() is self._thread):
+            raise RuntimeError(
+                'Cannot block on the background event loop from its own '
+                'thread; use the async API instead.')
+
+    def run(
+        self, coro: Awaitable[T], timeout: Optional[float] = None
+    ) -> T:
+        """Runs `coro` on the background loop and waits for its result.
+
+        Parameters:
+           coro: Awaitable.
+           timeout: Timeout (in seconds).
+
+        Returns:
+           The result of `coro`.
+        """
+        self._check_not_in_loop_thread()
+
+        async def wrapper() -> T:
+            return await coro
+
+        future = asyncio.run_coroutine_threadsafe(wrapper(), self.loop)
+        try:
+            return future.result(timeout)
+        finally:
+            if not future.done():
+                future.cancel()
+
+    def iterate(
+        self, iterable: AsyncIterable[T], maxsize: int = 16
+    ) -> Iterator[T]:
+        """Consumes `iterable` on the background loop.
+
+        Items are handed to the calling thread as soon as they are
+        produced.  At most `maxsize` items wait for the calling thread; the
+        producer is suspended (without blocking the loop) until the calling
+        thread catches up.  Closing the returned iterator (or abandoning it)
+        cancels the producer, so any in-flight work is interrupted.
+
+        Parameters:
+           iterable: Async iterable.
+           maxsize: Maximum number of items buffered.
+
+        Returns:
+           Iterator over the items of `iterable`.
+        """
+        self._check_not_in_loop_thread()
+        assert maxsize > 0
+        channel: queue.SimpleQueue[tuple[bool, Any]] = queue.SimpleQueue()
+        # Free buffer slots; end and error markers do not take a slot.
+        slots = asyncio.Semaphore(maxsize)
+
+        async def produce() -> None:
+            try:
+                async for item in iterable:
+                    await slots.acquire()
+                    channel.put((True, item))
+            except asyncio.CancelledError:
+                channel.put((False, None))
+                raise
+            except BaseException as err:
+                channel.put((False, err))
+            else:
+                channel.put((False, None))
+
+        future = asyncio.run_coroutine_threadsafe(produce(), self.loop)
+        try:
+            while True:
+                ok, item = channel.get()
+                if ok:
+                    self.loop.call_soon_threadsafe(slots.release)
+                    yield item
+                elif item is None:
+                    return
+                else:
+                    raise item
+        finally:
+            if not future.done():
+                future.cancel()
+
+    def stop(self) -> None:
+        """Stops the background loop and joins its thread."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop, self._thread = None, None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+        if thread is not None:
+            thread.join()
+        if loop is not None:
+            loop.close()
+
+
+#: Process-wide background loop shared by all LLM Store instances.
+default_event_loop = BackgroundEventLoop()
+
+
+__all__ = (
+    'BackgroundEventLoop',
+    'default_event_loop',
+)
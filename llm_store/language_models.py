@@ -1,6 +1,81 @@
+from typing import Optional
+
 from langchain_core.language_models import BaseChatModel, SimpleChatModel
 
+from kbel.language_models import HedgedChatModel
+
+#: Names used by LangChain integrations for the maximum number of generated
+#: tokens, e.g., ``max_tokens`` (ChatOpenAI) and ``num_predict``
+#: (ChatOllama).
+MAX_TOKENS_FIELDS = (
+    'max_tokens',
+    'num_predict',
+    'max_new_tokens',
+    'max_output_tokens',
+)
+
+
+def with_max_tokens(model: BaseChatModel, max_tokens: int) -> BaseChatModel:
+    """Returns a copy of `model` that generates at most `max_tokens`.
+
+    The model is returned unchanged if it has no known max tokens field or
+    if it is already bounded by a smaller value.
+
+    Parameters:
+       model: Chat model.
+       max_tokens: Maximum number of generated tokens.
+
+    Returns:
+       Chat model.
+    """
+    if isinstance(model, HedgedChatModel):
+        return model.model_copy(update={
+            'primary': with_max_tokens(model.primary, max_tokens),
+            'secondary': with_max_tokens(model.secondary, max_tokens),
+        })
+    fields = getattr(type(model), 'model_fields', {})
+    for field in MAX_TOKENS_FIELDS:
+        if field in fields:
+            current: Optional[int] = getattr(model, field, None)
+            if current is not None and current <= max_tokens:
+                return model
+            return model.model_copy(update={field: max_tokens})
+    return model
+
+
+def with_json_mode(model: BaseChatModel) -> BaseChatModel:
+    """Returns a copy of `model` constrained to generate JSON.
+
+    Uses the provider's JSON mode when it is known (``format='json'`` in
+    ChatOllama and ``response_format`` in ChatOpenAI); other models are
+    returned unchanged and rely on the prompt's format instructions.
+
+    Parameters:
+       model: Chat model.
+
+    Returns:
+       Chat model.
+    """
+    if isinstance(model, HedgedChatModel):
+        return model.model_copy(update={
+            'primary': with_json_mode(model.primary),
+            'secondary': with_json_mode(model.secondary),
+        })
+    fields = getattr(type(model), 'model_fields', {})
+    if 'format' in fields:
+        return model.model_copy(update={'format': 'json'})
+    if 'model_kwargs' in fields and 'openai' in model._llm_type:
+        model_kwargs = dict(getattr(model, 'model_kwargs', None) or {})
+        model_kwargs['response_format'] = {'type': 'json_object'}
+        return model.model_copy(update={'model_kwargs': model_kwargs})
+    return model
+
+
 __all__ = (
     'BaseChatModel',
+    'HedgedChatModel',
+    'MAX_TOKENS_FIELDS',
     'SimpleChatModel',
+    'with_json_mode',
+    'with_max_tokens',
 )
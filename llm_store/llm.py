@@ -1,8 +1,10 @@
-import logging
 import asyncio
+import dataclasses
+import logging
+import re
+from collections import OrderedDict
 from kif_lib.store.abc import TOptions
-import nest_asyncio
-from typing import List, Dict
+from typing import List, Dict, Mapping, Tuple, TYPE_CHECKING
 import importlib.util
 
 from kif_lib import (
@@ -11,6 +13,7 @@ from kif_lib import (
     Item,
     Property,
     QuantityDatatype,
+    ReferenceRecord,
     TimeDatatype,
     StringDatatype,
     TextDatatype,
@@ -20,14 +23,19 @@ from kif_lib import (
     ValueSnak,
     Search
 )
+from kif_lib.vocabulary import wd
 
 from kif_lib.typing import (
     Any,
+    AsyncIterable,
     AsyncIterator,
+    Callable,
     ClassVar,
     Iterable,
     Iterator,
+    Literal,
     Optional,
+    Sequence,
     Union,
     override,
 )
@@ -37,33 +45,63 @@ from kif_lib.model.fingerprint import (
     ValueFingerprint,
 )
 
-from .language_models import BaseChatModel
+from .language_models import BaseChatModel, with_json_mode, with_max_tokens
 from .output_parsers import (
+    JsonListOfNumbersOutputParser,
+    JsonListOutputParser,
     SemicolonSeparatedListOfNumbersOutputParser,
     SemicolonSeparatedListOfDateTimeOutputParser,
     SemicolonSeparatedListOutputParser,
     BaseOutputParser,
+    _is_blank,
+    _is_truncated,
 )
+from .cache import ResponseCache
+from .event_loop import default_event_loop
+from .planner import LLM_QueryPlan, LLM_QueryPlanner
+from .utils import aclosing, aiter_from, amap, amerge, atake
 from .prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnableSequence
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable
 
 from .compiler.llm.filter_compiler import (
+    LLM_CompiledFilter,
+    LLM_CompiledFilterCache,
     LLM_FilterCompiler,
     Variable,
     LogicalComponent,
 )
 
 from .constants import (
+    ASK_OUTPUT_FORMAT_INSTRUCTION,
+    ASK_PROMPT_TASK,
+    BATCH_OUTPUT_FORMAT_INSTRUCTION,
+    BATCH_PROMPT_TASK,
+    CONTINUATION_INSTRUCTION,
+    COUNT_OUTPUT_FORMAT_INSTRUCTION,
+    FAST_PATH_CLOSING_INSTRUCTION,
     DEFAULT_AVOID_EXPLANATION_INSTRUCTION,
     DEFAULT_SYSTEM_PROMPT_INSTRUCTION,
+    LIMIT_INSTRUCTION,
+    PROVENANCE_IRI_PREFIX,
     SYSTEM_PROMPT_INSTRUCTION_WITH_CONTEXT,
     SYSTEM_PROMPT_INSTRUCTION_WITH_ENFORCED_CONTEXT,
+    VALIDATION_IRI_PREFIX,
     EntityLinkingMethod,
+    HybridPolicy,
     KIF_FilterTypes,
     LLM_Providers,
+    OutputMode,
+    Provenance,
+    ValidationMode,
+    ValidationStatus,
 )
 
-nest_asyncio.apply()
+from kbel.language_models import governed
+
+if TYPE_CHECKING:
+    from kbel.cache import LinkingCache
+    from kbel.disambiguators import Disambiguator
 
 LOG = logging.getLogger(__name__)
 
@@ -87,6 +125,123 @@ class PromptExample:
         self._value = value
 
 
+@dataclasses.dataclass
+class HybridStats:
+    """Counters of the hybrid mode of an LLM Store."""
+
+    #: Number of filters answered by the target store alone.
+    kb_answered: int = 0
+
+    #: Number of filters that were sent to the LLM.
+    llm_called: int = 0
+
+    #: Number of target store evaluations that timed out.
+    kb_timeouts: int = 0
+
+    #: Number of target store evaluations that failed.
+    kb_errors: int = 0
+
+
+@dataclasses.dataclass
+class ValidationStats:
+    """Counters of the validation of LLM answers against the target store."""
+
+    #: Number of statements found in the target store.
+    verified: int = 0
+
+    #: Number of statements not found in the target store.
+    unverified: int = 0
+
+    #: Number of validation queries that failed.
+    errors: int = 0
+
+
+@dataclasses.dataclass(frozen=True)
+class PageCursor:
+    """Position of the next page of the answers to a filter."""
+
+    #: Filter.
+    filter: Filter
+
+    #: Number of statements already returned.
+    offset: int
+
+
+@dataclasses.dataclass
+class Page:
+    """Page of the answers to a filter."""
+
+    #: Statements of the page.
+    statements: List[Statement]
+
+    #: Cursor of the next page, or ``None`` if there are no more answers.
+    next: Optional[PageCursor]
+
+
+class _PageState:
+    """Answers generated so far for a paginated filter."""
+
+    __slots__ = ('labels', 'statements', 'exhausted', 'lock')
+
+    def __init__(self) -> None:
+        self.labels: List[str] = []
+        self.statements: List[Statement] = []
+        self.exhausted = False
+        self.lock = asyncio.Lock()
+
+
+class _FilterContext:
+    """Request-scoped state of a leaf filter evaluation.
+
+    Everything derived from a single filter (parser, compiled filter, binds
+    and pipeline chain) lives here instead of on the store, so a single
+    :class:`LLM_Store` can evaluate many filters concurrently.
+
+    Parameters:
+        filter: Filter.
+        options: Store options.
+        parser: Output parser for the filter's value datatype.
+        compiled: Compiled filter.
+        query: Prompt query.
+    """
+
+    __slots__ = (
+        'filter',
+        'options',
+        'parser',
+        'compiled',
+        'query',
+        'chain',
+    )
+
+    def __init__(
+        self,
+        filter: Filter,
+        options: Any,
+        parser: BaseOutputParser,
+        compiled: LLM_CompiledFilter,
+        query: str,
+    ) -> None:
+        self.filter = filter
+        self.options = options
+        self.parser = parser
+        self.compiled = compiled
+        self.query = query
+        self.chain: Optional[Runnable] = None
+
+    @property
+    def output_format_prompt(self) -> str:
+        return self.parser.get_format_instructions()
+
+    @property
+    def filter_type(self) -> KIF_FilterTypes:
+        return self.compiled.filter_type
+
+    @property
+    def binds(self) -> Mapping[str, Any]:
+        return self.compiled.binds
+
+
 class LLM_Store(
     Store[TOptions],
     store_name='llm',
@@ -127,6 +282,41 @@ class LLM_Store(
       enforce_context: Whether to enforce LLM to search the answer
         in context or use the context to support the answer
       model_args: Arguments to the LLM model, e.g. {'max_new_tokens': 2048}
+      subfilter_concurrency: Maximum number of sub-filters of a disjunctive
+        (`OrFingerprint`) filter evaluated concurrently; `None` means no limit.
+      response_cache: A ResponseCache used to answer repeated prompts.
+      disambiguation_concurrency: Maximum number of labels linked
+        concurrently; `None` means no limit.
+      ordered_disambiguation: Whether linked labels are yielded in the order
+        they were generated instead of as soon as they are linked.
+      linking_cache: A kbel LinkingCache shared with other stores (or
+        KIFQA instances) to reuse label-to-entity links across queries.
+      streaming: Whether to stream the model response and start linking each
+        answer as soon as it is generated.
+      hybrid_policy: If given, filters are first evaluated against
+        `target_store` and the LLM is called only as required by the
+        HybridPolicy (`fallback`, `complement` or `merge`).
+      hybrid_timeout: Timeout (in seconds) of the target store evaluation in
+        hybrid mode.
+      output_mode: Whether answers are generated as semicolon-separated
+        text (`text`) or as JSON (`json`), using the provider's JSON mode
+        when available and repairing malformed JSON.
+      validation: If given, the statements produced by the LLM for a filter
+        are checked against `target_store` in a single query and, according
+        to the ValidationMode, either tagged (`annotate`) or dropped (`drop`)
+        if not found.
+      use_planner: Whether filters whose subject or value is a snak or a
+        conjunction (e.g., ``wd.continent(wd.South_America)``) are
+        decomposed by an LLM_QueryPlanner into one-variable sub-queries.
+      fast_path_max_tokens: Token budget of the yes/no (`ask`) and count
+        completions; raise it for models that need more tokens to answer.
+
+    The store is natively asynchronous: KIF's ``afilter``, ``aask`` and
+    ``acount`` stream statements straight from the LLM pipeline, while the
+    synchronous ``filter``, ``ask`` and ``count`` consume the same pipeline
+    through a background event loop thread.  Per-filter state is kept in a
+    request-scoped context, so one instance can serve concurrent filters
+    from many tasks or threads.
     """  # noqa E501
 
     __slots__ = (
@@ -143,7 +333,24 @@ class LLM_Store(
         '_enforce_context',
         '_compile_to_natural_language_question',
         '_create_entity',
-        '_compiler',
+        '_disambiguator',
+        '_subfilter_concurrency',
+        '_response_cache',
+        '_pipeline_chains',
+        '_streaming',
+        '_disambiguation_concurrency',
+        '_ordered_disambiguation',
+        '_linking_cache',
+        '_hybrid_policy',
+        '_hybrid_timeout',
+        '_hybrid_stats',
+        '_validation',
+        '_validation_stats',
+        '_output_mode',
+        '_page_states',
+        '_use_planner',
+        '_planner',
+        '_fast_path_max_tokens',
     )
 
     _model: BaseChatModel
@@ -156,7 +363,24 @@ class LLM_Store(
     _model_for_entity_resolution: Optional[BaseChatModel]
     _examples: Optional[List[PromptExample]]
     _output_format_prompt: Optional[str]
-    _compiler: LLM_FilterCompiler
+    _disambiguator: Optional['Disambiguator']
+    _subfilter_concurrency: Optional[int]
+    _response_cache: Optional[ResponseCache]
+    _pipeline_chains: Dict[tuple, Runnable]
+    _streaming: bool
+    _disambiguation_concurrency: Optional[int]
+    _ordered_disambiguation: bool
+    _hybrid_policy: Optional[HybridPolicy]
+    _hybrid_timeout: Optional[float]
+    _hybrid_stats: HybridStats
+    _validation: Optional[ValidationMode]
+    _validation_stats: ValidationStats
+    _output_mode: OutputMode
+    _page_states: 'OrderedDict[Filter, _PageState]'
+    _use_planner: bool
+    _planner: Optional[LLM_QueryPlanner]
+    _fast_path_max_tokens: int
+    _linking_cache: Optional['LinkingCache']
 
     def __init__(
         self,
@@ -180,6 +404,18 @@ class LLM_Store(
         compile_to_natural_language_question=False,
         create_entity=False,
         model_params: Optional[Dict[str, Any]] = None,
+        subfilter_concurrency: Optional[int] = 8,
+        response_cache: Optional[ResponseCache] = None,
+        streaming: bool = False,
+        disambiguation_concurrency: Optional[int] = 8,
+        ordered_disambiguation: bool = False,
+        linking_cache: Optional['LinkingCache'] = None,
+        hybrid_policy: Optional[HybridPolicy] = None,
+        hybrid_timeout: Optional[float] = 2.0,
+        validation: Optional[ValidationMode] = None,
+        output_mode: OutputMode = OutputMode.TEXT,
+        use_planner: bool = False,
+        fast_path_max_tokens: int = 8,
         **kwargs: Any,
     ) -> None:
         super().__init__(store_name, **kwargs)
@@ -226,6 +462,44 @@ class LLM_Store(
         self._target_store = target_store
 
         self._searcher = searcher
+
+        self._subfilter_concurrency = subfilter_concurrency
+
+        self._disambiguator = None
+
+        self._response_cache = response_cache
+
+        self._pipeline_chains = {}
+
+        self._streaming = streaming
+
+        self._disambiguation_concurrency = disambiguation_concurrency
+
+        self._ordered_disambiguation = ordered_disambiguation
+
+        self._linking_cache = linking_cache
+
+        self._hybrid_policy = (
+            HybridPolicy(hybrid_policy) if hybrid_policy else None)
+
+        self._hybrid_timeout = hybrid_timeout
+
+        self._hybrid_stats = HybridStats()
+
+        self._validation = ValidationMode(validation) if validation else None
+
+        self._validation_stats = ValidationStats()
+
+        self._output_mode = OutputMode(output_mode)
+
+        self._page_states = OrderedDict()
+
+        self._use_planner = use_planner
+
+        self._planner = None
+
+        self._fast_path_max_tokens = fast_path_max_tokens
+
     @classmethod
     def from_model_providers_args(
         cls,
@@ -313,6 +587,10 @@ class LLM_Store(
     @model.setter
     def model(self, value: BaseChatModel) -> None:
         self._model = value
+        # Cached chains and sub-query results are bound to the model.
+        self._pipeline_chains.clear()
+        if self._planner is not None:
+            self._planner.clear_cache()
 
     @property
     def target_store(self) -> Store:
@@ -363,6 +641,7 @@ class LLM_Store(
     @entity_linking_method.setter
     def entity_linking_method(self, value: EntityLinkingMethod) -> None:
         self._entity_linking_method = value
+        self._disambiguator = None
 
     @property
     def enforce_context(self) -> bool:
@@ -404,6 +683,144 @@ class LLM_Store(
     def examples(self, value: List[PromptExample]) -> None:
         self._examples = value
 
+    @property
+    def subfilter_concurrency(self) -> Optional[int]:
+        return self._subfilter_concurrency
+
+    @subfilter_concurrency.setter
+    def subfilter_concurrency(self, value: Optional[int]) -> None:
+        self._subfilter_concurrency = value
+
+    @property
+    def response_cache(self) -> Optional[ResponseCache]:
+        return self._response_cache
+
+    @response_cache.setter
+    def response_cache(self, value: Optional[ResponseCache]) -> None:
+        self._response_cache = value
+        # Cached chains are bound to the response cache.
+        self._pipeline_chains.clear()
+
+    @property
+    def streaming(self) -> bool:
+        return self._streaming
+
+    @streaming.setter
+    def streaming(self, value: bool) -> None:
+        self._streaming = value
+
+    @property
+    def disambiguation_concurrency(self) -> Optional[int]:
+        return self._disambiguation_concurrency
+
+    @disambiguation_concurrency.setter
+    def disambiguation_concurrency(self, value: Optional[int]) -> None:
+        self._disambiguation_concurrency = value
+
+    @property
+    def ordered_disambiguation(self) -> bool:
+        return self._ordered_disambiguation
+
+    @ordered_disambiguation.setter
+    def ordered_disambiguation(self, value: bool) -> None:
+        self._ordered_disambiguation = value
+
+    @property
+    def linking_cache(self) -> Optional['LinkingCache']:
+        return self._linking_cache
+
+    @linking_cache.setter
+    def linking_cache(self, value: Optional['LinkingCache']) -> None:
+        self._linking_cache = value
+
+    @property
+    def hybrid_policy(self) -> Optional[HybridPolicy]:
+        return self._hybrid_policy
+
+    @hybrid_policy.setter
+    def hybrid_policy(self, value: Optional[HybridPolicy]) -> None:
+        self._hybrid_policy = HybridPolicy(value) if value else None
+
+    @property
+    def hybrid_timeout(self) -> Optional[float]:
+        return self._hybrid_timeout
+
+    @hybrid_timeout.setter
+    def hybrid_timeout(self, value: Optional[float]) -> None:
+        self._hybrid_timeout = value
+
+    @property
+    def hybrid_stats(self) -> HybridStats:
+        return self._hybrid_stats
+
+    @property
+    def validation(self) -> Optional[ValidationMode]:
+        return self._validation
+
+    @validation.setter
+    def validation(self, value: Optional[ValidationMode]) -> None:
+        self._validation = ValidationMode(value) if value else None
+
+    @property
+    def validation_stats(self) -> ValidationStats:
+        return self._validation_stats
+
+    @property
+    def output_mode(self) -> OutputMode:
+        return self._output_mode
+
+    @output_mode.setter
+    def output_mode(self, value: OutputMode) -> None:
+        self._output_mode = OutputMode(value)
+
+    @property
+    def use_planner(self) -> bool:
+        return self._use_planner
+
+    @use_planner.setter
+    def use_planner(self, value: bool) -> None:
+        self._use_planner = value
+
+    @property
+    def fast_path_max_tokens(self) -> int:
+        return self._fast_path_max_tokens
+
+    @fast_path_max_tokens.setter
+    def fast_path_max_tokens(self, value: int) -> None:
+        self._fast_path_max_tokens = value
+        # The fast-path chains are bound to the budget.
+        self._pipeline_chains.clear()
+
+    @property
+    def planner(self) -> LLM_QueryPlanner:
+        if self._planner is None:
+            self._planner = LLM_QueryPlanner(self)
+        return self._planner
+
+    def plan(
+        self,
+        subject: Optional[Any] = None,
+        property: Optional[Any] = None,
+        value: Optional[Any] = None,
+        filter: Optional[Filter] = None,
+    ) -> LLM_QueryPlan:
+        """Plans a filter without evaluating it.
+
+        The plan can be inspected (``plan.explain()``,
+        ``plan.estimated_calls``) and then executed (``plan.execute()``).
+
+        Parameters:
+           subject: Entity.
+           property: Property.
+           value: Value.
+           filter: Filter (takes precedence over the other arguments).
+
+        Returns:
+           Query plan.
+        """
+        filter = self._check_filter(subject, property, value, filter=filter)
+        return self.planner.plan(filter)
+
     def add_examples(self, examples: List[PromptExample]) -> None:
         if not self._examples:
             self._examples = []
@@ -414,16 +831,190 @@ class LLM_Store(
     def _filter(
         self, filter: Filter, options: TOptions
     ) -> Iterator[Statement]:
+        # Statements are streamed from the background event loop as soon
+        # as they are produced by `_afilter`.
+        return default_event_loop.iterate(self._afilter(filter, options))
+
+    async def _afilter(
+        self, filter: Filter, options: TOptions
+    ) -> AsyncIterator[Statement]:
+        statements = self._afilter_checked(filter, options)
+        async with aclosing(statements):
+            async for statement in statements:
+                yield statement
 
-        async def sync_wrapper() -> List[Statement]:
-            results = []
-            async for stmt in self._afilter(filter, options):
-                results.append(stmt)
-            return results
+    def _afilter_checked(
+        self,
+        filter: Filter,
+        options: TOptions,
+        llm: Optional[Callable[[], AsyncIterator[Statement]]] = None,
+    ) -> AsyncIterator[Statement]:
+        """Evaluates `filter` in hybrid or validation mode.
 
-        return iter(asyncio.run(sync_wrapper()))
+        The LLM statements are produced by `llm` (by default, the full
+        pipeline on `filter`), so answers obtained otherwise (e.g., from a
+        batched prompt) go through the same checks.
+        """
+        if self._hybrid_policy is None:
+            return self._afilter_validated(filter, options, llm)
+        return self._afilter_hybrid(filter, options, llm)
 
-    async def _afilter(
+    async def _afilter_hybrid(
+        self,
+        filter: Filter,
+        options: TOptions,
+        llm: Optional[Callable[[], AsyncIterator[Statement]]] = None,
+    ) -> AsyncIterator[Statement]:
+        # The target store answers first, within `hybrid_timeout`; the LLM
+        # is only called if the policy deems the KB answer insufficient.
+        kb_statements: List[Statement] = []
+        complete = True
+
+        async def collect() -> None:
+            async for statement in self._target_store.afilter(
+                    filter=filter,
+                    limit=options.limit,
+                    distinct=options.distinct):
+                kb_statements.append(statement)
+
+        try:
+            await asyncio.wait_for(collect(), self._hybrid_timeout)
+        except asyncio.TimeoutError:
+            LOG.info(f'Target store timed out on `{filter}`')
+            self._hybrid_stats.kb_timeouts += 1
+            complete = False
+        except Exception as e:
+            LOG.info(f'Target store failed on `{filter}`: {e}')
+            self._hybrid_stats.kb_errors += 1
+            complete = False
+
+        for statement in kb_statements:
+            yield self._tag_provenance(statement, Provenance.KB, filter)
+
+        if not self._hybrid_needs_llm(
+                len(kb_statements), complete, options.limit):
+            self._hybrid_stats.kb_answered += 1
+            return
+        if (options.limit is not None
+                and len(kb_statements) >= options.limit):
+            return
+
+        self._hybrid_stats.llm_called += 1
+        seen = {statement.unannotate() for statement in kb_statements}
+        statements = self._afilter_validated(filter, options, llm)
+        async with aclosing(statements):
+            async for statement in statements:
+                if statement.unannotate() in seen:
+                    continue
+                seen.add(statement.unannotate())
+                yield self._tag_provenance(statement, Provenance.LLM, filter)
+
+    def _hybrid_needs_llm(
+        self, count: int, complete: bool, limit: Optional[int]
+    ) -> bool:
+        if self._hybrid_policy == HybridPolicy.FALLBACK:
+            return count == 0
+        if self._hybrid_policy == HybridPolicy.COMPLEMENT:
+            return (count == 0 or not complete
+                    or (limit is not None and count < limit))
+        return True
+
+    @staticmethod
+    def _tag_provenance(
+        statement: Statement, provenance: Provenance, filter: Filter
+    ) -> Statement:
+        """Tags `statement` with a "stated in" reference to its source."""
+        if not filter.annotated:
+            return statement
+        return statement.annotate(references=[ReferenceRecord(
+            ValueSnak(wd.stated_in, Item(PROVENANCE_IRI_PREFIX + provenance)))])
+
+    async def _afilter_validated(
+        self,
+        filter: Filter,
+        options: TOptions,
+        llm: Optional[Callable[[], AsyncIterator[Statement]]] = None,
+    ) -> AsyncIterator[Statement]:
+        statements = (
+            llm() if llm is not None else self._afilter_llm(filter, options))
+        if self._validation is None:
+            async with aclosing(statements):
+                async for statement in statements:
+                    yield statement
+            return
+
+        # Validation needs every candidate to build a single query, so the
+        # LLM statements are collected before any is yielded.
+        candidates: List[Statement] = []
+        async with aclosing(statements):
+            async for statement in statements:
+                candidates.append(statement)
+        verified = await self._avalidate(candidates)
+        for statement in candidates:
+            if verified is None:
+                yield statement
+            elif statement.unannotate() in verified:
+                self._validation_stats.verified += 1
+                yield self._tag_validation(
+                    statement, ValidationStatus.VERIFIED, filter)
+            else:
+                self._validation_stats.unverified += 1
+                if self._validation == ValidationMode.ANNOTATE:
+                    yield self._tag_validation(
+                        statement, ValidationStatus.UNVERIFIED, filter)
+
+    async def _avalidate(
+        self, statements: List[Statement]
+    ) -> Optional[set[Statement]]:
+        """Gets which of `statements` are in the target store.
+
+        The candidates are checked by a single filter whose subject,
+        property and value are the disjunctions of theirs; the answer is a
+        superset of the candidates found, which are then picked out.
+
+        Returns:
+           The (unannotated) statements found, or ``None`` if the query
+           failed.
+        """
+        snaks = [
+            (stmt.subject, stmt.snak) for stmt in statements
+            if isinstance(stmt.snak, ValueSnak)]
+        if not snaks:
+            return set()
+
+        def disjunction(values: Iterable[Any]) -> Any:
+            values = list(dict.fromkeys(values))
+            if len(values) == 1:
+                return values[0]
+            return OrFingerprint(*map(ValueFingerprint, values))
+
+        filter = Filter(
+            subject=disjunction(s for s, _ in snaks),
+            property=disjunction(snak.property for _, snak in snaks),
+            value=disjunction(snak.value for _, snak in snaks),
+            snak_mask=Filter.VALUE_SNAK,
+        )
+        try:
+            return {
+                statement.unannotate()
+                async for statement in self._target_store.afilter(
+                    filter=filter, distinct=True)}
+        except Exception as e:
+            LOG.warning(f'Could not validate {len(snaks)} statements: {e}')
+            self._validation_stats.errors += 1
+            return None
+
+    @staticmethod
+    def _tag_validation(
+        statement: Statement, status: ValidationStatus, filter: Filter
+    ) -> Statement:
+        """Tags `statement` with a reference to its validation status."""
+        if not filter.annotated:
+            return statement
+        return statement.annotate(references=[ReferenceRecord(ValueSnak(
+            wd.based_on_heuristic, Item(VALIDATION_IRI_PREFIX + status)))])
+
+    async def _afilter_llm(
         self, filter: Filter, options: TOptions
     ) -> AsyncIterator[Statement]:
 
@@ -435,189 +1026,931 @@ class LLM_Store(
         p = filter.property
         v = filter.value
 
-        new_filter: Filter
         # TODO decompose complex compound filters (it should be handled on KIF's layer)  # noqa E501
+        sub_filters: Optional[List[Filter]] = None
         if isinstance(s, OrFingerprint):
-            for sub_filter in s:
-                new_filter = Filter(sub_filter, filter.property, filter.value)
-                async for result in self._afilter(
-                    new_filter, options
-                ):
-                    yield result
+            sub_filters = [filter.replace(subject=sub) for sub in s]
         elif isinstance(v, OrFingerprint):
-            for sub_filter in v:
-                new_filter = Filter(
-                    filter.subject, filter.property, sub_filter
-                )
-                async for result in self._afilter(
-                    new_filter, options
-                ):
-                    yield result
+            sub_filters = [filter.replace(value=sub) for sub in v]
         elif isinstance(p, OrFingerprint):
-            for sub_filter in p:
-                new_filter = Filter(filter.subject, sub_filter, filter.value)
-                async for result in self._afilter(
-                    new_filter, options
-                ):
-                    yield result
+            sub_filters = [filter.replace(property=sub) for sub in p]
+
+        if sub_filters is not None:
+            # Sub-filters are independent LLM round trips: dispatch them
+            # concurrently and merge their statements as they arrive.
+            async for result in amerge(
+                (self._afilter_llm(sub_filter, options)
+                 for sub_filter in sub_filters),
+                max_concurrency=self.subfilter_concurrency,
+                distinct=bool(options.distinct),
+            ):
+                yield result
+        elif self._use_planner and LLM_QueryPlanner.needs_planning(filter):
+            plan = self.planner.plan(filter)
+            LOG.info(f'Evaluating filter by plan:\n{plan.explain()}')
+            async for result in plan.aexecute(
+                    limit=options.limit, distinct=bool(options.distinct)):
+                yield result
         else:
-            self._parser = SemicolonSeparatedListOutputParser()
-            self._output_format_prompt = self._parser.get_format_instructions()
-
-            # TODO create conditions for each datatype different from Item,
-            # such as TimeDatatype
-            if isinstance(p, ValueFingerprint):
-                if isinstance(p[0].range, QuantityDatatype):
-                    self._parser = (
-                        SemicolonSeparatedListOfNumbersOutputParser()
-                    )
-                    self._output_format_prompt = (
-                        self._parser.get_format_instructions()
-                    )
-                elif isinstance(p[0].range, TimeDatatype):
-                    self._parser = (
-                        SemicolonSeparatedListOfDateTimeOutputParser()
-                    )
-                    self._output_format_prompt = (
-                        self._parser.get_format_instructions()
-                    )
+            context = self._create_filter_context(filter, options)
+            context.chain = self._get_pipeline_chain(
+                context,
+                distinct=options.distinct,
+                limit=self._get_model_limit(options.limit),
+            )
 
-            self._compiler = self._compile_filter(filter, options)
-            query = self._compiler.query_template
+            statements = await context.chain.ainvoke(
+                {
+                    'query': context.query,
+                    'textual_context': self.textual_context,
+                    'examples': self.examples,
+                    'context': context,
+                }
+            )
+            async with aclosing(statements):
+                async for statement in statements:
+                    yield statement
 
-            if self.examples:
-                pass
+    def filter_many(
+        self,
+        filters: Iterable[Filter],
+        limit: Optional[int] = None,
+        distinct: Optional[bool] = None,
+        group_by: Literal['subject', 'property'] = 'subject',
+        batch_size: int = 8,
+    ) -> Iterator[Tuple[Filter, Statement]]:
+        """Evaluates many filters, batching related ones in one prompt.
+
+        See :meth:`afilter_many`.
+        """
+        return default_event_loop.iterate(self.afilter_many(
+            filters, limit, distinct, group_by, batch_size))
 
-            if (
-                self._compiler.get_filter_type()
-                == KIF_FilterTypes.ONE_VARIABLE
-            ):
-                replacement = '_'
-                if self._compiler.has_where:
-                    replacement = 'X'
-                query = self._compiler.query_template.replace(
-                    'var1', replacement
+    async def afilter_many(
+        self,
+        filters: Iterable[Filter],
+        limit: Optional[int] = None,
+        distinct: Optional[bool] = None,
+        group_by: Literal['subject', 'property'] = 'subject',
+        batch_size: int = 8,
+    ) -> AsyncIterator[Tuple[Filter, Statement]]:
+        """Evaluates many filters, batching related ones in one prompt.
+
+        Filters asking for the values of a bound subject and property are
+        grouped by subject (an entity profile, e.g., the birth date,
+        birthplace and occupation of a person) or by property, and each
+        group of up to `batch_size` filters is answered by a single
+        numbered prompt whose answer is split back per filter.  Other
+        filters are evaluated as in :meth:`afilter`.  Groups and other
+        filters are evaluated concurrently.
+
+        Parameters:
+           filters: Filters.
+           limit: Maximum number of statements per filter.
+           distinct: Whether to suppress duplicated statements per filter.
+           group_by: Whether to group filters by ``subject`` or by
+             ``property``.
+           batch_size: Maximum number of filters per prompt.
+
+        Returns:
+           An async iterator of (filter, statement) pairs.
+        """
+        assert group_by in ('subject', 'property')
+        options = self.options.copy()
+        if limit is not None:
+            options.limit = limit
+        if distinct is not None:
+            options.distinct = distinct
+
+        groups: Dict[Any, List['_FilterContext']] = {}
+        singles: List[Filter] = []
+        for filter in filters:
+            context = self._get_batch_context(filter, options)
+            if context is None:
+                singles.append(filter)
+            else:
+                groups.setdefault(
+                    context.binds[group_by], []).append(context)
+
+        batches: List[List['_FilterContext']] = []
+        for group in groups.values():
+            for i in range(0, len(group), batch_size):
+                batch = group[i:i + batch_size]
+                if len(batch) == 1:
+                    singles.append(batch[0].filter)
+                else:
+                    batches.append(batch)
+
+        async def tag(filter: Filter) -> AsyncIterator[
+                Tuple[Filter, Statement]]:
+            async for statement in self._afilter(filter, options):
+                yield filter, statement
+
+        async for result in amerge(
+            [self._afilter_batch(batch, options) for batch in batches]
+            + [tag(filter) for filter in singles],
+            max_concurrency=self.subfilter_concurrency,
+        ):
+            yield result
+
+    def _get_batch_context(
+        self, filter: Filter, options: TOptions
+    ) -> Optional['_FilterContext']:
+        if any(isinstance(fp, OrFingerprint)
+               for fp in (filter.subject, filter.property, filter.value)):
+            return None
+        try:
+            context = self._create_filter_context(filter, options)
+        except Exception as e:
+            LOG.info(f'Could not compile `{filter}` for batching: {e}')
+            return None
+        binds = context.binds
+        if (
+            context.filter_type != KIF_FilterTypes.ONE_VARIABLE
+            or context.compiled.has_where
+            or not isinstance(binds['value'], Variable)
+            or isinstance(binds['subject'], Variable)
+            or isinstance(binds['property'], Variable)
+        ):
+            return None
+        return context
+
+    async def _afilter_batch(
+        self,
+        batch: Sequence['_FilterContext'],
+        options: TOptions,
+    ) -> AsyncIterator[Tuple[Filter, Statement]]:
+        limit = self._get_model_limit(options.limit)
+        parsers: List[BaseOutputParser] = []
+        tasks = []
+        for i, context in enumerate(batch, 1):
+            # Batched answers are numbered lines, even in JSON mode.
+            parser = context.parser
+            if isinstance(parser, JsonListOfNumbersOutputParser):
+                parser = SemicolonSeparatedListOfNumbersOutputParser()
+            elif isinstance(parser, JsonListOutputParser):
+                parser = SemicolonSeparatedListOutputParser()
+            parsers.append(parser)
+            task = context.compiled.task_sentence_template.replace('var1', '_')
+            if type(parser) is not SemicolonSeparatedListOutputParser:
+                task += f' ({parser.get_format_instructions()})'
+            tasks.append(f'{i}: {task}')
+
+        chain = self._get_batch_chain(limit and limit * len(batch))
+        answer = await chain.ainvoke({
+            'query': BATCH_PROMPT_TASK + '\n'.join(tasks),
+            'textual_context': self.textual_context,
+        })
+
+        answers: Dict[int, str] = {}
+        for line in answer.splitlines():
+            match = re.match(r'^\W*(\d+)\s*[:.)-]\s?(.*)$', line)
+            if match:
+                answers.setdefault(int(match.group(1)), match.group(2))
+
+        async def split(
+            i: int, context: '_FilterContext'
+        ) -> AsyncIterator[Tuple[Filter, Statement]]:
+            if i not in answers:
+                # The model skipped this relation: ask for it alone.
+                async for statement in self._afilter(context.filter, options):
+                    yield context.filter, statement
+                return
+            labels = [x for x in parsers[i - 1].parse(answers[i]) if x]
+            if options.distinct:
+                labels = list(dict.fromkeys(labels))
+
+            def llm() -> AsyncIterator[Statement]:
+                return self._to_statements(
+                    self._disambiguate(labels[:limit], context))
+
+            # Batched answers are validated (or merged with the target
+            # store) just like those of a single filter.
+            statements = self._afilter_checked(context.filter, options, llm)
+            async with aclosing(statements):
+                async for statement in statements:
+                    yield context.filter, statement
+
+        async for result in amerge(
+            [split(i, context) for i, context in enumerate(batch, 1)]
+        ):
+            yield result
+
+    def _get_batch_chain(self, limit: Optional[int]) -> Runnable:
+        """Gets the chain of a batched (numbered) prompt."""
+        from langchain_core.output_parsers import StrOutputParser
+
+        key = (
+            'batch',
+            limit,
+            bool(self.textual_context),
+            self.enforce_context,
+        )
+        chain = self._pipeline_chains.get(key)
+        if chain is None:
+            chain = (
+                self._build_prompt_template(BATCH_OUTPUT_FORMAT_INSTRUCTION)
+                | self._get_model_runnable(limit=limit)
+                | StrOutputParser()
+            )
+            self._pipeline_chains[key] = chain
+        return chain
+
+    #: Maximum number of paginated filters whose answers are kept.
+    _max_page_states: ClassVar[int] = 256
+
+    #: Maximum number of continuation prompts per page.
+    _max_page_rounds: ClassVar[int] = 3
+
+    def filter_page(
+        self,
+        subject: Optional[Any] = None,
+        property: Optional[Any] = None,
+        value: Optional[Any] = None,
+        page_size: int = 10,
+        cursor: Optional[PageCursor] = None,
+        filter: Optional[Filter] = None,
+    ) -> Page:
+        """Gets a page of the statements matching a filter.
+
+        See :meth:`afilter_page`.
+        """
+        return default_event_loop.run(self.afilter_page(
+            subject, property, value, page_size, cursor, filter))
+
+    async def afilter_page(
+        self,
+        subject: Optional[Any] = None,
+        property: Optional[Any] = None,
+        value: Optional[Any] = None,
+        page_size: int = 10,
+        cursor: Optional[PageCursor] = None,
+        filter: Optional[Filter] = None,
+    ) -> Page:
+        """Gets a page of the statements matching a filter.
+
+        The first page is requested by filter; the next ones by the cursor
+        of the previous page.  The answers already generated for a filter
+        are kept, so earlier pages are served without calling the model,
+        and further pages are generated by continuation prompts that ask
+        for answers other than the ones already given.
+
+        Parameters:
+           subject: Entity.
+           property: Property.
+           value: Value.
+           page_size: Maximum number of statements per page.
+           cursor: Cursor of the page (returned with the previous page).
+           filter: Filter.
+
+        Returns:
+           The page and the cursor of the next one.
+        """
+        assert page_size > 0
+        offset = 0
+        if cursor is not None:
+            filter, offset = cursor.filter, cursor.offset
+        else:
+            filter = self._check_filter(subject, property, value, filter=filter)
+
+        state = self._page_states.get(filter)
+        if state is None:
+            state = self._page_states[filter] = _PageState()
+            while len(self._page_states) > self._max_page_states:
+                self._page_states.popitem(last=False)
+        else:
+            self._page_states.move_to_end(filter)
+
+        async with state.lock:
+            # A model that keeps giving labels that yield no statements
+            # (unlinkable or rejected ones) gets at most `_max_page_rounds`
+            # prompts per page, and is deemed exhausted if the last one
+            # yields nothing.
+            for _ in range(self._max_page_rounds):
+                if (state.exhausted
+                        or len(state.statements) >= offset + page_size):
+                    break
+                count = len(state.statements)
+                await self._anext_page(filter, state, page_size)
+            else:
+                if len(state.statements) == count:
+                    state.exhausted = True
+
+        statements = state.statements[offset:offset + page_size]
+        end = offset + len(statements)
+        next = None
+        if end < len(state.statements) or not state.exhausted:
+            next = PageCursor(filter, end)
+        return Page(statements, next)
+
+    def reset_pages(self, filter: Optional[Filter] = None) -> None:
+        """Forgets the answers kept for paginated filters.
+
+        Parameters:
+           filter: Filter; if ``None``, forgets every filter.
+        """
+        if filter is None:
+            self._page_states.clear()
+        else:
+            self._page_states.pop(filter, None)
+
+    async def _anext_page(
+        self, filter: Filter, state: _PageState, page_size: int
+    ) -> None:
+        """Generates up to `page_size` new answers for `filter`."""
+        context = self._create_filter_context(filter, self.options)
+        if context.filter_type != KIF_FilterTypes.ONE_VARIABLE:
+            # Only gap-filling prompts can be continued.
+            if not state.statements:
+                state.statements = [
+                    stmt async for stmt in self._afilter(filter, self.options)]
+            state.exhausted = True
+            return
+
+        query = context.query
+        if state.labels:
+            query += CONTINUATION_INSTRUCTION.format(
+                answers='; '.join(state.labels))
+        labels = await self._get_page_chain(context, page_size).ainvoke({
+            'query': query,
+            'textual_context': self.textual_context,
+        })
+        seen = {str(label).lower() for label in state.labels}
+        labels = [
+            label for label in dict.fromkeys(labels)
+            if label and str(label).lower() not in seen]
+        if not labels:
+            state.exhausted = True
+            return
+        state.labels.extend(str(label) for label in labels)
+
+        def llm() -> AsyncIterator[Statement]:
+            return self._to_statements(self._disambiguate(labels, context))
+
+        # Page answers are validated (or merged with the target store) just
+        # like those of a plain filter.
+        known = set(state.statements)
+        statements = self._afilter_checked(filter, self.options, llm)
+        async with aclosing(statements):
+            async for statement in statements:
+                if statement not in known:
+                    known.add(statement)
+                    state.statements.append(statement)
+
+    def _get_page_chain(
+        self, context: '_FilterContext', page_size: int
+    ) -> Runnable:
+        """Gets the chain that generates the labels of a page."""
+        key = (
+            'page',
+            type(context.parser),
+            page_size,
+            bool(self.textual_context),
+            self.enforce_context,
+        )
+        chain = self._pipeline_chains.get(key)
+        if chain is None:
+            json_mode = isinstance(context.parser, JsonListOutputParser)
+            chain = (
+                self._build_prompt_template(
+                    context.output_format_prompt,
+                    limit=page_size,
+                    closing_instruction=(
+                        FAST_PATH_CLOSING_INSTRUCTION if json_mode
+                        else DEFAULT_AVOID_EXPLANATION_INSTRUCTION),
                 )
+                | self._get_model_runnable(
+                    limit=page_size, json_mode=json_mode)
+                | context.parser
+            )
+            self._pipeline_chains[key] = chain
+        return chain
 
-            chain = self._create_pipline_chain(distinct=options.distinct, limit=options.limit or 10)
+    @override
+    def _ask(self, filter: Filter, options: TOptions) -> bool:
+        return default_event_loop.run(self._aask(filter, options))
 
+    @override
+    async def _aask(self, filter: Filter, options: TOptions) -> bool:
+        # Fully bound filters are checked with a single yes/no completion;
+        # anything else falls back to looking for one statement.
+        sentence = self._get_ask_sentence(filter, options)
+        if sentence is None:
+            return await super()._aask(filter, options)
+        if self._hybrid_policy is not None:
             try:
-                async for statement in await chain.ainvoke(
-                    {
-                        'query': query,
-                        'textual_context': self.textual_context,
-                        'examples': self.examples,
-                    }
-                ):
-                    yield statement
+                if await asyncio.wait_for(
+                        self._target_store.aask(filter=filter),
+                        self._hybrid_timeout):
+                    self._hybrid_stats.kb_answered += 1
+                    return True
+            except asyncio.TimeoutError:
+                LOG.info(f'Target store timed out on `{filter}`')
+                self._hybrid_stats.kb_timeouts += 1
             except Exception as e:
-                raise e
+                LOG.info(f'Target store failed on `{filter}`: {e}')
+                self._hybrid_stats.kb_errors += 1
+            self._hybrid_stats.llm_called += 1
+        chain = self._get_fast_path_chain('ask')
+        answer = await chain.ainvoke({
+            'query': ASK_PROMPT_TASK + sentence,
+            'textual_context': self.textual_context,
+        })
+        if not answer.strip().strip('`\'"*.').lower().startswith('yes'):
+            return False
+        if self._validation is None:
+            return True
+        # The asked statement is validated like any statement produced by
+        # the LLM, so ask agrees with filter.
+        statement = Statement(
+            filter.subject.value,
+            ValueSnak(filter.property.value, filter.value.value))
+        statements = self._afilter_validated(
+            filter, options, lambda: aiter_from([statement]))
+        async with aclosing(statements):
+            async for _ in statements:
+                return True
+        return False
+
+    @override
+    def _count(self, filter: Filter, options: TOptions) -> int:
+        return default_event_loop.run(self._acount(filter, options))
+
+    @override
+    async def _acount(self, filter: Filter, options: TOptions) -> int:
+        # One-variable filters ask for the number of answers directly;
+        # anything else (or an unparsable answer) falls back to counting
+        # the statements of the full pipeline.  In hybrid and validation
+        # modes, the count is that of the merged or validated statements.
+        if self._hybrid_policy is not None or self._validation is not None:
+            return await super()._acount(filter, options)
+        context = self._get_count_context(filter, options)
+        if context is not None:
+            chain = self._get_fast_path_chain('count')
+            answer = await chain.ainvoke({
+                'query': context.query,
+                'textual_context': self.textual_context,
+            })
+            match = re.search(r'\d[\d,]*', answer)
+            if match:
+                return int(match.group(0).replace(',', ''))
+            LOG.info(f'Could not parse count `{answer}`; falling back')
+        return await super()._acount(filter, options)
+
+    def _get_ask_sentence(
+        self, filter: Filter, options: TOptions
+    ) -> Optional[str]:
+        s, p, v = filter.subject, filter.property, filter.value
+        if not (
+            isinstance(s, ValueFingerprint)
+            and isinstance(p, ValueFingerprint)
+            and isinstance(v, ValueFingerprint)
+            and isinstance(v.value, Entity)
+        ):
+            return None
+        try:
+            return self._compile_filter(filter, options).task_sentence_template
+        except Exception as e:
+            LOG.info(f'Could not compile `{filter}` for ask: {e}')
+            return None
+
+    def _get_count_context(
+        self, filter: Filter, options: TOptions
+    ) -> Optional['_FilterContext']:
+        if any(isinstance(fp, OrFingerprint)
+               for fp in (filter.subject, filter.property, filter.value)):
+            return None
+        try:
+            context = self._create_filter_context(filter, options)
+        except Exception as e:
+            LOG.info(f'Could not compile `{filter}` for count: {e}')
+            return None
+        if context.filter_type != KIF_FilterTypes.ONE_VARIABLE or sum(
+                isinstance(x, Variable) for x in context.binds.values()) != 1:
+            return None
+        return context
+
+    def _get_fast_path_chain(self, kind: str) -> Runnable:
+        """Gets the chain of the `ask` or `count` fast path."""
+        from langchain_core.output_parsers import StrOutputParser
+
+        key = (
+            kind,
+            bool(self.textual_context),
+            self.enforce_context,
+        )
+        chain = self._pipeline_chains.get(key)
+        if chain is None:
+            output_format_prompt = (
+                ASK_OUTPUT_FORMAT_INSTRUCTION if kind == 'ask'
+                else COUNT_OUTPUT_FORMAT_INSTRUCTION)
+            chain = (
+                self._build_prompt_template(
+                    output_format_prompt,
+                    closing_instruction=FAST_PATH_CLOSING_INSTRUCTION)
+                | self._get_model_runnable(
+                    max_tokens=self._fast_path_max_tokens)
+                | StrOutputParser()
+            )
+            self._pipeline_chains[key] = chain
+        return chain
+
+    def _create_filter_context(
+        self, filter: Filter, options: TOptions
+    ) -> '_FilterContext':
+        p = filter.property
+        parser: BaseOutputParser = SemicolonSeparatedListOutputParser()
+
+        # TODO create conditions for each datatype different from Item,
+        # such as TimeDatatype
+        if isinstance(p, ValueFingerprint):
+            if isinstance(p[0].range, QuantityDatatype):
+                parser = SemicolonSeparatedListOfNumbersOutputParser()
+            elif isinstance(p[0].range, TimeDatatype):
+                parser = SemicolonSeparatedListOfDateTimeOutputParser()
+
+        if self.output_mode == OutputMode.JSON:
+            if isinstance(parser, SemicolonSeparatedListOfNumbersOutputParser):
+                parser = JsonListOfNumbersOutputParser()
+            elif type(parser) is SemicolonSeparatedListOutputParser:
+                parser = JsonListOutputParser()
+
+        compiled = self._compile_filter(filter, options)
+        query = compiled.query_template
+
+        if self.examples:
+            pass
+
+        if compiled.filter_type == KIF_FilterTypes.ONE_VARIABLE:
+            replacement = '_'
+            if compiled.has_where:
+                replacement = 'X'
+            query = compiled.query_template.replace('var1', replacement)
+
+        return _FilterContext(filter, options, parser, compiled, query)
 
     #: Flags to be passed to filter compiler.
     _compile_filter_flags: ClassVar[LLM_FilterCompiler.Flags] = (
         LLM_FilterCompiler.default_flags
     )
 
+    #: Compiled filters shared by all LLM Store instances.
+    _compile_filter_cache: ClassVar[LLM_CompiledFilterCache] = (
+        LLM_CompiledFilterCache()
+    )
+
     def _compile_filter(
         self, filter: Filter, options: TOptions
-    ) -> LLM_FilterCompiler:
-        compiler = LLM_FilterCompiler(filter, self._target_store, self._compile_filter_flags)
+    ) -> LLM_CompiledFilter:
+        return self._compile_filter_cache.compile(
+            filter,
+            self._target_store,
+            self._compile_filter_flags,
+            self.task_prompt_template,
+        )
 
-        compiler.compile(self.task_prompt_template)
-        return compiler
+    def _get_pipeline_chain(
+        self,
+        context: '_FilterContext',
+        limit=10,
+        distinct=True,
+    ) -> Runnable:
+        """Gets the pipeline chain for `context`, building it on first use.
+
+        Chains do not depend on the filter itself (the request context is
+        passed along with the chain input), so they are built once per
+        parser type, distinct/limit options, prompt mode and debug mode and
+        then reused.
+        """
+        debug = LOG.isEnabledFor(logging.INFO)
+        key = (
+            type(context.parser),
+            bool(distinct),
+            limit,
+            bool(self.textual_context),
+            self.enforce_context,
+            bool(self.examples),
+            self.compile_to_natural_language_question,
+            self.streaming,
+            debug,
+        )
+        chain = self._pipeline_chains.get(key)
+        if chain is None:
+            chain = self._create_pipline_chain(
+                context, limit=limit, distinct=distinct, debug=debug)
+            self._pipeline_chains[key] = chain
+        return chain
 
     def _create_pipline_chain(
-        self, limit = 10, distinct=True
-    ) -> RunnableSequence:
-        from langchain_core.runnables import RunnableLambda
+        self,
+        context: '_FilterContext',
+        limit=10,
+        distinct=True,
+        debug=False,
+    ) -> Runnable:
+        from langchain_core.runnables import (
+            RunnableLambda,
+            RunnablePassthrough,
+        )
 
         def distinct_fn(labels: List[str]) -> List[str]:
+            # Blank labels (e.g., after a trailing semicolon) are not linked.
+            labels = [label for label in labels if not _is_blank(label)]
             if distinct:
-                labels = list(set(labels))
+                labels = list(dict.fromkeys(labels))
             return labels[:limit]
 
-        debug_chain = RunnableLambda(lambda entry: (LOG.info(entry), entry)[1])
-
-        prompt = self._build_prompt_template()
-
-        do_distinct = RunnableLambda(distinct_fn)
-
-        disambiguate = RunnableLambda(
-            lambda labels: self._disambiguate(labels)
+        def pipe(*steps: Any) -> Runnable:
+            # Debug stages are only added when they would log something.
+            if debug:
+                debug_chain = RunnableLambda(
+                    lambda entry: (LOG.info(entry), entry)[1])
+                steps = tuple(
+                    x for step in steps for x in (step, debug_chain))
+            chain = steps[0]
+            for step in steps[1:]:
+                chain = chain | step
+            return chain
+
+        json_mode = isinstance(context.parser, JsonListOutputParser)
+        prompt = self._build_prompt_template(
+            context.output_format_prompt,
+            limit=limit,
+            closing_instruction=(
+                FAST_PATH_CLOSING_INSTRUCTION if json_mode
+                else DEFAULT_AVOID_EXPLANATION_INSTRUCTION),
         )
 
-        to_statements = RunnableLambda(
-            lambda binds: self._to_statements(binds)
-        )
+        chain: Runnable
+        if self.streaming:
+            # Labels are pulled from the parser as soon as their delimiter
+            # is generated, so linking starts while the model is still
+            # answering.  Once `limit` statements are produced the whole
+            # stream is closed, which cancels the in-flight generation.
+            labels_chain = pipe(
+                prompt,
+                self._get_model_runnable(
+                    streaming=True, limit=limit, json_mode=json_mode),
+                context.parser,
+            )
 
-        chain: RunnableSequence = (
-            prompt
-            | debug_chain
-            | self.model
-            | debug_chain
-            | self.parser
-            | debug_chain
-            | do_distinct
-            | debug_chain
-            | disambiguate
-            | debug_chain
-            | to_statements
-            | debug_chain
-        )
+            async def stream_statements(entry: Dict[str, Any]) -> Any:
+                labels = atake(
+                    self._aflatten(labels_chain.astream(entry)),
+                    None, distinct=distinct)
+                return atake(
+                    self._to_statements(
+                        self._disambiguate(labels, entry['context'])),
+                    limit, distinct=distinct)
+
+            chain = RunnableLambda(stream_statements)
+        else:
+            async def to_statements(entry: Dict[str, Any]) -> Any:
+                return self._to_statements(
+                    self._disambiguate(entry['labels'], entry['context']))
+
+            chain = RunnablePassthrough.assign(
+                labels=pipe(
+                    prompt,
+                    self._get_model_runnable(
+                        limit=limit, json_mode=json_mode),
+                    context.parser,
+                    RunnableLambda(distinct_fn),
+                )
+            ) | RunnableLambda(to_statements)
 
         if self.compile_to_natural_language_question:
-            from ..llm.query_to_question import QueryToQuestion
+            from .query_to_question import QueryToQuestion
 
             q2q = QueryToQuestion(model=self.model)
 
-            chain = (
-                RunnableLambda(lambda query: q2q.run(query))
-                | debug_chain
-                | RunnableLambda(
-                    lambda question: {
-                        'query': question,
-                        'textual_context': self.textual_context,
-                        'examples': self.examples,
-                    }
-                )
+            chain = pipe(
+                RunnablePassthrough.assign(
+                    query=lambda entry: q2q.run(entry['query'])),
             ) | chain
 
         return chain
 
+    @staticmethod
+    async def _aflatten(
+        parts: AsyncIterator[List[Any]]
+    ) -> AsyncIterator[Any]:
+        """Flattens streamed parser output into labels."""
+        async with aclosing(parts):
+            async for part in parts:
+                for label in part:
+                    yield label
+
+    #: Generation budget (in tokens) per requested answer; ``None`` disables
+    #: bounding the model's max tokens by the filter limit.
+    _max_tokens_per_answer: ClassVar[Optional[int]] = 16
+
+    #: Largest filter limit passed on to the model.  Larger limits (such as
+    #: KIF's ``max_limit``, used by the count and contains fallbacks) are
+    #: treated as no limit.
+    _max_model_limit: ClassVar[int] = 1000
+
+    #: Limit used when the filter has none.
+    _default_model_limit: ClassVar[int] = 10
+
+    def get_effective_limit(self, limit: Optional[int]) -> Optional[int]:
+        """Gets the maximum number of statements produced for a filter.
+
+        Parameters:
+           limit: Limit of the filter.
+
+        Returns:
+           `limit` or, if it is not set, the default number of answers
+           requested from the model.
+        """
+        return limit if limit else self._default_model_limit
+
+    def _get_model_limit(self, limit: Optional[int]) -> Optional[int]:
+        """Gets the number of answers to request from the model.
+
+        Returns the default limit if `limit` is not set, and ``None`` (no
+        limit in the prompt and no max tokens bound) if `limit` exceeds
+        `_max_model_limit`.
+        """
+        if not limit:
+            return self._default_model_limit
+        if limit > self._max_model_limit:
+            return None
+        return limit
+
+    def _get_model_runnable(
+        self,
+        streaming: bool = False,
+        limit: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        json_mode: bool = False,
+    ) -> Runnable:
+        """Gets the model stage of the pipeline.
+
+        If `limit` is given, the model generates at most
+        `_max_tokens_per_answer` tokens per expected answer (or at most
+        `max_tokens`, if given).  If a response
+        cache is set, the model is wrapped so that prompts already answered
+        are served from the cache.  If `streaming` is set, the wrapper
+        streams response chunks (cached responses are replayed as a single
+        chunk).  If `json_mode` is set, the provider's JSON mode is enabled
+        when supported.  Model calls are admitted by the kbel governor of the
+        model's provider and identifier.
+        """
+        model = self.model
+        if json_mode:
+            model = with_json_mode(model)
+        if max_tokens:
+            model = with_max_tokens(model, max_tokens)
+        elif limit and self._max_tokens_per_answer:
+            model = with_max_tokens(
+                model, (limit + 1) * self._max_tokens_per_answer)
+
+        # Calls go through the process-wide governor of the model, while
+        # cache keys are computed from the model itself.
+        call_model = governed(model)
+
+        cache = self.response_cache
+        if cache is None:
+            return call_model
+
+        from langchain_core.messages import AIMessage, AIMessageChunk
+        from langchain_core.prompt_values import PromptValue
+        from langchain_core.runnables import RunnableGenerator, RunnableLambda
+
+        if streaming:
+            def transform(
+                prompts: Iterator[PromptValue]
+            ) -> Iterator[BaseMessage]:
+                for prompt in prompts:
+                    key = cache.make_key(model, prompt.to_messages())
+                    content = cache.lookup(key)
+                    if content is not None:
+                        yield AIMessageChunk(content=content)
+                        continue
+                    content, truncated = '', False
+                    for chunk in call_model.stream(prompt):
+                        if isinstance(chunk.content, str):
+                            content += chunk.content
+                        truncated = truncated or _is_truncated(chunk)
+                        yield chunk
+                    if not truncated:
+                        cache.update(key, content)
+
+            async def atransform(
+                prompts: AsyncIterator[PromptValue]
+            ) -> AsyncIterator[BaseMessage]:
+                async for prompt in prompts:
+                    key = cache.make_key(model, prompt.to_messages())
+                    content = await cache.alookup(key)
+                    if content is not None:
+                        yield AIMessageChunk(content=content)
+                        continue
+                    content, truncated = '', False
+                    async for chunk in call_model.astream(prompt):
+                        if isinstance(chunk.content, str):
+                            content += chunk.content
+                        truncated = truncated or _is_truncated(chunk)
+                        yield chunk
+                    # Only complete responses are cached: a cached response
+                    # loses its finish reason, which tells the parser to
+                    # drop a truncated last answer.
+                    if not truncated:
+                        await cache.aupdate(key, content)
+
+            return RunnableGenerator(
+                transform, atransform, name='cached_model')
+
+        def invoke(prompt: PromptValue) -> BaseMessage:
+            key = cache.make_key(model, prompt.to_messages())
+            content = cache.lookup(key)
+            if content is not None:
+                return AIMessage(content=content)
+            message = call_model.invoke(prompt)
+            if (isinstance(message.content, str)
+                    and not _is_truncated(message)):
+                cache.update(key, message.content)
+            return message
+
+        async def ainvoke(prompt: PromptValue) -> BaseMessage:
+            key = cache.make_key(model, prompt.to_messages())
+            content = await cache.alookup(key)
+            if content is not None:
+                return AIMessage(content=content)
+            message = await call_model.ainvoke(prompt)
+            if (isinstance(message.content, str)
+                    and not _is_truncated(message)):
+                await cache.aupdate(key, message.content)
+            return message
+
+        return RunnableLambda(invoke, afunc=ainvoke, name='cached_model')
+
     async def _disambiguate(
-        self, labels: List[str]
+        self,
+        labels: Union[Iterable[str], AsyncIterable[str]],
+        context: '_FilterContext',
     ) -> AsyncIterator[Dict[str, Any]]:
         """
         Asynchronously disambiguates labels.
-        """
-        binds = self._compiler.get_binds()
-
-        from kbel.disambiguators import (
-            Disambiguator,
-            SimpleDisambiguator,
-            LLM_Disambiguator,
-        )
 
-        disambiguator: Disambiguator = Disambiguator('simple')
-        if self.entity_linking_method == EntityLinkingMethod.LLM:
-            if (
-                self._compiler.get_filter_type()
-                == KIF_FilterTypes.ONE_VARIABLE
-            ):
-                sentence = self._compiler.get_task_sentence_template().replace(
-                    'var1', '{{term}}'
-                )
-                disambiguator = Disambiguator('llm', model=self._model_for_entity_resolution)
-                disambiguator.disambiguate_property(label, searcher=self.searcher, sentence=sentence)
-
-        if isinstance(binds['property'], Variable):
-            async for _, entity in disambiguator.disambiguate_property(
-                labels, cls=Property
-            ):  # noqa: E501
-                binds['property'].set_value(entity)
-                yield binds
-        else:
-            if isinstance(binds['value'], Variable):
+        Yields a fresh bind dictionary per linked label; the compiled binds
+        are never mutated.  `labels` may be an async iterable, in which case
+        each label is linked as soon as it arrives.  Labels are linked
+        concurrently (up to `disambiguation_concurrency` at a time) and
+        yielded in completion order, or in label order if
+        `ordered_disambiguation` is set.
+        """
+        binds = context.binds
+        disambiguator = self._get_disambiguator()
+
+        def sentence_for(label: str) -> Optional[str]:
+            if context.filter_type != KIF_FilterTypes.ONE_VARIABLE:
+                return None
+            return context.compiled.task_sentence_template.replace(
+                'var1', str(label))
+
+        async def link(label: str, cls: type) -> Optional[Entity]:
+            kwargs: Dict[str, Any] = {}
+            sentence = sentence_for(label)
+            if sentence:
+                kwargs['sentence'] = sentence
+            if self.textual_context:
+                kwargs['textual_context'] = self.textual_context
+            cache = self.linking_cache
+            try:
+                if cache is not None:
+                    # Memory hits are served inline; disk accesses and
+                    # misses go to a thread.
+                    key = cache.make_key(
+                        label, cls, self.searcher,
+                        disambiguator.context_fingerprint(**kwargs))
+                    results = await cache.alookup(key)
+                    if results is None:
+                        results = await asyncio.to_thread(
+                            disambiguator.disambiguate_property
+                            if cls is Property
+                            else disambiguator.disambiguate_item,
+                            label, self.searcher, **kwargs)
+                        await cache.aupdate(key, results)
+                elif cls is Property:
+                    results = await asyncio.to_thread(
+                        disambiguator.disambiguate_property,
+                        label, self.searcher, **kwargs)
+                else:
+                    results = await asyncio.to_thread(
+                        disambiguator.disambiguate_item,
+                        label, self.searcher, **kwargs)
+            except Exception as e:
+                LOG.info(f'Could not disambiguate label `{label}`: {e}')
+                return None
+            return results[0][2] if results else None
+
+        async def resolve(label: str) -> Optional[Dict[str, Any]]:
+            if isinstance(binds['property'], Variable):
+                entity = await link(label, Property)
+                if entity:
+                    return {**binds, 'property': entity}
+            elif isinstance(binds['value'], Variable):
                 p: Property = binds['property']
 
                 if (
@@ -625,33 +1958,53 @@ class LLM_Store(
                     or isinstance(p.range, StringDatatype)
                     or isinstance(p.range, TextDatatype)
                 ):
-                    for label in labels:
-                        binds['value'].set_value(label)
-                        yield binds
-                else:
-                    async for (
-                        label,
-                        entity,
-                    ) in disambiguator.adisambiguate(
-                        labels
-                    ):  # noqa: E501
-                        if not entity and self.create_entity:
-                            entity = self._create_new_item(label)
-                        if isinstance(binds['value'], Variable):
-                            binds['value'].set_value(entity)
-                        yield binds
+                    return {**binds, 'value': label}
+                entity = await link(label, Item)
+                if not entity and self.create_entity:
+                    entity = self._create_new_item(label)
+                if entity:
+                    return {**binds, 'value': entity}
             else:
-                async for _, entity in disambiguator.adisambiguate(
-                    labels
-                ):  # noqa: E501
-                    if isinstance(binds['subject'], Variable):
-                        binds['subject'].set_value(entity)
-                    yield binds
+                entity = await link(label, Item)
+                if entity and isinstance(binds['subject'], Variable):
+                    return {**binds, 'subject': entity}
+            return None
+
+        async for bind in amap(
+            resolve,
+            labels,
+            max_concurrency=self.disambiguation_concurrency,
+            ordered=self.ordered_disambiguation,
+        ):
+            if bind is not None:
+                yield bind
+
+    def _get_disambiguator(self) -> 'Disambiguator':
+        from kbel.disambiguators import Disambiguator
+
+        if self._disambiguator is None:
+            if self.entity_linking_method == EntityLinkingMethod.LLM:
+                import kbel.disambiguators.llm  # noqa: F401
+                self._disambiguator = Disambiguator(
+                    'llm', model=self._model_for_entity_resolution)
+            elif self.entity_linking_method == EntityLinkingMethod.SIM:
+                import kbel.disambiguators.similarity  # noqa: F401
+                self._disambiguator = Disambiguator('sim')
+            else:
+                import kbel.disambiguators.simple  # noqa: F401
+                self._disambiguator = Disambiguator('simple')
+        return self._disambiguator
 
     async def _to_statements(
         self, binds: Dict[str, Any]
     ) -> AsyncIterator[Statement]:
+        async with aclosing(binds):
+            async for statement in self._abinds_to_statements(binds):
+                yield statement
 
+    async def _abinds_to_statements(
+        self, binds: AsyncIterable[Dict[str, Any]]
+    ) -> AsyncIterator[Statement]:
         async for bind in binds:
 
             def get_entity(key: str):
@@ -727,7 +2080,12 @@ class LLM_Store(
     ) -> Iterator[Statement]:
         self._searcher
 
-    def _build_prompt_template(self) -> ChatPromptTemplate:
+    def _build_prompt_template(
+        self,
+        output_format_prompt: Optional[str] = None,
+        limit: Optional[int] = None,
+        closing_instruction: str = DEFAULT_AVOID_EXPLANATION_INSTRUCTION,
+    ) -> ChatPromptTemplate:
         from langchain_core.messages import SystemMessage
 
         system = DEFAULT_SYSTEM_PROMPT_INSTRUCTION
@@ -742,7 +2100,11 @@ class LLM_Store(
             if self.enforce_context:
                 system = SYSTEM_PROMPT_INSTRUCTION_WITH_ENFORCED_CONTEXT
 
-        system += f' {self.output_format_prompt} {DEFAULT_AVOID_EXPLANATION_INSTRUCTION}'  # noqa E501
+        output_format_prompt = output_format_prompt or self.output_format_prompt
+        system += f' {output_format_prompt}'
+        if limit:
+            system += ' ' + LIMIT_INSTRUCTION.format(limit=limit)
+        system += f' {closing_instruction}'
 
         if self.examples:
             human += 'TASK:\n{formatted_examples}'
@@ -2,7 +2,9 @@ import datetime
 
 from decimal import Decimal
 from kif_lib.typing import override
-from typing import List
+from typing import AsyncIterator, Iterator, List, Union
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, Generation
 from langchain_core.output_parsers import (
     BaseOutputParser,
     CommaSeparatedListOutputParser,
@@ -14,8 +16,90 @@ from langchain_core.output_parsers import (
     PydanticOutputParser,
 )
 
+from kbel.parsing import loads_tolerant
+
+
+def _chunk_text(chunk: Union[str, BaseMessage]) -> str:
+    if isinstance(chunk, BaseMessage):
+        return chunk.content if isinstance(chunk.content, str) else ''
+    return chunk
+
+
+def _is_blank(part: object) -> bool:
+    return isinstance(part, str) and not part.strip()
+
+
+#: Finish reasons of a response cut off by the token budget.
+_TRUNCATED_FINISH_REASONS = frozenset(('length', 'max_tokens'))
+
+
+def _is_truncated(chunk: Union[str, BaseMessage]) -> bool:
+    '''Tests whether a response (or its last chunk) was cut off by the
+    token budget, as reported by the provider's finish reason.'''
+    if not isinstance(chunk, BaseMessage):
+        return False
+    metadata = chunk.response_metadata or {}
+    for key in ('finish_reason', 'done_reason', 'stop_reason'):
+        if metadata.get(key) in _TRUNCATED_FINISH_REASONS:
+            return True
+    return False
+
 
 class SemicolonSeparatedListOutputParser(CommaSeparatedListOutputParser):
+    '''Parses a semicolon-separated list.
+
+    When streamed, each non-blank part is emitted (as a one-element list)
+    as soon as its closing semicolon arrives, instead of after the whole
+    response.
+    If the response was cut off by the token budget, its last (partial)
+    part is dropped.
+    '''
+
+    @override
+    def parse_result(
+        self, result: List[Generation], *, partial: bool = False
+    ) -> List:
+        text = result[0].text
+        if (isinstance(result[0], ChatGeneration)
+                and _is_truncated(result[0].message)):
+            text = text.rsplit(';', 1)[0] if ';' in text else ''
+        return self.parse(text)
+
+    @override
+    def _transform(
+        self, input: Iterator[Union[str, BaseMessage]]
+    ) -> Iterator[List]:
+        buffer, truncated = '', False
+        for chunk in input:
+            buffer += _chunk_text(chunk)
+            truncated = truncated or _is_truncated(chunk)
+            *segments, buffer = buffer.split(';')
+            for segment in segments:
+                for part in self.parse(segment):
+                    if not _is_blank(part):
+                        yield [part]
+        if not truncated:
+            for part in self.parse(buffer):
+                if not _is_blank(part):
+                    yield [part]
+
+    @override
+    async def _atransform(
+        self, input: AsyncIterator[Union[str, BaseMessage]]
+    ) -> AsyncIterator[List]:
+        buffer, truncated = '', False
+        async for chunk in input:
+            buffer += _chunk_text(chunk)
+            truncated = truncated or _is_truncated(chunk)
+            *segments, buffer = buffer.split(';')
+            for segment in segments:
+                for part in self.parse(segment):
+                    if not _is_blank(part):
+                        yield [part]
+        if not truncated:
+            for part in self.parse(buffer):
+                if not _is_blank(part):
+                    yield [part]
 
     @override
     def parse(self, text: str) -> List[str]:
@@ -141,12 +225,67 @@ class SemicolonSeparatedListOfDateTimeOutputParser(
         return '...'
 
 
+class JsonListOutputParser(BaseOutputParser[List[str]]):
+    '''Parses a JSON list of answers, eg: `{"answers": ["foo", "bar"]}`.
+
+    Malformed or truncated JSON is repaired; if that fails, the response is
+    parsed as a semicolon-separated list.  Outcomes are counted under
+    ``llm_store.json`` (see :func:`kbel.parsing.parse_stats`).
+    '''
+
+    @property
+    def _type(self) -> str:
+        return 'json_list'
+
+    @override
+    def parse(self, text: str) -> List[str]:
+        try:
+            value = loads_tolerant(text, 'llm_store.json')
+        except ValueError:
+            return SemicolonSeparatedListOutputParser().parse(text)
+        if isinstance(value, dict):
+            value = value.get('answers', next(iter(value.values()), []))
+        if not isinstance(value, list):
+            value = [value]
+        return [
+            str(x).strip() for x in value
+            if x is not None and str(x).strip()]
+
+    @override
+    def get_format_instructions(self) -> str:
+        return (
+            'Your response should be a JSON object with a list of noun '
+            'phrases, eg: `{"answers": ["foo", "bar", "baz"]}`, or '
+            '`{"answers": []}` if there is no answer.'
+        )
+
+
+class JsonListOfNumbersOutputParser(JsonListOutputParser):
+    '''Parses a JSON list of numbers, eg: `{"answers": [1000000, 2.5]}`.'''
+
+    @override
+    def parse(self, text: str) -> List[Decimal]:  # type: ignore
+        return SemicolonSeparatedListOfNumbersOutputParser().parse(
+            ';'.join(super().parse(text)))
+
+    @override
+    def get_format_instructions(self) -> str:
+        return (
+            'Your response should be a JSON object with a list of numbers, '
+            'eg: `{"answers": [1000000, 2.5]}`, or `{"answers": []}` if '
+            'there is no answer. Provide numeric values as complete numerals '
+            'without abbreviations (e.g., 1 million as 1000000).'
+        )
+
+
 __all__ = (
     'BaseOutputParser',
     'CommaSeparatedListOutputParser',
     'SemicolonSeparatedListOutputParser',
     'SemicolonSeparatedListOfNumbersOutputParser',
     'SemicolonSeparatedListOfDateTimeOutputParser',
+    'JsonListOutputParser',
+    'JsonListOfNumbersOutputParser',
     'StrOutputParser',
     'SimpleJsonOutputParser',
     'MarkdownListOutputParser',
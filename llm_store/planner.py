@@ -0,0 +1,583 @@
+import asyncio
+import dataclasses
+import logging
+import threading
+from collections import OrderedDict
+
+from kif_lib import Context, Entity, Filter, Statement, ValueSnak
+from kif_lib.model.fingerprint import (
+    AndFingerprint,
+    Fingerprint,
+    FullFingerprint,
+    OrFingerprint,
+    SnakFingerprint,
+    ValueFingerprint,
+)
+from kif_lib.typing import (
+    Any,
+    AsyncIterator,
+    Iterator,
+    Optional,
+    Sequence,
+)
+from typing import TYPE_CHECKING
+
+from .event_loop import default_event_loop
+from .utils import amap
+
+if TYPE_CHECKING:
+    from .llm import LLM_Store
+
+LOG = logging.getLogger(__name__)
+
+
+def _fmt(fp: Any) -> str:
+    """Renders a fingerprint (or value) for plan descriptions."""
+    if isinstance(fp, FullFingerprint):
+        return '?'
+    if isinstance(fp, ValueFingerprint):
+        fp = fp.value
+    if isinstance(fp, SnakFingerprint):
+        return f'(? {_fmt(fp.snak.property)} {_fmt(fp.snak.value)})'
+    if isinstance(fp, (AndFingerprint, OrFingerprint)):
+        op = ' and ' if isinstance(fp, AndFingerprint) else ' or '
+        return '(' + op.join(map(_fmt, fp)) + ')'
+    if isinstance(fp, Entity):
+        label = Context.top().get_label(fp, resolve=False)
+        return label.content if label is not None else fp.iri.content
+    return str(fp)
+
+
+def _fmt_filter(filter: Filter) -> str:
+    return ' '.join(map(_fmt, (filter.subject, filter.property, filter.value)))
+
+
+@dataclasses.dataclass(eq=False)
+class PlanNode:
+    """Node of a query plan.
+
+    A node runs once all its `inputs` have run and produces a list of
+    results (statements or entities).
+    """
+
+    #: Position of the node in the plan.
+    id: int
+
+    #: Nodes whose results this node consumes.
+    inputs: Sequence['PlanNode']
+
+    def estimated_calls(self, fanout: int) -> int:
+        """Estimates the number of LLM calls made by this node.
+
+        Parameters:
+           fanout: Expected number of results of a node.
+
+        Returns:
+           Number of calls.
+        """
+        return 0
+
+    def describe(self) -> str:
+        raise NotImplementedError
+
+    async def run(
+        self, executor: '_PlanExecutor', inputs: list[list[Any]]
+    ) -> list[Any]:
+        raise NotImplementedError
+
+
+@dataclasses.dataclass(eq=False)
+class QueryNode(PlanNode):
+    """Evaluates a one-variable filter; produces statements."""
+
+    filter: Filter
+
+    def estimated_calls(self, fanout: int) -> int:
+        return 1
+
+    def describe(self) -> str:
+        return f'query {_fmt_filter(self.filter)}'
+
+    async def run(
+        self, executor: '_PlanExecutor', inputs: list[list[Any]]
+    ) -> list[Any]:
+        return await executor.query(self.filter)
+
+
+@dataclasses.dataclass(eq=False)
+class EntitiesNode(PlanNode):
+    """Finds the subjects of a one-variable filter; produces entities."""
+
+    filter: Filter
+
+    def estimated_calls(self, fanout: int) -> int:
+        return 1
+
+    def describe(self) -> str:
+        return f'entities {_fmt_filter(self.filter)}'
+
+    async def run(
+        self, executor: '_PlanExecutor', inputs: list[list[Any]]
+    ) -> list[Any]:
+        statements = await executor.candidates(self.filter)
+        return list(dict.fromkeys(stmt.subject for stmt in statements))
+
+
+@dataclasses.dataclass(eq=False)
+class ConstantNode(PlanNode):
+    """Produces the given values."""
+
+    values: Sequence[Any]
+
+    def describe(self) -> str:
+        return 'constant ' + ', '.join(map(_fmt, self.values))
+
+    async def run(
+        self, executor: '_PlanExecutor', inputs: list[list[Any]]
+    ) -> list[Any]:
+        return list(self.values)
+
+
+@dataclasses.dataclass(eq=False)
+class BindNode(PlanNode):
+    """Evaluates `template` once per binding of its `slot`.
+
+    The bindings are the values produced by every input of the node except
+    the last `len(keep)` ones (their intersection).  If `keep` is given, the
+    other slot of the statements must be one of the values produced by the
+    `keep` inputs.  Templates fully bound by a binding are asked (one
+    yes/no call each); the others are queried.  Produces statements.
+    """
+
+    template: Filter
+    slot: str
+    keep: int = 0
+
+    def estimated_calls(self, fanout: int) -> int:
+        return fanout
+
+    def describe(self) -> str:
+        keep = ' (filtered)' if self.keep else ''
+        return (
+            f'for each {self.slot} in '
+            + ' & '.join(f'#{node.id}' for node in self.bindings)
+            + f': {_fmt_filter(self.template)}{keep}')
+
+    @property
+    def bindings(self) -> Sequence[PlanNode]:
+        return self.inputs[:len(self.inputs) - self.keep]
+
+    async def run(
+        self, executor: '_PlanExecutor', inputs: list[list[Any]]
+    ) -> list[Any]:
+        bindings = _intersect(inputs[:len(inputs) - self.keep])
+        keep = _intersect(inputs[len(inputs) - self.keep:]) \
+            if self.keep else None
+        other = 'value' if self.slot == 'subject' else 'subject'
+
+        async def evaluate(binding: Any) -> list[Statement]:
+            filter = self.template.replace(**{self.slot: binding})
+            if isinstance(getattr(filter, other), ValueFingerprint):
+                if not await executor.ask(filter):
+                    return []
+                return [Statement(
+                    filter.subject.value,
+                    ValueSnak(filter.property.value, filter.value.value))]
+            statements = await executor.query(filter)
+            if keep is not None:
+                keys = set(keep)
+                statements = [
+                    stmt for stmt in statements
+                    if (stmt.subject if other == 'subject'
+                        else stmt.snak.value) in keys]
+            return statements
+
+        results: list[Any] = []
+        async for statements in amap(
+                evaluate, bindings,
+                max_concurrency=executor.store.subfilter_concurrency,
+                ordered=True):
+            results.extend(statements)
+        return results
+
+
+@dataclasses.dataclass(eq=False)
+class UnionNode(PlanNode):
+    """Produces the (distinct) results of all its inputs."""
+
+    def describe(self) -> str:
+        return 'union ' + ', '.join(f'#{node.id}' for node in self.inputs)
+
+    async def run(
+        self, executor: '_PlanExecutor', inputs: list[list[Any]]
+    ) -> list[Any]:
+        return list(dict.fromkeys(x for results in inputs for x in results))
+
+
+def _intersect(results: Sequence[list[Any]]) -> list[Any]:
+    if not results:
+        return []
+    values = list(dict.fromkeys(results[0]))
+    for other in results[1:]:
+        keys = set(other)
+        values = [x for x in values if x in keys]
+    return values
+
+
+class LLM_QueryPlan:
+    """DAG of one-variable sub-queries that answers a filter.
+
+    The plan can be inspected (:meth:`explain`,
+    :attr:`estimated_calls`) before it is executed.  On execution,
+    independent nodes run concurrently and dependent nodes run as soon as
+    their inputs are available.
+
+    Parameters:
+        filter: Planned filter.
+        nodes: Nodes in topological order; the last one is the root.
+        planner: Planner.
+    """
+
+    __slots__ = ('_filter', '_nodes', '_planner')
+
+    def __init__(
+        self,
+        filter: Filter,
+        nodes: Sequence[PlanNode],
+        planner: 'LLM_QueryPlanner',
+    ) -> None:
+        self._filter = filter
+        self._nodes = tuple(nodes)
+        self._planner = planner
+
+    @property
+    def filter(self) -> Filter:
+        return self._filter
+
+    @property
+    def nodes(self) -> Sequence[PlanNode]:
+        return self._nodes
+
+    @property
+    def root(self) -> PlanNode:
+        return self._nodes[-1]
+
+    @property
+    def estimated_calls(self) -> int:
+        """Estimated number of LLM calls (bindings count as `fanout`)."""
+        fanout = self._planner.fanout
+        return sum(node.estimated_calls(fanout) for node in self._nodes)
+
+    def explain(self) -> str:
+        """Describes the plan, one node per line."""
+        fanout = self._planner.fanout
+        lines = [f'plan {_fmt_filter(self._filter)}']
+        for node in self._nodes:
+            deps = ''
+            if node.inputs:
+                deps = ' <- ' + ', '.join(f'#{x.id}' for x in node.inputs)
+            lines.append(
+                f'  #{node.id} {node.describe()}{deps} '
+                f'[~{node.estimated_calls(fanout)} calls]')
+        lines.append(f'  estimated calls: {self.estimated_calls}')
+        return '\n'.join(lines)
+
+    def __str__(self) -> str:
+        return self.explain()
+
+    def execute(
+        self, limit: Optional[int] = None, distinct: bool = True
+    ) -> Iterator[Statement]:
+        """Executes the plan.
+
+        See :meth:`aexecute`.
+        """
+        return default_event_loop.iterate(self.aexecute(limit, distinct))
+
+    async def aexecute(
+        self, limit: Optional[int] = None, distinct: bool = True
+    ) -> AsyncIterator[Statement]:
+        """Executes the plan.
+
+        Parameters:
+           limit: Maximum number of statements per sub-query (candidate
+             sub-queries are bounded by the planner's `candidate_limit`
+             instead).
+           distinct: Whether to suppress duplicated statements.
+
+        Returns:
+           The statements of the root node.
+        """
+        executor = _PlanExecutor(self._planner, limit, distinct)
+        tasks: dict[PlanNode, asyncio.Task] = {}
+
+        async def run(node: PlanNode) -> list[Any]:
+            inputs = await asyncio.gather(*(tasks[x] for x in node.inputs))
+            LOG.info(f'Running plan node #{node.id}: {node.describe()}')
+            return await node.run(executor, list(inputs))
+
+        try:
+            for node in self._nodes:
+                tasks[node] = asyncio.ensure_future(run(node))
+            statements = await tasks[self.root]
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        for statement in statements:
+            yield statement
+
+
+class _PlanExecutor:
+    """Request-scoped state of a plan execution."""
+
+    __slots__ = ('planner', 'limit', 'distinct')
+
+    def __init__(
+        self,
+        planner: 'LLM_QueryPlanner',
+        limit: Optional[int],
+        distinct: bool,
+    ) -> None:
+        self.planner = planner
+        self.limit = limit
+        self.distinct = distinct
+
+    @property
+    def store(self) -> 'LLM_Store':
+        return self.planner.store
+
+    async def query(self, filter: Filter) -> list[Statement]:
+        return await self._query(filter, self.limit)
+
+    async def candidates(self, filter: Filter) -> list[Statement]:
+        # The limit of the plan bounds its results, not the candidates.
+        return await self._query(filter, self.planner.candidate_limit)
+
+    async def _query(
+        self, filter: Filter, limit: Optional[int]
+    ) -> list[Statement]:
+        key = ('query', filter, limit, self.distinct)
+        cached = self.planner._lookup(key)
+        if cached is not None:
+            return cached
+        statements = [
+            stmt async for stmt in self.store.afilter(
+                filter=filter, limit=limit, distinct=self.distinct)]
+        self.planner._update(key, statements)
+        return statements
+
+    async def ask(self, filter: Filter) -> bool:
+        key = ('ask', filter)
+        cached = self.planner._lookup(key)
+        if cached is not None:
+            return cached
+        answer = await self.store.aask(filter=filter)
+        self.planner._update(key, answer)
+        return answer
+
+
+class LLM_QueryPlanner:
+    """Rewrites compound filters into DAGs of one-variable sub-queries.
+
+    Subjects and values given by snak fingerprints (e.g., ``wd.continent(
+    wd.South_America)``) or by conjunctions of them are resolved by their
+    own sub-queries, whose results are intersected and bound into the main
+    filter.  Disjunctions become unions of independent sub-plans.
+    Intermediate results are cached by the planner, so plans sharing
+    sub-queries do not repeat their LLM calls.
+
+    Parameters:
+        store: LLM Store that evaluates the sub-queries.
+        fanout: Expected number of results of a sub-query, used to estimate
+          the number of calls of a plan.
+        max_cache_size: Maximum number of cached sub-query results.
+        candidate_limit: Maximum number of candidates of a subject or value
+          (the store's default if ``None``); the limit of a plan execution
+          applies to its results only.
+    """
+
+    __slots__ = (
+        '_store',
+        '_fanout',
+        '_max_cache_size',
+        '_candidate_limit',
+        '_cache',
+        '_lock',
+    )
+
+    _store: 'LLM_Store'
+    _fanout: int
+    _max_cache_size: int
+    _candidate_limit: Optional[int]
+    _cache: 'OrderedDict[tuple, Any]'
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        store: 'LLM_Store',
+        fanout: int = 10,
+        max_cache_size: int = 1024,
+        candidate_limit: Optional[int] = None,
+    ) -> None:
+        assert max_cache_size > 0
+        self._store = store
+        self._fanout = fanout
+        self._max_cache_size = max_cache_size
+        self._candidate_limit = candidate_limit
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def store(self) -> 'LLM_Store':
+        return self._store
+
+    @property
+    def fanout(self) -> int:
+        return self._fanout
+
+    @property
+    def candidate_limit(self) -> Optional[int]:
+        return self._candidate_limit
+
+    @staticmethod
+    def needs_planning(filter: Filter) -> bool:
+        """Tests whether `filter` has subjects or values to decompose.
+
+        Parameters:
+           filter: Filter.
+
+        Returns:
+           ``True`` if the subject or value of `filter` is a snak
+           fingerprint or a conjunction.
+        """
+        def test(fp: Fingerprint) -> bool:
+            if isinstance(fp, OrFingerprint):
+                return any(map(test, fp))
+            return isinstance(fp, (SnakFingerprint, AndFingerprint))
+        return test(filter.subject) or test(filter.value)
+
+    def plan(self, filter: Filter) -> LLM_QueryPlan:
+        """Plans the evaluation of a filter.
+
+        Parameters:
+           filter: Filter.
+
+        Returns:
+           Query plan.
+
+        Raises:
+           ValueError: `filter` can not be decomposed into one-variable
+             sub-queries.
+        """
+        filter = filter.normalize()
+        nodes: list[PlanNode] = []
+        self._plan(filter, nodes)
+        return LLM_QueryPlan(filter, nodes, self)
+
+    def clear_cache(self) -> None:
+        """Removes all cached sub-query results."""
+        with self._lock:
+            self._cache.clear()
+
+    def _add(self, nodes: list[PlanNode], cls: type, *args: Any,
+             inputs: Sequence[PlanNode] = (), **kwargs: Any) -> PlanNode:
+        node = cls(len(nodes), tuple(inputs), *args, **kwargs)
+        nodes.append(node)
+        return node
+
+    def _plan(self, filter: Filter, nodes: list[PlanNode]) -> PlanNode:
+        s, p, v = filter.subject, filter.property, filter.value
+        for slot, fp in (('property', p), ('subject', s), ('value', v)):
+            if isinstance(fp, OrFingerprint):
+                branches = [
+                    self._plan(filter.replace(**{slot: x}), nodes)
+                    for x in fp]
+                return self._add(nodes, UnionNode, inputs=branches)
+        if not isinstance(p, ValueFingerprint):
+            raise ValueError(
+                f'Can not plan `{_fmt_filter(filter)}`: '
+                'the property must be given')
+
+        subjects = self._plan_slot(s, nodes)
+        values = self._plan_slot(v, nodes)
+        if subjects is None and values is None:
+            if (isinstance(s, FullFingerprint)
+                    and isinstance(v, FullFingerprint)):
+                raise ValueError(
+                    f'Can not plan `{_fmt_filter(filter)}`: '
+                    'subject and value are both unknown')
+            return self._add(nodes, QueryNode, filter)
+
+        full = FullFingerprint()
+        if subjects is not None:
+            template = filter.replace(subject=full)
+            keep: list[PlanNode] = []
+            if values is not None:
+                template = template.replace(value=full)
+                keep = values
+            return self._add(
+                nodes, BindNode, template, 'subject', len(keep),
+                inputs=[*subjects, *keep])
+        assert values is not None
+        return self._add(
+            nodes, BindNode, filter.replace(value=full), 'value',
+            inputs=values)
+
+    def _plan_slot(
+        self, fp: Fingerprint, nodes: list[PlanNode]
+    ) -> Optional[list[PlanNode]]:
+        """Plans the candidates of a subject or value slot.
+
+        Returns:
+           The nodes whose results intersect into the candidates, or
+           ``None`` if the slot needs no candidates (it is given or free).
+        """
+        if isinstance(fp, (FullFingerprint, ValueFingerprint)):
+            return None
+        components = list(fp) if isinstance(fp, AndFingerprint) else [fp]
+        sources: list[PlanNode] = []
+        constants: list[Any] = []
+        for component in components:
+            if isinstance(component, ValueFingerprint):
+                constants.append(component.value)
+            elif (isinstance(component, SnakFingerprint)
+                  and isinstance(component.snak, ValueSnak)):
+                snak = component.snak
+                filter = Filter(property=snak.property, value=snak.value)
+                # Branches of a disjunction may share constraints.
+                node = next((
+                    node for node in nodes
+                    if isinstance(node, EntitiesNode)
+                    and node.filter == filter), None)
+                sources.append(node or self._add(nodes, EntitiesNode, filter))
+            else:
+                raise ValueError(f'Can not plan `{_fmt(component)}`')
+        if constants:
+            sources.append(self._add(nodes, ConstantNode, constants))
+        return sources
+
+    def _lookup(self, key: tuple) -> Any:
+        with self._lock:
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache.move_to_end(key)
+            return value
+
+    def _update(self, key: tuple, value: Any) -> None:
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._max_cache_size:
+                self._cache.popitem(last=False)
+
+
+__all__ = (
+    'BindNode',
+    'ConstantNode',
+    'EntitiesNode',
+    'LLM_QueryPlan',
+    'LLM_QueryPlanner',
+    'PlanNode',
+    'QueryNode',
+    'UnionNode',
+)
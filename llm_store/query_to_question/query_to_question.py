@@ -11,6 +11,8 @@ from langchain_core.messages import SystemMessage
 from langchain_core.runnables import RunnableSequence
 from langchain_core.runnables import RunnableLambda
 
+from kbel.language_models import governed
+
 from .constants import (
     DEFAULT_EXAMPLES_FOR_Q_2_Q,
     DEFAULT_SYSTEM_INSTRUCTION_PROMPT,
@@ -150,7 +152,7 @@ class QueryToQuestion:
         debug_chain = RunnableLambda(lambda entry: (LOG.info(entry), entry)[1])
 
         chain: RunnableSequence = (
-            prompt | debug_chain | self._model | StrOutputParser()
+            prompt | debug_chain | governed(self._model) | StrOutputParser()
         )
 
         try:
@@ -0,0 +1,435 @@
+import dataclasses
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from kif_lib import Filter, Statement, Store
+from kif_lib.typing import (
+    Any,
+    AsyncIterator,
+    Iterable,
+    Iterator,
+    Optional,
+    Union,
+)
+
+from .event_loop import default_event_loop
+from .utils import amap
+
+LOG = logging.getLogger(__name__)
+
+
+class StatementSnapshot:
+    """Local indexed snapshot of the statements answered for filters.
+
+    Each materialized filter is stored together with the (possibly empty)
+    list of statements it produced, so a lookup distinguishes a filter whose
+    answer is empty from a filter that was never materialized.  Filters are
+    keyed by their subject, property and value fingerprints, masks (snak,
+    entity and rank masks), whether only best-ranked statements are
+    wanted, language and whether they are annotated.  The limit an answer was
+    produced with, if any, is stored with it: the answer does not serve
+    lookups with a larger limit (or none) unless it fell short of its own.
+
+    Parameters:
+        path: Path to the SQLite database file.
+    """
+
+    _path: Path
+    _conn: sqlite3.Connection
+    _lock: threading.Lock
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self._path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self._path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS filters ('
+            'key TEXT PRIMARY KEY, '
+            'filter TEXT NOT NULL, '
+            'size INTEGER NOT NULL, '
+            'created REAL NOT NULL, '
+            '"limit" INTEGER)'
+        )
+        columns = {
+            row[1] for row in self._conn.execute(
+                'PRAGMA table_info(filters)')}
+        if 'limit' not in columns:
+            # Snapshots created before limits were recorded.
+            self._conn.execute(
+                'ALTER TABLE filters ADD COLUMN "limit" INTEGER')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS statements ('
+            'key TEXT NOT NULL, '
+            'position INTEGER NOT NULL, '
+            'statement TEXT NOT NULL, '
+            'PRIMARY KEY (key, position))'
+        )
+        self._conn.commit()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM filters').fetchone()[0]
+
+    def __contains__(self, filter: Filter) -> bool:
+        return self.has(filter)
+
+    def has(self, filter: Filter, limit: Optional[int] = None) -> bool:
+        """Tests whether the answer of a filter is in the snapshot.
+
+        Parameters:
+           filter: Filter.
+           limit: Maximum number of statements needed.
+
+        Returns:
+           Whether `filter` was materialized with an answer that serves
+           `limit`.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, "limit" FROM filters WHERE key = ?',
+                (self.make_key(filter),)).fetchone()
+        return row is not None and self._serves(*row, limit)
+
+    @staticmethod
+    def _serves(
+        size: int, stored_limit: Optional[int], limit: Optional[int]
+    ) -> bool:
+        # An answer cut by its limit is complete only up to that limit.
+        return (stored_limit is None or size < stored_limit
+                or (limit is not None and limit <= stored_limit))
+
+    @staticmethod
+    def make_key(filter: Filter) -> str:
+        """Computes the snapshot key of a filter.
+
+        Parameters:
+           filter: Filter.
+
+        Returns:
+           Snapshot key.
+        """
+        key = [
+            filter.subject.to_json(),
+            filter.property.to_json(),
+            filter.value.to_json(),
+            filter.snak_mask.value,
+            filter.subject_mask.value,
+            filter.property_mask.value,
+            filter.value_mask.value,
+            filter.language,
+            filter.annotated,
+        ]
+        if filter.rank_mask != Filter.RankMask.ALL or not filter.best_ranked:
+            # Only non-default ranks are part of the key, so the keys of
+            # snapshots created before ranks were keyed still match.
+            key += [filter.rank_mask.value, filter.best_ranked]
+        return json.dumps(key)
+
+    def lookup(
+        self, filter: Filter, limit: Optional[int] = None
+    ) -> Optional[list[Statement]]:
+        """Looks up the statements of a filter.
+
+        Parameters:
+           filter: Filter.
+           limit: Maximum number of statements.
+
+        Returns:
+           The statements of `filter` or ``None`` if it was not materialized
+           (or was materialized with a limit smaller than `limit`).
+        """
+        key = self.make_key(filter)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, "limit" FROM filters WHERE key = ?',
+                (key,)).fetchone()
+            if row is None or not self._serves(*row, limit):
+                return None
+            rows = self._conn.execute(
+                'SELECT statement FROM statements WHERE key = ? '
+                'ORDER BY position LIMIT ?',
+                (key, -1 if limit is None else limit)).fetchall()
+        return [Statement.from_json(row[0]) for row in rows]
+
+    def update(
+        self,
+        filter: Filter,
+        statements: Iterable[Statement],
+        limit: Optional[int] = None,
+    ) -> None:
+        """Stores the statements of a filter, replacing previous ones.
+
+        The update is atomic: a filter is either fully materialized or
+        absent.
+
+        Parameters:
+           filter: Filter.
+           statements: Statements.
+           limit: Limit the statements were produced with, if any.
+        """
+        key = self.make_key(filter)
+        rows = [(key, i, stmt.to_json()) for i, stmt in enumerate(statements)]
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM statements WHERE key = ?', (key,))
+            self._conn.executemany(
+                'INSERT INTO statements (key, position, statement) '
+                'VALUES (?, ?, ?)', rows)
+            self._conn.execute(
+                'INSERT OR REPLACE INTO filters '
+                '(key, filter, size, created, "limit") '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, filter.to_json(), len(rows), time.time(), limit))
+
+    def invalidate(self, filter: Filter) -> bool:
+        """Removes a filter and its statements.
+
+        Parameters:
+           filter: Filter.
+
+        Returns:
+           Whether `filter` was materialized.
+        """
+        key = self.make_key(filter)
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM statements WHERE key = ?', (key,))
+            return self._conn.execute(
+                'DELETE FROM filters WHERE key = ?', (key,)).rowcount > 0
+
+    def clear(self) -> None:
+        """Removes all filters and statements."""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM statements')
+            self._conn.execute('DELETE FROM filters')
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+@dataclasses.dataclass
+class MaterializationStats:
+    """Counters of a materialization job."""
+
+    #: Number of filters evaluated and stored.
+    done: int = 0
+
+    #: Number of filters skipped because they were already materialized.
+    skipped: int = 0
+
+    #: Number of filters whose evaluation failed (they are not stored).
+    failed: int = 0
+
+    #: Number of statements stored.
+    statements: int = 0
+
+
+async def amaterialize(
+    store: Store,
+    filters: Iterable[Filter],
+    snapshot: Union[StatementSnapshot, str, Path],
+    max_concurrency: Optional[int] = 16,
+    limit: Optional[int] = None,
+    distinct: bool = True,
+    resume: bool = True,
+) -> MaterializationStats:
+    """Materializes the answers of `store` to `filters` into a snapshot.
+
+    Filters are evaluated concurrently and each one is committed to the
+    snapshot as soon as it completes, which checkpoints the job: if it is
+    interrupted, running it again with `resume` skips the filters already
+    materialized.  Filters whose evaluation fails are logged and left out,
+    so they are retried by the next run.  The limit each answer was
+    produced with is recorded with it, which then only serves lookups with
+    at most that limit.  That is `limit` or, if the store caps the answers
+    of unlimited filters (e.g., an :class:`LLM_Store` asks its model for a
+    default number of answers), that cap.
+
+    Parameters:
+       store: Store to materialize (usually an :class:`LLM_Store`).
+       filters: Filters.
+       snapshot: Snapshot or path to its SQLite database file.
+       max_concurrency: Maximum number of filters evaluated at the same time
+         (no limit if ``None``).
+       limit: Maximum number of statements per filter.
+       distinct: Whether to suppress duplicated statements.
+       resume: Whether to skip filters already materialized.
+
+    Returns:
+       Materialization counters.
+    """
+    if not isinstance(snapshot, StatementSnapshot):
+        snapshot = StatementSnapshot(snapshot)
+    stats = MaterializationStats()
+    effective_limit = _get_effective_limit(store, limit)
+
+    async def run(filter: Filter) -> None:
+        assert isinstance(snapshot, StatementSnapshot)
+        if resume and snapshot.has(filter, limit):
+            stats.skipped += 1
+            return
+        try:
+            statements = [
+                stmt async for stmt in store.afilter(
+                    filter=filter, limit=limit, distinct=distinct)]
+        except Exception as e:
+            LOG.warning(f'Could not materialize `{filter}`: {e}')
+            stats.failed += 1
+            return
+        snapshot.update(filter, statements, effective_limit)
+        stats.done += 1
+        stats.statements += len(statements)
+        LOG.info(
+            f'Materialized {len(statements)} statements '
+            f'({stats.done} filters done)')
+
+    async for _ in amap(run, filters, max_concurrency=max_concurrency):
+        pass
+    return stats
+
+
+def _get_effective_limit(store: Store, limit: Optional[int]) -> Optional[int]:
+    get_effective_limit = getattr(store, 'get_effective_limit', None)
+    return limit if get_effective_limit is None else get_effective_limit(limit)
+
+
+def materialize(
+    store: Store,
+    filters: Iterable[Filter],
+    snapshot: Union[StatementSnapshot, str, Path],
+    max_concurrency: Optional[int] = 16,
+    limit: Optional[int] = None,
+    distinct: bool = True,
+    resume: bool = True,
+) -> MaterializationStats:
+    """Materializes the answers of `store` to `filters` into a snapshot.
+
+    See :func:`amaterialize`.
+    """
+    return default_event_loop.run(amaterialize(
+        store, filters, snapshot, max_concurrency, limit, distinct, resume))
+
+
+class LLM_SnapshotStore(
+    Store,
+    store_name='llm-snapshot',
+    store_description='Read-only KIF Store over a materialized snapshot.',
+):
+    """LLM Snapshot Store
+
+    Serves filters from a snapshot built by :func:`materialize`.  Filters
+    that were not materialized are evaluated by the `fallback` store (e.g.,
+    an :class:`LLM_Store`), if any, and otherwise produce no statements.
+
+    With `write_back`, the answer of the fallback is stored once it has been
+    fully consumed; if the caller stops early, nothing is stored, as the
+    answer may be incomplete.
+
+    Properties::
+      store_name: Store plugin to instantiate.
+      snapshot: A StatementSnapshot or the path to its SQLite database file.
+      fallback: A KIF Store to evaluate filters missing from the snapshot.
+      write_back: Whether to store the fallback answers in the snapshot.
+    """
+
+    __slots__ = (
+        '_snapshot',
+        '_fallback',
+        '_write_back',
+    )
+
+    _snapshot: StatementSnapshot
+    _fallback: Optional[Store]
+    _write_back: bool
+
+    def __init__(
+        self,
+        store_name: str,
+        snapshot: Union[StatementSnapshot, str, Path],
+        fallback: Optional[Store] = None,
+        write_back: bool = False,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(store_name, **kwargs)
+        assert store_name == self.store_name
+        if not isinstance(snapshot, StatementSnapshot):
+            snapshot = StatementSnapshot(snapshot)
+        self._snapshot = snapshot
+        self._fallback = fallback
+        self._write_back = write_back
+
+    @property
+    def snapshot(self) -> StatementSnapshot:
+        return self._snapshot
+
+    @property
+    def fallback(self) -> Optional[Store]:
+        return self._fallback
+
+    @fallback.setter
+    def fallback(self, value: Optional[Store]) -> None:
+        self._fallback = value
+
+    @property
+    def write_back(self) -> bool:
+        return self._write_back
+
+    @write_back.setter
+    def write_back(self, value: bool) -> None:
+        self._write_back = value
+
+    def _filter(self, filter: Filter, options: Any) -> Iterator[Statement]:
+        statements = self._snapshot.lookup(filter, options.limit)
+        if statements is not None:
+            yield from statements
+        elif self._fallback is not None:
+            LOG.info(f'Snapshot miss: `{filter}`')
+            statements = []
+            for stmt in self._fallback.filter(
+                    filter=filter, limit=options.limit,
+                    distinct=options.distinct):
+                statements.append(stmt)
+                yield stmt
+            self._write(filter, options, statements)
+
+    async def _afilter(
+        self, filter: Filter, options: Any
+    ) -> AsyncIterator[Statement]:
+        statements = self._snapshot.lookup(filter, options.limit)
+        if statements is not None:
+            for stmt in statements:
+                yield stmt
+        elif self._fallback is not None:
+            LOG.info(f'Snapshot miss: `{filter}`')
+            statements = []
+            async for stmt in self._fallback.afilter(
+                    filter=filter, limit=options.limit,
+                    distinct=options.distinct):
+                statements.append(stmt)
+                yield stmt
+            self._write(filter, options, statements)
+
+    def _write(
+        self, filter: Filter, options: Any, statements: list[Statement]
+    ) -> None:
+        if self._write_back:
+            self._snapshot.update(
+                filter, statements,
+                _get_effective_limit(self._fallback, options.limit))
+
+
+__all__ = (
+    'LLM_SnapshotStore',
+    'MaterializationStats',
+    'StatementSnapshot',
+    'amaterialize',
+    'materialize',
+)
@@ -1,4 +1,22 @@
-from typing import List, Union
+import asyncio
+import contextlib
+from typing import (
+    Any,
+    AsyncIterable,
+    Awaitable,
+    Callable,
+    AsyncIterator,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    TypeVar,
+    Union,
+)
+
+T = TypeVar('T')
+S = TypeVar('S')
 
 
 def is_url(s: str) -> bool:
@@ -51,3 +69,203 @@ def similarity(
     ranking = similarities.argsort()[::-1]
 
     return map(lambda i: (sentences_to[i], similarities[i]), iter(ranking))
+
+
+async def aiter_from(iterable: Iterable[T]) -> AsyncIterator[T]:
+    """Wraps a synchronous iterable into an async iterator."""
+    for item in iterable:
+        yield item
+
+
+@contextlib.asynccontextmanager
+async def aclosing(
+    iterable: AsyncIterable[T],
+) -> AsyncIterator[AsyncIterable[T]]:
+    """Closes `iterable` on exit if it is an async generator.
+
+    Unlike :func:`contextlib.aclosing`, it accepts any async iterable.
+    """
+    try:
+        yield iterable
+    finally:
+        aclose = getattr(iterable, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+
+
+async def atake(
+    iterable: AsyncIterable[T],
+    limit: Optional[int],
+    distinct: bool = False,
+) -> AsyncIterator[T]:
+    """Yields at most `limit` items of `iterable` (all if ``None``).
+
+    If `distinct` is ``True``, repeated items are suppressed and do not
+    count towards the limit.  `iterable` is closed as soon as the limit is
+    reached, cancelling any work still pending upstream.
+    """
+    if limit is not None and limit <= 0:
+        return
+    seen: set[Hashable] = set()
+    async with aclosing(iterable):
+        async for item in iterable:
+            if distinct:
+                if item in seen:
+                    continue
+                seen.add(item)
+            yield item
+            if limit is not None:
+                limit -= 1
+                if limit <= 0:
+                    return
+
+
+async def amerge(
+    iterables: Iterable[AsyncIterable[T]],
+    max_concurrency: Optional[int] = None,
+    distinct: bool = False,
+) -> AsyncIterator[T]:
+    """Merges async iterables, consuming them concurrently.
+
+    Items are yielded in arrival order.  At most `max_concurrency`
+    iterables are consumed at the same time (no limit if ``None``), and
+    as many items wait for the consumer; iterables that get ahead are
+    suspended until it catches up.  If `distinct` is ``True``, items
+    already yielded are suppressed.  The first error raised by any iterable
+    cancels the others and is propagated.
+    """
+    iterables = list(iterables)
+    channel: asyncio.Queue[tuple[bool, Any]] = asyncio.Queue()
+    done = object()
+    semaphore = (
+        asyncio.Semaphore(max_concurrency) if max_concurrency else None
+    )
+    # Free buffer slots; end and error markers do not take a slot, so a
+    # cancelled iterable never waits on the consumer.
+    slots = asyncio.Semaphore(max_concurrency or max(len(iterables), 1))
+
+    async def put(item: T) -> None:
+        await slots.acquire()
+        channel.put_nowait((True, item))
+
+    async def drain(iterable: AsyncIterable[T]) -> None:
+        try:
+            if semaphore:
+                async with semaphore:
+                    async for item in iterable:
+                        await put(item)
+            else:
+                async for item in iterable:
+                    await put(item)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as err:
+            channel.put_nowait((False, err))
+        finally:
+            channel.put_nowait((False, done))
+
+    tasks = [asyncio.ensure_future(drain(it)) for it in iterables]
+    pending = len(tasks)
+    seen: set = set()
+    try:
+        while pending:
+            ok, item = await channel.get()
+            if ok:
+                slots.release()
+                if distinct:
+                    if item in seen:
+                        continue
+                    seen.add(item)
+                yield item
+            elif item is done:
+                pending -= 1
+            else:
+                raise item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def amap(
+    func: Callable[[T], Awaitable[S]],
+    iterable: Union[Iterable[T], AsyncIterable[T]],
+    max_concurrency: Optional[int] = None,
+    ordered: bool = False,
+) -> AsyncIterator[S]:
+    """Applies `func` concurrently to the items of `iterable`.
+
+    Items are dispatched as soon as they arrive and at most
+    `max_concurrency` calls run or wait for the consumer at the same time
+    (no limit if ``None``), so a slow consumer throttles the dispatch.
+    Results are yielded in completion order, or in the order of `iterable`
+    if `ordered` is ``True``.  The first error raised by `func` (or by
+    `iterable`) cancels the pending calls and is propagated.
+    """
+    if not isinstance(iterable, AsyncIterable):
+        iterable = aiter_from(iterable)
+    channel: asyncio.Queue[tuple[Optional[int], bool, Any]] = asyncio.Queue()
+    semaphore = (
+        asyncio.Semaphore(max_concurrency) if max_concurrency else None
+    )
+    tasks: List[asyncio.Future] = []
+
+    async def call(index: int, item: T) -> None:
+        # The slot of a call is released once its result is yielded.
+        try:
+            channel.put_nowait((index, True, await func(item)))
+        except asyncio.CancelledError:
+            raise
+        except BaseException as err:
+            channel.put_nowait((index, False, err))
+
+    async def feed(iterable: AsyncIterable[T]) -> None:
+        # The semaphore is acquired before dispatching, so a slow consumer
+        # also throttles the upstream iterable.  With `ordered`, the next
+        # result to yield was dispatched before any result held back, so
+        # it always has its slot.
+        count = 0
+        try:
+            async with aclosing(iterable):
+                async for item in iterable:
+                    if semaphore:
+                        await semaphore.acquire()
+                    tasks.append(asyncio.ensure_future(call(count, item)))
+                    count += 1
+        except asyncio.CancelledError:
+            raise
+        except BaseException as err:
+            channel.put_nowait((None, False, err))
+        else:
+            channel.put_nowait((None, True, count))
+
+    feeder = asyncio.ensure_future(feed(iterable))
+    total: Optional[int] = None
+    received = 0
+    pending: Dict[int, S] = {}
+    next_index = 0
+    try:
+        while total is None or received < total:
+            index, ok, value = await channel.get()
+            if not ok:
+                raise value
+            if index is None:
+                total = value
+                continue
+            received += 1
+            if not ordered:
+                if semaphore:
+                    semaphore.release()
+                yield value
+                continue
+            pending[index] = value
+            while next_index in pending:
+                if semaphore:
+                    semaphore.release()
+                yield pending.pop(next_index)
+                next_index += 1
+    finally:
+        feeder.cancel()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(feeder, *tasks, return_exceptions=True)
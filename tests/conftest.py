@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for path in (ROOT, os.path.join(ROOT, 'kbel', 'src'),
+             os.path.join(ROOT, 'kifqa', 'lib')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
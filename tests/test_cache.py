@@ -0,0 +1,40 @@
+from llm_store.cache import SQLiteResponseCache
+
+
+def test_hits_update_access_times_lazily(tmp_path):
+    cache = SQLiteResponseCache(tmp_path / 'cache.db', access_granularity=60)
+    cache.update('key', 'value')
+    changes = cache._conn.total_changes
+    for _ in range(10):
+        assert cache.lookup('key') == 'value'
+    assert cache._conn.total_changes == changes
+
+    cache._access_granularity = 0
+    assert cache.lookup('key') == 'value'
+    assert cache._conn.total_changes == changes + 1
+
+
+def test_async_sqlite_access_runs_off_the_event_loop(tmp_path):
+    import asyncio
+    import threading
+
+    cache = SQLiteResponseCache(tmp_path / 'cache.db')
+    threads = []
+    lookup, update = cache._lookup, cache._update
+
+    def record(method):
+        def wrapper(*args):
+            threads.append(threading.get_ident())
+            return method(*args)
+        return wrapper
+
+    cache._lookup, cache._update = record(lookup), record(update)
+
+    async def run():
+        await cache.aupdate('key', 'value')
+        assert await cache.alookup('key') == 'value'
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert len(threads) == 2
+    assert loop_thread not in threads
@@ -0,0 +1,22 @@
+import time
+
+from llm_store.event_loop import BackgroundEventLoop
+
+
+def test_iterate_suspends_a_fast_producer():
+    loop = BackgroundEventLoop()
+    produced = []
+
+    async def produce():
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    try:
+        items = loop.iterate(produce(), maxsize=4)
+        assert next(items) == 0
+        time.sleep(0.2)
+        assert len(produced) <= 6
+        assert list(items) == list(range(1, 100))
+    finally:
+        loop.stop()
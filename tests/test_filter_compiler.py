@@ -0,0 +1,50 @@
+import gc
+
+from kif_lib import Context, Filter, Item, Property, Store, Text
+
+from llm_store.compiler.llm.filter_compiler import LLM_CompiledFilterCache
+
+
+def test_compiled_filters_are_keyed_by_language_and_store():
+    borders = Property('http://x/borders').register(label='borders')
+    brazil = Item('http://x/Brazil').register(label='Brazil')
+    filter = Filter(None, borders, brazil)
+    cache = LLM_CompiledFilterCache()
+    store = Store('empty')
+    compiled = cache.compile(filter, store)
+    assert cache.compile(filter, store) is compiled
+    assert 'borders Brazil' in compiled.query_template
+
+    with Context() as ctx:
+        ctx.options.language = 'pt'
+        borders.register(label=Text('faz fronteira com', 'pt'))
+        brazil.register(label=Text('Brasil', 'pt'))
+        compiled_pt = cache.compile(filter, store)
+    assert 'faz fronteira com Brasil' in compiled_pt.query_template
+    assert len(cache) == 2
+
+    # The entries of a collected store are dropped and never reused.
+    del store
+    gc.collect()
+    assert cache.compile(filter, Store('empty')) is not compiled
+    assert len(cache) == 1
+
+
+def test_missing_labels_are_prefetched_in_one_call(monkeypatch):
+    borders = Property('http://x/shares_border')
+    chile = Item('http://x/Chile')
+    calls = []
+
+    def resolve(self, objects, label=False, language=None, **kwargs):
+        objects = list(objects)
+        calls.append(objects)
+        for entity in objects:
+            entity.register(label=Text(entity.iri.content[9:], language))
+        return objects
+
+    with Context():
+        monkeypatch.setattr(Context, 'resolve', resolve)
+        compiled = LLM_CompiledFilterCache().compile(
+            Filter(None, borders, chile), Store('empty'))
+    assert calls == [[borders, chile]]
+    assert 'shares_border Chile' in compiled.query_template
@@ -0,0 +1,169 @@
+import asyncio
+import threading
+import time
+
+from kif_lib import Filter, Item, Search, Store
+from kif_lib.vocabulary import wd
+from langchain_core.language_models.fake_chat_models import \
+    FakeListChatModel
+
+from kbel.concurrency import configure_governor
+from kbel.language_models import HedgedChatModel, governed, model_key
+from llm_store import LLM_Store
+
+
+class StreamingModel(FakeListChatModel):
+    """Fake model with a governor of its own."""
+
+
+class LinkingDisambiguator:
+    """Links each label through a call to the governed `model`."""
+
+    def __init__(self, model):
+        self.model = governed(model)
+
+    def disambiguate_item(self, label, searcher, **kwargs):
+        self.model.invoke(f'link {label}')
+        return [(label, '', Item(f'http://x/{label}').register(label=label))]
+
+    disambiguate_property = disambiguate_item
+
+
+def test_streamed_filters_do_not_starve_linking():
+    # Linking needs a slot of the same governor as the streamed answers:
+    # more concurrent filters than slots must not deadlock.
+    model = StreamingModel(
+        responses=['Argentina; Chile; Peru; Bolivia'], sleep=0.01)
+    configure_governor(*model_key(model), max_concurrency=2)
+    kb = Store(
+        LLM_Store.store_name,
+        target_store=Store('empty'),
+        searcher=Search('empty'),
+        model=model,
+        streaming=True,
+        disambiguation_concurrency=1,
+    )
+    kb._disambiguator = LinkingDisambiguator(model)
+
+    async def run():
+        async def one(subject):
+            return [stmt async for stmt in kb.afilter(
+                filter=Filter(subject, wd.shares_border_with))]
+        subjects = (wd.Brazil, wd.Argentina, wd.Chile, wd.Peru,
+                    wd.Bolivia, wd.Paraguay)
+        return await asyncio.wait_for(
+            asyncio.gather(*map(one, subjects)), timeout=30)
+
+    results = asyncio.run(run())
+    assert len(results) == 6
+    for statements in results:
+        assert {stmt.snak.value.iri.content for stmt in statements} == {
+            f'http://x/{x}' for x in ('Argentina', 'Chile', 'Peru', 'Bolivia')}
+
+
+def test_sync_stream_releases_slot_before_yielding():
+    class SyncStreamingModel(FakeListChatModel):
+        pass
+
+    model = SyncStreamingModel(responses=['abc', 'x'])
+    configure_governor(*model_key(model), max_concurrency=1)
+    chunks, replies = [], []
+
+    def run():
+        for chunk in governed(model).stream('hi'):
+            chunks.append(chunk.content)
+            replies.append(governed(model).invoke('again').content)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert ''.join(chunks) == 'abc'
+    assert len(replies) == 3
+
+
+def test_sync_hedge_observes_losing_primary():
+    class SlowModel(FakeListChatModel):
+        def _call(self, *args, **kwargs):
+            time.sleep(0.3)
+            return super()._call(*args, **kwargs)
+
+    model = HedgedChatModel(
+        primary=SlowModel(responses=['slow']),
+        secondary=FakeListChatModel(responses=['fast']),
+        delay=0.05)
+    assert model.invoke('hi').content == 'fast'
+    deadline = time.monotonic() + 5
+    while not model._latencies and time.monotonic() < deadline:
+        time.sleep(0.01)
+    [latency] = model._latencies
+    assert latency >= 0.3
+
+
+def test_sync_hedge_measures_latency_from_start():
+    from kbel import language_models
+    model = HedgedChatModel(
+        primary=FakeListChatModel(responses=['primary']),
+        secondary=FakeListChatModel(responses=['secondary']),
+        delay=0.5)
+    # Fill the pool, so that the primary waits in its queue.
+    release = threading.Event()
+    workers = language_models._hedge_executor._max_workers
+    blockers = [language_models._hedge_executor.submit(release.wait)
+                for _ in range(workers)]
+    threading.Timer(0.3, release.set).start()
+    assert model.invoke('hi').content == 'primary'
+    for blocker in blockers:
+        blocker.result()
+    [latency] = model._latencies
+    assert latency < 0.3
+    assert model.stats.hedged == 0
+
+
+def test_async_stream_forwards_base_exceptions():
+    from langchain_core.outputs import ChatGenerationChunk
+    from langchain_core.messages import AIMessageChunk
+
+    class Interrupted(BaseException):
+        pass
+
+    class InterruptedModel(FakeListChatModel):
+        async def _astream(self, *args, **kwargs):
+            yield ChatGenerationChunk(message=AIMessageChunk(content='a'))
+            raise Interrupted
+
+    model = governed(InterruptedModel(responses=['a']))
+
+    async def run():
+        chunks = []
+        try:
+            async for chunk in model.astream('hi'):
+                chunks.append(chunk.content)
+        except Interrupted:
+            return chunks
+        return None
+
+    assert asyncio.run(asyncio.wait_for(run(), 5)) == ['a']
+
+
+def test_stream_models_without_native_streaming():
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    class PlainModel(BaseChatModel):
+        @property
+        def _llm_type(self):
+            return 'plain'
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            return ChatResult(
+                generations=[ChatGeneration(message=AIMessage('abc'))])
+
+    model = governed(PlainModel())
+    assert ''.join(c.content for c in model.stream('hi')) == 'abc'
+
+    async def run():
+        return ''.join([c.content async for c in model.astream('hi')])
+
+    assert asyncio.run(run()) == 'abc'
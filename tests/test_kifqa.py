@@ -0,0 +1,152 @@
+import asyncio
+import time
+
+import pytest
+from kif_lib import Filter, Item, Property, Statement, Store, Text
+from kif_lib.vocabulary import wd
+from langchain_core.language_models.fake_chat_models import \
+    FakeListChatModel
+
+from kbel.disambiguators import Disambiguator
+from kbel.disambiguators.simple import SimpleDisambiguator  # noqa: F401
+from kifqa import KIFQA
+from kifqa.kifqa import QueryResult
+
+
+def make_kifqa():
+    model = FakeListChatModel(responses=['[]'])
+    return KIFQA(store=Store('empty'), search=object(), model=model)
+
+
+def test_query_many_cancels_on_early_close():
+    qa = make_kifqa()
+    cancelled = []
+
+    async def aquery_one(question, index, *args, **kwargs):
+        try:
+            if index > 0:
+                await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.append(index)
+            raise
+        return QueryResult(question, index=index)
+
+    qa._aquery_one = aquery_one
+    results = qa.query_many(['a', 'b', 'c'], max_concurrency=2)
+    assert next(results).question == 'a'
+    start = time.monotonic()
+    results.close()
+    assert time.monotonic() - start < 1
+    deadline = time.monotonic() + 5
+    while len(cancelled) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sorted(cancelled) == [1, 2]
+
+
+class RecordingSearch:
+    """Fake searcher that records the options of its calls."""
+
+    search_name = 'recording'
+    limit = 100
+
+    def __init__(self):
+        self.calls = []
+
+    def item_descriptor(self, search, **kwargs):
+        self.calls.append(kwargs)
+        yield Item(f'http://x/{search}'), {'labels': {'en': Text(search)}}
+
+    async def aitem_descriptor(self, search, **kwargs):
+        for found in self.item_descriptor(search, **kwargs):
+            yield found
+
+
+def test_item_linking_passes_search_limit_per_call():
+    search = RecordingSearch()
+    qa = KIFQA(
+        store=Store('empty'), search=search,
+        model=FakeListChatModel(responses=['[]']),
+        disambiguator=Disambiguator('simple'))
+    [(_, _, item)] = qa.item_linking('Brazil', 'q', candidates_limit=3)
+    assert item == Item('http://x/Brazil')
+    asyncio.run(qa.aitem_linking('Chile', 'q', candidates_limit=5))
+    assert search.calls == [{'limit': 3}, {'limit': 5}]
+    assert search.limit == 100
+
+
+def test_results_without_statements_are_not_silently_empty():
+    with pytest.raises(TypeError, match='kif_filters'):
+        list(QueryResult('q'))
+    with pytest.raises(TypeError, match='async for'):
+        list(QueryResult('q', astatements=object()))
+    assert list(QueryResult('q', error=ValueError())) == []
+
+
+def test_deprecated_artifacts_follow_last_result():
+    qa = make_kifqa()
+    result = qa._init_result([], 'q', None)
+    result.kif_filters.append(Filter(wd.Brazil))
+    with pytest.warns(DeprecationWarning):
+        assert qa.kif_filters == [Filter(wd.Brazil)]
+    with pytest.warns(DeprecationWarning):
+        qa.reset()
+    with pytest.warns(DeprecationWarning):
+        assert qa.kif_filters == []
+
+
+def test_batch_property_candidates_retry_failures_and_stay_bounded():
+    from kbel.cache import LinkingCache
+    from kifqa.kifqa import _batch_caches, _BatchCaches
+    qa = make_kifqa()
+    calls = []
+
+    async def afetch(subject, object):
+        calls.append(subject)
+        if len(calls) == 1:
+            raise RuntimeError('transient')
+        return [wd.country]
+
+    qa._afetch_property_candidates = afetch
+
+    async def run():
+        batch = _BatchCaches(LinkingCache(), max_property_candidates=2)
+        _batch_caches.set(batch)
+        with pytest.raises(RuntimeError):
+            await qa._asearch_properties_by_item('a', 'p', None)
+        assert await qa._asearch_properties_by_item('a', 'p', None) == [
+            wd.country]
+        assert await qa._asearch_properties_by_item('a', 'p', None) == [
+            wd.country]
+        for subject in ('b', 'c', 'd'):
+            await qa._asearch_properties_by_item(subject, 'p', None)
+        return list(batch.property_candidates)
+
+    assert asyncio.run(run()) == [('c', None), ('d', None)]
+    assert calls == ['a', 'a', 'b', 'c', 'd']
+
+
+def test_aquery_matches_query():
+    brazil = Item('http://x/Brazil')
+    borders = Property('http://x/borders').register(label='borders')
+    argentina = Item('http://x/Argentina')
+    statement = Statement(brazil, borders(argentina))
+    qa = KIFQA(
+        store=Store('memory', statement), search=RecordingSearch(),
+        model=FakeListChatModel(responses=[
+            '[{"subject": "Brazil", "property": "borders", '
+            '"object": "?x"}]']),
+        disambiguator=Disambiguator('simple'))
+
+    result = qa.query('Which countries border Brazil?')
+    statements = list(result)
+
+    async def arun():
+        result = await qa.aquery('Which countries border Brazil?')
+        return result, [stmt async for stmt in result]
+
+    aresult, astatements = asyncio.run(arun())
+    assert statements == astatements == [statement]
+    for name in ('q2t_labels', 'items', 'properties', 'triples',
+                 'disambiguated_labels', 'kif_filters'):
+        assert getattr(result, name) == getattr(aresult, name), name
+    assert result.kif_filters
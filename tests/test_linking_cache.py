@@ -0,0 +1,56 @@
+from kif_lib import Item, Property
+
+from kbel.cache import LinkingCache
+
+
+class FakeSearch:
+    search_name = 'fake'
+    limit = 10
+
+
+def test_invalidate_matches_every_search_limit(tmp_path):
+    cache = LinkingCache(path=tmp_path / 'linking.db')
+    search = FakeSearch()
+    result = [('Brazil', '', Item('http://x/Brazil'))]
+    cache.update(cache.make_key('Brazil', Item, search), result)
+    cache.update(
+        cache.make_key('Brazil', Item, search, search_limit=3), result)
+    cache.update(cache.make_key('border', Property, search), [])
+    assert cache.invalidate(cls=Item, searcher=search) == 2
+    assert cache.lookup(
+        cache.make_key('Brazil', Item, search, search_limit=3)) is None
+
+    # Entries only on disk are counted too.
+    cache.close()
+    cache = LinkingCache(path=tmp_path / 'linking.db')
+    assert len(cache) == 0
+    assert cache.invalidate(searcher=search) == 1
+
+
+def test_async_disk_lookups_run_off_the_event_loop(tmp_path):
+    import asyncio
+    import threading
+
+    cache = LinkingCache(path=tmp_path / 'linking.db')
+    key = cache.make_key('Brazil', Item, FakeSearch())
+    result = [('Brazil', '', Item('http://x/Brazil'))]
+    cache.update(key, result)
+    cache._entries.clear()
+    threads = []
+    lookup_disk = cache._lookup_disk
+
+    def record(key):
+        threads.append(threading.get_ident())
+        return lookup_disk(key)
+
+    cache._lookup_disk = record
+
+    async def run():
+        assert await cache.alookup(key) == result
+        # Promoted to memory, so served inline.
+        assert await cache.alookup(key) == result
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert len(threads) == 1 and threads[0] != loop_thread
+    assert cache.stats.hits == 2
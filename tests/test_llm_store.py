@@ -0,0 +1,353 @@
+import asyncio
+import random
+import re
+from typing import Any, Optional
+
+from kif_lib import Filter, Item, Search, Statement, Store
+from kif_lib.vocabulary import wd
+from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models.fake_chat_models import \
+    FakeListChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import (ChatGeneration, ChatGenerationChunk,
+                                    ChatResult)
+
+from llm_store import LLM_Store, ValidationMode
+
+
+class RecordingModel(FakeListChatModel):
+    """Fake model that records its prompts and max tokens."""
+
+    max_tokens: Optional[int] = None
+    calls: list = []
+
+    def _call(self, messages, *args: Any, **kwargs: Any) -> str:
+        self.calls.append(
+            (' '.join(str(m.content) for m in messages), self.max_tokens))
+        return super()._call(messages, *args, **kwargs)
+
+
+class LabelDisambiguator:
+    """Links each label to an item of the same name."""
+
+    def disambiguate_item(self, label, searcher, **kwargs):
+        return [(label, '', Item(f'http://x/{label}').register(label=label))]
+
+    disambiguate_property = disambiguate_item
+
+    def context_fingerprint(self, **kwargs):
+        return ()
+
+
+def make_store(model, **kwargs):
+    kwargs.setdefault('target_store', Store('empty'))
+    kb = Store(
+        LLM_Store.store_name,
+        searcher=Search('empty'),
+        model=model,
+        **kwargs,
+    )
+    kb._disambiguator = LabelDisambiguator()
+    return kb
+
+
+def test_unbounded_limit_is_not_sent_to_model():
+    model = RecordingModel(responses=['Argentina; Chile'], calls=[])
+    kb = make_store(model)
+    list(kb.filter(wd.Brazil, wd.shares_border_with, limit=3))
+    list(kb.filter(wd.Chile, wd.shares_border_with, limit=kb.max_limit))
+    (bounded, bounded_tokens), (unbounded, unbounded_tokens) = model.calls
+    assert 'Give at most 3 answers' in bounded
+    assert bounded_tokens is not None
+    assert 'Give at most' not in unbounded
+    assert unbounded_tokens is None
+
+
+def test_batched_filters_are_validated():
+    # The target store is empty, so every LLM answer is dropped.
+    model = RecordingModel(
+        responses=['1: Argentina; Chile\n2: Portuguese\n3: Brasília'],
+        calls=[])
+    kb = make_store(model, validation=ValidationMode.DROP)
+    filters = [
+        Filter(wd.Brazil, wd.shares_border_with),
+        Filter(wd.Brazil, wd.official_language),
+        Filter(wd.Brazil, wd.capital),
+    ]
+    assert list(kb.filter_many(filters)) == []
+    assert len(model.calls) == 1
+    assert kb.validation_stats.unverified == 4
+
+
+def test_pages_are_validated_and_bounded():
+    # Every answer is new but rejected by the (empty) target store.
+    model = RecordingModel(
+        responses=[f'Country{i}; Country{i + 1}' for i in range(0, 20, 2)],
+        calls=[])
+    kb = make_store(model, validation=ValidationMode.DROP)
+    page = kb.filter_page(wd.Brazil, wd.shares_border_with, page_size=2)
+    assert page.statements == []
+    assert page.next is None
+    assert len(model.calls) == kb._max_page_rounds
+
+
+class EchoModel(BaseChatModel):
+    """Fake model that answers ``N<i>`` to prompts about ``S<i>``."""
+
+    @property
+    def _llm_type(self) -> str:
+        return 'echo'
+
+    def _answer(self, messages) -> ChatResult:
+        match = re.search(r'\bS(\d+)\b', str(messages[-1].content))
+        assert match, messages[-1].content
+        message = AIMessage(content=f'N{match.group(1)}')
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return self._answer(messages)
+
+    async def _agenerate(
+            self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(random.random() / 100)
+        return self._answer(messages)
+
+
+def test_concurrent_filters_keep_their_binds():
+    kb = make_store(EchoModel())
+    subjects = [
+        Item(f'http://x/S{i}').register(label=f'S{i}') for i in range(300)]
+
+    async def run():
+        async def one(subject):
+            return [stmt async for stmt in kb.afilter(
+                filter=Filter(subject, wd.shares_border_with))]
+        return await asyncio.gather(*map(one, subjects))
+
+    results = asyncio.run(run())
+    for i, statements in enumerate(results):
+        assert statements == [Statement(
+            subjects[i], wd.shares_border_with(Item(f'http://x/N{i}')))]
+
+
+class FastPathModel(BaseChatModel):
+    """Fake model that answers yes/no, count and list prompts."""
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fast-path'
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = ' '.join(str(m.content) for m in messages)
+        if 'single word' in prompt:
+            content = 'Yes'
+        elif 'single integer' in prompt:
+            content = '2'
+        else:
+            content = 'Argentina; Chile'
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=content))])
+
+
+def test_ask_and_count_agree_with_validated_filter():
+    argentina = Item('http://x/Argentina').register(label='Argentina')
+    chile = Item('http://x/Chile').register(label='Chile')
+    filter = Filter(wd.Brazil, wd.shares_border_with)
+
+    kb = make_store(FastPathModel())
+    assert kb.count(filter=filter) == 2
+    assert kb.ask(wd.Brazil, wd.shares_border_with, chile)
+
+    target = Store('memory', Statement(
+        wd.Brazil, wd.shares_border_with(argentina)))
+    kb = make_store(
+        FastPathModel(), target_store=target,
+        validation=ValidationMode.DROP)
+    assert list(kb.filter(filter=filter)) == [
+        Statement(wd.Brazil, wd.shares_border_with(argentina))]
+    assert kb.count(filter=filter) == 1
+    assert kb.ask(wd.Brazil, wd.shares_border_with, argentina)
+    assert not kb.ask(wd.Brazil, wd.shares_border_with, chile)
+
+
+def test_changing_the_model_rebuilds_the_chains():
+    kb = make_store(RecordingModel(responses=['Argentina'], calls=[]))
+    assert [s.snak.value for s in kb.filter(
+        wd.Brazil, wd.shares_border_with, limit=3)] == [
+            Item('http://x/Argentina')]
+    kb.model = RecordingModel(responses=['Chile'], calls=[])
+    assert [s.snak.value for s in kb.filter(
+        wd.Brazil, wd.shares_border_with, limit=3)] == [
+            Item('http://x/Chile')]
+
+
+class TruncatedModel(BaseChatModel):
+    """Fake model whose answers are cut off by the token budget."""
+
+    calls: list = []
+
+    @property
+    def _llm_type(self) -> str:
+        return 'truncated'
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls.append(messages)
+        message = AIMessage(
+            content='Argentina; Chi',
+            response_metadata={'finish_reason': 'length'})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls.append(messages)
+        yield ChatGenerationChunk(message=AIMessageChunk(content='Argentina;'))
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content=' Chi', response_metadata={'finish_reason': 'length'}))
+
+
+def test_truncated_last_label_is_dropped():
+    from llm_store.cache import InMemoryResponseCache
+    for streaming in (False, True):
+        model = TruncatedModel(calls=[])
+        kb = make_store(
+            model, streaming=streaming,
+            response_cache=InMemoryResponseCache())
+        for _ in range(2):
+            assert [s.snak.value for s in kb.filter(
+                wd.Brazil, wd.shares_border_with, limit=3)] == [
+                    Item('http://x/Argentina')]
+        # Truncated responses are not cached.
+        assert len(model.calls) == 2
+
+
+def test_fast_path_budget_is_configurable():
+    model = RecordingModel(responses=['Yes'], calls=[])
+    kb = make_store(model, fast_path_max_tokens=32)
+    assert kb.ask(wd.Brazil, wd.shares_border_with, wd.Argentina)
+    kb.fast_path_max_tokens = 64
+    assert kb.ask(wd.Brazil, wd.shares_border_with, wd.Argentina)
+    assert [tokens for _, tokens in model.calls] == [32, 64]
+
+
+def test_changing_the_model_clears_the_planner_cache():
+    kb = make_store(RecordingModel(responses=['Argentina'], calls=[]))
+    kb.planner._update(('query',), ['cached'])
+    kb.model = RecordingModel(responses=['Chile'], calls=[])
+    assert kb.planner._lookup(('query',)) is None
+
+
+def test_blank_labels_are_not_linked():
+    class RecordingDisambiguator(LabelDisambiguator):
+        def __init__(self):
+            self.labels = []
+
+        def disambiguate_item(self, label, searcher, **kwargs):
+            self.labels.append(label)
+            return super().disambiguate_item(label, searcher, **kwargs)
+
+    for streaming in (False, True):
+        kb = make_store(
+            FakeListChatModel(responses=['Argentina; ; Chile; ']),
+            streaming=streaming)
+        kb._disambiguator = RecordingDisambiguator()
+        assert len(list(kb.filter(
+            wd.Brazil, wd.shares_border_with, limit=2))) == 2
+        assert sorted(kb._disambiguator.labels) == ['Argentina', 'Chile']
+
+
+
+class ScriptedModel(RecordingModel):
+    """Fake model that answers the first script entry found in a prompt."""
+
+    script: dict = {}
+
+    def _call(self, messages, *args: Any, **kwargs: Any) -> str:
+        super()._call(messages, *args, **kwargs)
+        prompt, _ = self.calls[-1]
+        return next(
+            answer for key, answer in self.script.items() if key in prompt)
+
+
+def test_ask_and_count_fast_paths():
+    model = ScriptedModel(responses=[''], calls=[], script={
+        'single word': '**No.**',
+        'Brazil shares border with _': 'About 1,234 answers',
+        'single integer': 'many',
+        '': 'Argentina; Chile',
+    })
+    kb = make_store(model)
+    assert not kb.ask(wd.Brazil, wd.shares_border_with, wd.Argentina)
+    assert kb.count(wd.Brazil, wd.shares_border_with) == 1234
+    # An unparsable count falls back to counting the statements.
+    assert kb.count(wd.Chile, wd.shares_border_with) == 2
+    (ask, ask_tokens), (count, count_tokens), _, (fallback, _) = model.calls
+    assert 'single word' in ask and ask_tokens == kb.fast_path_max_tokens
+    assert 'single integer' in count
+    assert count_tokens == kb.fast_path_max_tokens
+    assert 'single integer' not in fallback
+
+
+def test_batched_answers_are_split_per_filter():
+    model = ScriptedModel(responses=[''], calls=[], script={
+        'its own line': '1: Argentina; Chile\n3) Brasília',
+        'official language': 'Portuguese',
+        '': '',
+    })
+    kb = make_store(model)
+    filters = [
+        Filter(wd.Brazil, wd.shares_border_with),
+        Filter(wd.Brazil, wd.official_language),
+        Filter(wd.Brazil, wd.capital),
+        Filter(wd.Chile, wd.capital),
+    ]
+    results = {}
+    for filter, statement in kb.filter_many(filters, batch_size=3):
+        results.setdefault(filter, []).append(statement.snak.value)
+    assert results == {
+        filters[0]: [Item('http://x/Argentina'), Item('http://x/Chile')],
+        # The model skipped the second relation, so it was asked alone.
+        filters[1]: [Item('http://x/Portuguese')],
+        filters[2]: [Item('http://x/Brasília')],
+    }
+    # One prompt for the Brazil profile, one for its skipped relation and
+    # one for Chile.
+    assert len(model.calls) == 3
+
+
+class SlowStore:
+    """Fake target store that never answers in time."""
+
+    async def afilter(self, **kwargs):
+        await asyncio.sleep(5)
+        yield
+
+
+def test_hybrid_merge_fallback_and_timeout():
+    argentina = Item('http://x/Argentina')
+    chile = Item('http://x/Chile')
+    target = Store('memory', Statement(
+        wd.Brazil, wd.shares_border_with(argentina)))
+
+    def values(kb):
+        return [stmt.snak.value for stmt in kb.filter(
+            wd.Brazil, wd.shares_border_with, limit=5)]
+
+    model = RecordingModel(responses=['Chile; Argentina'], calls=[])
+    kb = make_store(model, target_store=target, hybrid_policy='merge')
+    # Target store answers come first; LLM duplicates are dropped.
+    assert values(kb) == [argentina, chile]
+    assert kb.hybrid_stats.llm_called == 1
+    assert kb.hybrid_stats.kb_answered == 0
+
+    model = RecordingModel(responses=['Chile; Argentina'], calls=[])
+    kb = make_store(model, target_store=target, hybrid_policy='fallback')
+    assert values(kb) == [argentina]
+    assert kb.hybrid_stats.kb_answered == 1
+    assert model.calls == []
+
+    kb = make_store(
+        model, target_store=target, hybrid_policy='complement',
+        hybrid_timeout=0.05)
+    kb._target_store = SlowStore()
+    assert values(kb) == [chile, argentina]
+    assert kb.hybrid_stats.kb_timeouts == 1
+    assert kb.hybrid_stats.llm_called == 1
@@ -0,0 +1,24 @@
+from kbel.parsing import RepairingPydanticOutputParser, get_parse_stats
+
+from kifqa.q2t.q2t import LLM_Response
+from llm_store.output_parsers import JsonListOutputParser
+
+
+def test_truncated_answer_is_dropped():
+    stats = get_parse_stats('llm_store.json')
+    repaired = stats.repaired
+    parser = JsonListOutputParser()
+    assert parser.parse('{"answers": ["Argentina", "Urug') == ['Argentina']
+    assert parser.parse('{"answers": ["Argentina", "Uruguay"') == [
+        'Argentina', 'Uruguay']
+    assert stats.repaired == repaired + 2
+
+
+def test_truncated_triple_member_is_dropped():
+    parser = RepairingPydanticOutputParser(
+        pydantic_object=LLM_Response, name='test.q2t')
+    [triple] = parser.parse(
+        '[{"subject": "Brazil", "property": "capi').root
+    assert triple.subject == 'Brazil'
+    assert triple.property is None
+    assert get_parse_stats('test.q2t').repaired == 1
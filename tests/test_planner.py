@@ -0,0 +1,90 @@
+import asyncio
+
+from kif_lib import Filter, Item, Statement
+from kif_lib.vocabulary import wd
+
+from llm_store import LLM_QueryPlanner
+from llm_store.planner import BindNode, EntitiesNode
+
+
+def item(name):
+    return Item(f'http://x/{name}')
+
+
+class FakeStore:
+    """Fake store that answers the sub-queries of a plan."""
+
+    subfilter_concurrency = None
+
+    def __init__(self):
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def afilter(self, filter, limit=None, distinct=True):
+        self.calls.append((filter, limit))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.in_flight -= 1
+        if filter.property.value == wd.shares_border_with:
+            answers = [(item(x), wd.shares_border_with(wd.Brazil))
+                       for x in ('Argentina', 'Chile', 'Peru')]
+        elif filter.property.value == wd.official_language:
+            answers = [(item(x), wd.official_language(wd.Spanish))
+                       for x in ('Argentina', 'Chile', 'Spain')]
+        else:
+            subject = filter.subject.value
+            answers = [(subject, wd.capital(item(f'capital of {i}')))
+                       for i in range(3)]
+        for subject, snak in answers[:limit]:
+            yield Statement(subject, snak)
+
+    async def aask(self, filter):
+        return True
+
+
+FILTER = Filter(
+    subject=(wd.shares_border_with(wd.Brazil)
+             & wd.official_language(wd.Spanish)),
+    property=wd.capital)
+
+
+def test_plan_shape_and_explain():
+    planner = LLM_QueryPlanner(FakeStore(), fanout=5)
+    plan = planner.plan(FILTER)
+    first, second, root = plan.nodes
+    assert isinstance(first, EntitiesNode)
+    assert isinstance(second, EntitiesNode)
+    assert isinstance(root, BindNode) and root.slot == 'subject'
+    assert root.inputs == (first, second)
+    assert plan.estimated_calls == 1 + 1 + 5
+    explanation = plan.explain()
+    assert '#2 for each subject in #0 & #1' in explanation
+    assert 'estimated calls: 7' in explanation
+
+
+def test_execution_is_concurrent_and_cached():
+    store = FakeStore()
+    planner = LLM_QueryPlanner(store)
+    plan = planner.plan(FILTER)
+
+    async def run(limit):
+        return [stmt async for stmt in plan.aexecute(limit=limit)]
+
+    statements = asyncio.run(run(1))
+    assert statements == [
+        Statement(item(x), wd.capital(item('capital of 0')))
+        for x in ('Argentina', 'Chile')]
+    # Both candidate sub-queries run at the same time, without the limit.
+    assert store.max_in_flight >= 2
+    assert [limit for _, limit in store.calls] == [None, None, 1, 1]
+
+    # Sub-query results are reused, even with another limit.
+    calls = len(store.calls)
+    assert len(asyncio.run(run(2))) == 4
+    assert len(store.calls) == calls + 2
+    asyncio.run(run(2))
+    assert len(store.calls) == calls + 2
@@ -0,0 +1,71 @@
+import asyncio
+
+from kif_lib import Filter, Statement
+from kif_lib.vocabulary import wd
+
+from llm_store import StatementSnapshot
+
+
+def make_statements(*values):
+    return [Statement(wd.Brazil, wd.shares_border_with(v)) for v in values]
+
+
+def test_limited_answers_do_not_serve_larger_limits(tmp_path):
+    snapshot = StatementSnapshot(tmp_path / 'snapshot.db')
+    filter = Filter(wd.Brazil, wd.shares_border_with)
+    statements = make_statements(wd.Argentina, wd.Chile)
+    snapshot.update(filter, statements, limit=2)
+    assert snapshot.lookup(filter) is None
+    assert snapshot.lookup(filter, limit=3) is None
+    assert not snapshot.has(filter, 3)
+    assert filter not in snapshot
+    assert snapshot.lookup(filter, limit=2) == statements
+    assert snapshot.lookup(filter, limit=1) == statements[:1]
+    # An answer that fell short of its limit is complete.
+    snapshot.update(filter, statements, limit=5)
+    assert snapshot.lookup(filter) == statements
+    assert filter in snapshot
+
+
+def test_key_includes_masks_and_annotations():
+    filter = Filter(wd.Brazil, wd.shares_border_with)
+    keys = {StatementSnapshot.make_key(f) for f in (
+        filter,
+        filter.replace(annotated=True),
+        filter.replace(snak_mask=Filter.VALUE_SNAK),
+        filter.replace(value_mask=Filter.ITEM),
+    )}
+    assert len(keys) == 4
+
+
+def test_key_includes_non_default_ranks():
+    filter = Filter(wd.Brazil, wd.shares_border_with)
+    keys = {StatementSnapshot.make_key(f) for f in (
+        filter,
+        filter.replace(rank_mask=Filter.PREFERRED),
+        filter.replace(best_ranked=False),
+    )}
+    assert len(keys) == 3
+
+
+class CappedStore:
+    """Fake store that answers at most two statements per filter."""
+
+    def get_effective_limit(self, limit):
+        return limit or 2
+
+    async def afilter(self, filter, limit=None, distinct=True):
+        for stmt in make_statements(wd.Argentina, wd.Chile)[:limit or 2]:
+            yield stmt
+
+
+def test_materialize_records_the_limit_the_store_applied(tmp_path):
+    from llm_store.snapshot import amaterialize
+
+    snapshot = StatementSnapshot(tmp_path / 'snapshot.db')
+    filter = Filter(wd.Brazil, wd.shares_border_with)
+    stats = asyncio.run(amaterialize(CappedStore(), [filter], snapshot))
+    assert stats.statements == 2
+    # The answer was cut at two statements, so it is not complete.
+    assert snapshot.lookup(filter) is None
+    assert len(snapshot.lookup(filter, limit=2)) == 2
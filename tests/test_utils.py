@@ -0,0 +1,43 @@
+import asyncio
+
+from llm_store.utils import amap, amerge
+
+
+def test_amerge_suspends_fast_iterables():
+    produced = []
+
+    async def produce(name):
+        for i in range(50):
+            produced.append((name, i))
+            yield (name, i)
+
+    async def run():
+        items = amerge([produce('a'), produce('b')], max_concurrency=2)
+        first = await items.__anext__()
+        await asyncio.sleep(0.05)
+        assert len(produced) <= 5
+        rest = [item async for item in items]
+        return [first] + rest
+
+    assert sorted(asyncio.run(run())) == sorted(
+        (name, i) for name in 'ab' for i in range(50))
+
+
+def test_amap_is_throttled_by_its_consumer():
+    started = []
+
+    async def func(i):
+        started.append(i)
+        await asyncio.sleep(0.001 * (i % 3))
+        return i
+
+    async def run(ordered):
+        started.clear()
+        results = amap(func, range(40), max_concurrency=3, ordered=ordered)
+        first = await results.__anext__()
+        await asyncio.sleep(0.05)
+        assert len(started) <= 4
+        return [first] + [i async for i in results]
+
+    assert sorted(asyncio.run(run(False))) == list(range(40))
+    assert asyncio.run(run(True)) == list(range(40))